@@ -0,0 +1,93 @@
+import io
+import time
+import argparse
+import contextlib
+from typing import List, Optional, Tuple
+
+import simulation
+from simulation import SimulationParameters
+from scheduling_framework.forecast_power import Forecast
+from scheduling_framework.dynamic_scheduling import STRATEGIES
+from scheduling_framework.simulation_metrics import MetricsResult
+from scheduling_framework.result_sink import ResultSink
+from run import simulate
+
+# ---------------- comparison ---------------- #
+
+# simulate the same fleet and forecast with every strategy and start time search, returns the metrics and wall time per run
+# with several searches (default: exhaustive), the runs are named strategy/search
+# the solar production is built once before the runs, so the first run is not timed with building the shared production
+def compare_strategies(simulation_parameters: SimulationParameters, strategies: List[str], forecast: Forecast, verbose: bool = False, searches: Optional[List[str]] = None) -> List[Tuple[str, MetricsResult, float]]:
+    if searches is None:
+        searches = ["exhaustive"]
+    simulation.solar_production(simulation_parameters, forecast)
+    results = []
+    for name in strategies:
+        for search in searches:
+            parameters = SimulationParameters.from_dict(simulation_parameters.to_dict())
+            parameters.scheduling.strategy = name
+            parameters.scheduling.search = search
+            parameters.exportresults = False
+            parameters.hideresults = True
+            parameters.plotpath = None
+            parameters.tracepath = None
+            label = f"{name}/{search}" if len(searches)>1 else name
+
+            print(f"# Simulating strategy {label}...")
+            start = time.perf_counter()
+            if verbose:
+                metrics = simulate(parameters, forecast)
+            else:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    metrics = simulate(parameters, forecast)
+            results.append((label, metrics, time.perf_counter()-start))
+    return results
+
+# print the results of all strategies side by side
+def print_results(results: List[Tuple[str, MetricsResult, float]]) -> None:
+    print(f"{'Strategy':<22}{'time':>9}{'required':>12}{'consumed':>12}{'grid':>12}{'grid %':>8}{'unused':>12}{'unused %':>10}{'missed':>8}")
+    for name, metrics, duration in results:
+        s = metrics.site
+        print(f"{name:<22}{duration:>8.2f}s{s.requiredEnergy/1000:>12.2f}{s.consumedEnergy/1000:>12.2f}{s.gridEnergy/1000:>12.2f}{s.gridShare()*100:>7.0f}%{s.solarUnused/1000:>12.2f}{s.unusedShare()*100:>9.0f}%{len(metrics.requirementMissed()):>8}")
+
+# print the speedup and the additional grid energy of the coarse search compared to the exhaustive search
+def print_search_savings(results: List[Tuple[str, MetricsResult, float]]) -> None:
+    runs = {name: (metrics, duration) for name, metrics, duration in results}
+    for name in runs:
+        strategy, _, search = name.partition("/")
+        if search != "coarse" or f"{strategy}/exhaustive" not in runs:
+            continue
+        exhaustive, exhaustiveTime = runs[f"{strategy}/exhaustive"]
+        coarse, coarseTime = runs[name]
+        print(f"Coarse search ({strategy}): {exhaustiveTime/max(coarseTime, 1e-9):.1f}x faster ({exhaustiveTime:.2f}s -> {coarseTime:.2f}s), grid energy {(coarse.site.gridEnergy-exhaustive.site.gridEnergy)/1000:+.2f} kWh")
+
+# export one csv row per strategy and the per-vehicle results of all strategies
+def export_results(simulation_parameters: SimulationParameters, results: List[Tuple[str, MetricsResult, float]]) -> None:
+    try:
+        with ResultSink(simulation_parameters.resultpath) as sink:
+            for name, metrics, duration in results:
+                sink.add(metrics, simulation_parameters.simulationdate, simulation_parameters.peakSolarPower, strategy=name, walltime=duration)
+    except OSError as e:
+        print(f"Error: Failed to write data to file {simulation_parameters.resultpath}: {e}")
+
+# ---------------- main ---------------- #
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(
+                    prog='compare_strategies.py',
+                    description='This program runs the consecutive simulation of the same fleet and forecast with several scheduling strategies and reports the wall time, grid energy and unused solar energy of every strategy side by side. The forecast is fetched once for all strategies.')
+    p.add_argument('-S', '--strategies', nargs='+', choices=list(STRATEGIES), default=list(STRATEGIES), help=f"Strategies to compare. Default: all ({', '.join(STRATEGIES)})")
+    p.add_argument('--searches', nargs='+', choices=["exhaustive", "coarse"], help="Run every strategy with each of these start time searches and report the savings of the coarse search. Default: the search selected with --search")
+    p.add_argument('--verbose', action='store_true', help="Print the simulation output of every strategy.")
+    simulation_parameters = simulation.parse(p)
+    args = p.parse_args()
+
+    forecast: Forecast = simulation.fetch_forecast(simulation_parameters)
+    searches = args.searches if args.searches is not None else [simulation_parameters.scheduling.search]
+    results = compare_strategies(simulation_parameters, args.strategies, forecast, args.verbose, searches)
+    print()
+    print_results(results)
+    print_search_savings(results)
+
+    if(simulation_parameters.exportresults):
+        export_results(simulation_parameters, results)
@@ -0,0 +1,343 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional
+
+import simulation
+from simulation import SimulationParameters, total_power_usage, overcharge_power
+from scheduling_framework.vehicle import Vehicle
+from scheduling_framework.fleet_ingest import create_vehicles
+from scheduling_framework.forecast_power import Forecast
+from scheduling_framework.forecast_client import parse_response
+from scheduling_framework.consumer_model import Consumer
+
+# ---------------- latency ---------------- #
+
+# tracks the latency of scheduling decisions against a service level
+class LatencyTracker:
+    def __init__(self, sla: float = 0.5, window: int = 10_000):
+        self.sla = sla # seconds
+        self.latencies = deque(maxlen=window)
+        self.decisions = 0
+        self.violations = 0
+
+    def record(self, latency: float) -> None:
+        self.latencies.append(latency)
+        self.decisions += 1
+        if(latency>self.sla):
+            self.violations += 1
+
+    # returns the latency percentiles in milliseconds
+    def percentiles(self, q=(50, 90, 99)) -> Dict[str, float]:
+        if(len(self.latencies)==0):
+            return {f"p{p}": 0.0 for p in q}
+        values = np.percentile(np.fromiter(self.latencies, dtype=float), q)*1000
+        return {f"p{p}": float(v) for p, v in zip(q, values)}
+
+    def to_dict(self):
+        return {
+            "decisions": self.decisions,
+            "violations": self.violations,
+            "sla_ms": self.sla*1000,
+            "max_ms": max(self.latencies)*1000 if self.latencies else 0.0,
+            **self.percentiles()
+        }
+
+# ---------------- event sources ---------------- #
+
+# yields lines from stdin without blocking the event loop
+async def stdin_source() -> AsyncIterator[str]:
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    while True:
+        line = await reader.readline()
+        if not line:
+            return
+        yield line.decode()
+
+# yields lines appended to a file, reading is done in an executor
+async def tail_source(path: str, poll: float = 0.2) -> AsyncIterator[str]:
+    loop = asyncio.get_running_loop()
+    with open(path, 'r') as file:
+        while True:
+            line = await loop.run_in_executor(None, file.readline)
+            if line:
+                yield line
+            else:
+                await asyncio.sleep(poll)
+
+# yields lines received from any client connected to the tcp socket
+async def socket_source(host: str, port: int) -> AsyncIterator[str]:
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            await queue.put(line.decode())
+        writer.close()
+
+    server = await asyncio.start_server(client, host, port)
+    async with server:
+        while True:
+            yield await queue.get()
+
+# ---------------- scheduler ---------------- #
+
+# scheduling state of the controller: the connected vehicles, their charging processes and the solar production
+# lives in the scheduler process, which executes all scheduling decisions one after another
+class Scheduler:
+    def __init__(self, simulation_parameters: SimulationParameters):
+        self.simulation_parameters = simulation_parameters
+        self.simulationdate = simulation_parameters.simulationdate
+        forecast: Forecast = simulation.fetch_forecast(simulation_parameters)
+        _, self.solarProduction = simulation.solar_production(simulation_parameters, forecast)
+
+        self.vehicles: List[Vehicle] = []
+        self.consumers: List[Consumer] = []
+        self.departed: List[Consumer] = []
+        self.overchargePower = [0.0]*24*60
+
+    def _arrive(self, entry: dict, t: datetime) -> Dict[str, np.ndarray]:
+        entry = {k: v for k, v in entry.items() if k != "event"}
+        entry.setdefault("time_arrive", t.strftime("%H:%M"))
+        vehicle = create_vehicles([entry], self.simulationdate)[0]
+        if any(v.id_user == vehicle.id_user for v in self.vehicles):
+            raise ValueError(f"A vehicle with ID {vehicle.id_user} is already connected.")
+        self.vehicles.append(vehicle)
+        arriving = [vehicle] if vehicle.energy_required>0 else []
+        return self._reschedule(arriving, t)
+
+    def _depart(self, id_user: str, t: datetime) -> Dict[str, np.ndarray]:
+        vehicle = next((v for v in self.vehicles if v.id_user == id_user), None)
+        if vehicle is None:
+            raise ValueError(f"No vehicle with ID {id_user} is connected.")
+        self.vehicles.remove(vehicle)
+        index = int((t-self.simulationdate).total_seconds()/60)
+        for c in self.consumers[:]:
+            if c.id_user != id_user:
+                continue
+            self.consumers.remove(c)
+            if c.power.interval.time_start > t: # charging not started yet
+                continue
+            # cut the power curves at the time of departure
+            for curve in (c.power, c.overpower):
+                if curve.interval is not None:
+                    start = int((curve.interval.time_start-self.simulationdate).total_seconds()/60)
+                    curve.truncate(index-start)
+                    curve.interval.time_end = min(curve.interval.time_end, t)
+            self.departed.append(c)
+        self.overchargePower = overcharge_power(self.simulationdate, self.consumers)
+        return self._reschedule([], t)
+
+    def _reschedule(self, arriving: List[Vehicle], t: datetime) -> Dict[str, np.ndarray]:
+        self.consumers, _, self.overchargePower = simulation.reschedule(self.simulation_parameters, self.solarProduction, self.vehicles, self.consumers, arriving, t, self.overchargePower)
+        return self._setpoints()
+
+    # updated forecast: given in the format of the API response (unix_seconds, forecast_values in MW) or fetched again
+    # only the charging processes affected by the changed solar production are replanned
+    def _forecast(self, event: dict, t: datetime) -> Dict[str, np.ndarray]:
+        if "unix_seconds" in event:
+            forecast = parse_response(event)
+        else:
+            forecast = simulation.fetch_forecast(self.simulation_parameters, refresh=True)
+        _, self.solarProduction, changed = simulation.update_production(self.simulation_parameters, self.solarProduction, forecast, t)
+        self.consumers, _, self.overchargePower = simulation.replan(self.simulation_parameters, self.solarProduction, self.vehicles, self.consumers, changed, t, self.overchargePower)
+        return self._setpoints()
+
+    def decide(self, kind: str, event: dict, t: datetime) -> Dict[str, np.ndarray]:
+        if kind == "arrive":
+            return self._arrive(event, t)
+        if kind == "forecast":
+            return self._forecast(event, t)
+        return self._depart(str(event.get("id_user")), t)
+
+    # returns the per-minute power of every connected vehicle
+    def _setpoints(self) -> Dict[str, np.ndarray]:
+        table = {}
+        for c in self.consumers:
+            table[c.id_user] = np.asarray(total_power_usage(self.simulationdate, [c]))+np.asarray(overcharge_power(self.simulationdate, [c]))
+        return table
+
+_scheduler: Optional[Scheduler] = None
+
+# create the scheduler once in the scheduler process
+# the output of the scheduling is written to stderr, so the setpoint stream of the controller on stdout stays clean
+def _init_scheduler(simulation_parameters: SimulationParameters) -> None:
+    global _scheduler
+    sys.stdout = sys.stderr
+    _scheduler = Scheduler(simulation_parameters)
+
+def _ready() -> bool:
+    return _scheduler is not None
+
+# executed in the scheduler process, returns the per-minute power of every connected vehicle
+def _decide(kind: str, event: dict, t: datetime) -> Dict[str, np.ndarray]:
+    return _scheduler.decide(kind, event, t)
+
+# ---------------- controller ---------------- #
+
+# the real-time controller schedules vehicles on arrival and departure events and emits charger setpoints every minute
+# the decisions are made in a separate scheduler process, the controller process only reads events and writes the output
+class RealtimeController:
+    def __init__(self, simulation_parameters: SimulationParameters, start: datetime, end: Optional[datetime] = None, speedup: float = 1.0, sla: float = 0.5, output=None):
+        self.simulationdate = simulation_parameters.simulationdate
+        self.start = start
+        self.end = end if end is not None else self.simulationdate+timedelta(days=1)
+        self.speedup = speedup
+        self.output = output if output is not None else sys.stdout
+
+        # the local search may only use half of the latency budget of a decision
+        scheduling = simulation_parameters.scheduling
+        if(scheduling.improvetime>sla/2):
+            print(f"Info: local search time reduced from {scheduling.improvetime*1000:.0f} ms to {sla/2*1000:.0f} ms to meet the latency SLA.", file=sys.stderr)
+            scheduling.improvetime = sla/2
+
+        self.setpointTable: Dict[str, np.ndarray] = {}
+
+        self.latency = LatencyTracker(sla)
+        self.events: asyncio.Queue = asyncio.Queue()
+        self.scheduler = ProcessPoolExecutor(max_workers=1, initializer=_init_scheduler, initargs=(simulation_parameters,)) # one process keeps the state and serializes all scheduling decisions
+        self.writer = ThreadPoolExecutor(max_workers=1) # keeps the output ordered
+
+        self._t0 = time.monotonic()
+
+    # returns the current simulated time, truncated to full minutes
+    def now(self) -> datetime:
+        elapsed = (time.monotonic()-self._t0)*self.speedup
+        t = self.start+timedelta(seconds=elapsed)
+        return t.replace(second=0, microsecond=0)
+
+    async def emit(self, message: dict) -> None:
+        line = json.dumps(message, default=str)+"\n"
+        await asyncio.get_running_loop().run_in_executor(self.writer, self._write, line)
+
+    def _write(self, line: str) -> None:
+        self.output.write(line)
+        self.output.flush()
+
+    # ---- event loop ---- #
+
+    async def read_events(self, source: AsyncIterator[str]) -> None:
+        async for line in source:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                await self.emit({"type": "error", "message": f"Invalid event: {line}"})
+                continue
+            await self.events.put((time.perf_counter(), event))
+
+    async def handle_events(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            received, event = await self.events.get()
+            t = self.now()
+            kind = event.get("event")
+            try:
+                if kind in ("arrive", "depart", "forecast"):
+                    table = await loop.run_in_executor(self.scheduler, _decide, kind, event, t)
+                elif kind == "stats":
+                    await self.emit({"type": "latency", **self.latency.to_dict()})
+                    continue
+                else:
+                    raise ValueError(f"Unknown event type {kind}.")
+            except Exception as e:
+                await self.emit({"type": "error", "time": t, "message": str(e)})
+                continue
+            self.setpointTable = table
+            latency = time.perf_counter()-received
+            self.latency.record(latency)
+            await self.emit({"type": "decision", "time": t, "event": kind, "id_user": str(event.get("id_user")), "latency_ms": latency*1000})
+
+    # emits the charger setpoints at every full minute of the simulated clock
+    async def emit_setpoints(self) -> None:
+        t = self.now()
+        while t < self.end:
+            index = int((t-self.simulationdate).total_seconds()/60)
+            setpoints = {id_user: float(power[index]) for id_user, power in self.setpointTable.items() if power[index] > 0}
+            await self.emit({"type": "setpoints", "time": t, "setpoints": setpoints, "total": sum(setpoints.values())})
+            next_minute = t+timedelta(minutes=1)
+            delay = ((next_minute-self.start).total_seconds()/self.speedup)-(time.monotonic()-self._t0)
+            await asyncio.sleep(max(delay, 0))
+            t = next_minute
+
+    async def run(self, source: AsyncIterator[str]) -> None:
+        # start the scheduler process (fetching the forecast) before the clock starts
+        try:
+            await asyncio.get_running_loop().run_in_executor(self.scheduler, _ready)
+        except BrokenProcessPool:
+            print("Error: The scheduler process failed to start.", file=sys.stderr)
+            self.scheduler.shutdown(wait=False)
+            self.writer.shutdown(wait=True)
+            exit(1)
+        self._t0 = time.monotonic()
+
+        reader = asyncio.create_task(self.read_events(source))
+        handler = asyncio.create_task(self.handle_events())
+        try:
+            await self.emit_setpoints()
+        finally:
+            reader.cancel()
+            handler.cancel()
+            await self.emit({"type": "latency", **self.latency.to_dict()})
+            self.scheduler.shutdown(wait=False)
+            self.writer.shutdown(wait=True)
+
+# ---------------- main ---------------- #
+
+async def main(simulation_parameters: SimulationParameters, args) -> None:
+    simulationdate = simulation_parameters.simulationdate
+
+    start = datetime.now()
+    if args.start is not None:
+        hours, minutes = args.start.split(":")
+        start = datetime(simulationdate.year, simulationdate.month, simulationdate.day, int(hours), int(minutes))
+    start = datetime(simulationdate.year, simulationdate.month, simulationdate.day, start.hour, start.minute)
+    end = None
+    if args.end is not None:
+        hours, minutes = args.end.split(":")
+        end = datetime(simulationdate.year, simulationdate.month, simulationdate.day, int(hours), int(minutes))
+
+    if args.source == "stdin":
+        source = stdin_source()
+    elif args.source == "file":
+        source = tail_source(args.path)
+    else:
+        source = socket_source(args.host, args.port)
+
+    controller = RealtimeController(simulation_parameters, start, end=end, speedup=args.speedup, sla=args.sla/1000)
+    await controller.run(source)
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(
+                    prog='controller.py',
+                    description='This program runs the scheduler as a real-time controller. Arrival and departure events are read as JSON lines from stdin, a tailed file or a TCP socket, e.g.\n\
+                        {"event": "arrive", "id_user": 1, "time_leave": "17:00", "percent_arrive": 40, "percent_leave": 80, "battery_size": 60, "charge_max": 11}\n\
+                        {"event": "depart", "id_user": 1}\n\
+                        {"event": "forecast"} (fetch the updated forecast, or pass it as unix_seconds and forecast_values like the API)\n\
+                        {"event": "stats"}\n\
+                        The controller emits the charger setpoints of every minute and the latency of every scheduling decision as JSON lines.')
+    p.add_argument('--source', choices=["stdin", "file", "socket"], default="stdin", help="Event source. Default: stdin")
+    p.add_argument('--path', type=str, help="File to tail if the event source is file.")
+    p.add_argument('--host', type=str, default="127.0.0.1", help="Host to listen on if the event source is socket. Default: 127.0.0.1")
+    p.add_argument('--port', type=int, default=8765, help="Port to listen on if the event source is socket. Default: 8765")
+    p.add_argument('--start', type=str, help="Start time of the controller clock HH:MM. Default: current time")
+    p.add_argument('--end', type=str, help="Stop the controller at HH:MM. Default: end of the day")
+    p.add_argument('--speedup', type=float, default=1.0, help="Speed of the controller clock relative to real time. Default: 1")
+    p.add_argument('--sla', type=float, default=500, help="Latency service level of a scheduling decision in milliseconds. Default: 500")
+    simulation_parameters = simulation.parse(p)
+
+    args = p.parse_args()
+    asyncio.run(main(simulation_parameters, args))
@@ -0,0 +1,143 @@
+import io
+import json
+import time
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import simulation
+from simulation import SimulationParameters
+from scheduling_framework.forecast_power import Forecast
+from scheduling_framework.parameters import SchedulingParameters
+from scheduling_framework.simulation_metrics import MetricsResult
+from scheduling_framework.result_sink import ResultSink
+from scheduling_framework.headless_plot import RenderJob, render_batch
+from run import simulate
+
+# ---------------- sites ---------------- #
+
+# parameters of a single parking site from the site manifest
+class Site:
+    def __init__(self, name: str, simulation_parameters: SimulationParameters):
+        self.name = name
+        self.simulation_parameters = simulation_parameters
+
+    # creates a site from a manifest entry, unspecified values are taken from the base parameters
+    @staticmethod
+    def from_dict(data: dict, base: SimulationParameters) -> "Site":
+        parameters = SimulationParameters.from_dict(base.to_dict())
+        if "testdatapath" not in data:
+            raise ValueError(f"Site {data.get('name')} has no testdatapath.")
+        parameters.testdatapath = data["testdatapath"]
+        parameters.peakSolarPower = data.get("peakSolarPower", base.peakSolarPower)
+        parameters.smoothForecast = data.get("smoothForecast", base.smoothForecast)
+        if "scheduling" in data:
+            parameters.scheduling = SchedulingParameters.from_dict({**base.scheduling.to_dict(), **data["scheduling"]})
+        parameters.exportresults = False
+        parameters.hideresults = True
+        parameters.plotpath = data.get("plotpath")
+        return Site(str(data.get("name", parameters.testdatapath)), parameters)
+
+# load the site manifest
+def read_manifest(file_path: str, base: SimulationParameters) -> List[Site]:
+    try:
+        with open(file_path, 'r') as file:
+            data = json.load(file)
+    except FileNotFoundError:
+        print(f"File {file_path} not found.")
+        exit()
+    except json.JSONDecodeError:
+        print(f"Error decoding JSON from {file_path}.")
+        exit()
+
+    sites = data["sites"] if isinstance(data, dict) else data
+    return [Site.from_dict(entry, base) for entry in sites]
+
+# ---------------- worker ---------------- #
+
+_shared_forecast: Optional[Forecast] = None
+
+# store the shared forecast once per worker process
+def _init_worker(forecast: Forecast) -> None:
+    global _shared_forecast
+    _shared_forecast = forecast
+
+# simulate one site with the shared forecast, scaled to the site by simulate
+# the plot of the site is returned as render job instead of being rendered in the worker
+def _simulate_site(site: Site, verbose: bool) -> Tuple[str, MetricsResult, float, List[RenderJob]]:
+    start = time.perf_counter()
+    renderjobs: List[RenderJob] = []
+    if verbose:
+        metrics = simulate(site.simulation_parameters, _shared_forecast, renderjobs=renderjobs)
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):
+            metrics = simulate(site.simulation_parameters, _shared_forecast, renderjobs=renderjobs)
+    return site.name, metrics, time.perf_counter()-start, renderjobs
+
+# ---------------- multi-site simulation ---------------- #
+
+# simulate all sites, then render the plots of the sites with a plot path in parallel
+def simulate_sites(sites: List[Site], forecast: Forecast, processes: Optional[int] = None, verbose: bool = False) -> List[Tuple[str, MetricsResult, float]]:
+    if(processes==1):
+        _init_worker(forecast)
+        outputs = [_simulate_site(site, verbose) for site in sites]
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(forecast,)) as executor:
+            outputs = list(executor.map(_simulate_site, sites, [verbose]*len(sites)))
+
+    for path in render_batch([job for *_, renderjobs in outputs for job in renderjobs], processes):
+        print(f"Plot written to {path}.")
+    return [(name, metrics, duration) for name, metrics, duration, _ in outputs]
+
+# print the results of all sites and the aggregated totals
+def print_results(sites: List[Site], results: List[Tuple[str, MetricsResult, float]]) -> None:
+    print(f"{'Site':<20}{'kWp':>8}{'BEVs':>6}{'required':>12}{'solar':>12}{'consumed':>12}{'grid':>12}{'unused':>12}{'missed':>8}{'time':>8}")
+    totals = [0.0]*7
+    for site, (name, metrics, duration) in zip(sites, results):
+        s = metrics.site
+        row = [len(metrics.vehicles), s.requiredEnergy/1000, s.solarEnergy/1000, s.consumedEnergy/1000, s.gridEnergy/1000, s.solarUnused/1000, len(metrics.requirementMissed())]
+        totals = [a+b for a, b in zip(totals, row)]
+        print(f"{name:<20}{site.simulation_parameters.peakSolarPower/1000:>8.0f}{row[0]:>6}{row[1]:>12.2f}{row[2]:>12.2f}{row[3]:>12.2f}{row[4]:>12.2f}{row[5]:>12.2f}{row[6]:>8}{duration:>7.1f}s")
+    print(f"{'Total':<20}{sum(site.simulation_parameters.peakSolarPower for site in sites)/1000:>8.0f}{int(totals[0]):>6}{totals[1]:>12.2f}{totals[2]:>12.2f}{totals[3]:>12.2f}{totals[4]:>12.2f}{totals[5]:>12.2f}{int(totals[6]):>8}")
+
+# export one csv row per site and the per-vehicle results of all sites
+def export_results(resultpath: str, simulationdate: datetime, sites: List[Site], results: List[Tuple[str, MetricsResult, float]]) -> None:
+    try:
+        with ResultSink(resultpath) as sink:
+            for site, (name, metrics, duration) in zip(sites, results):
+                sink.add(metrics, simulationdate, site.simulation_parameters.peakSolarPower, site=name)
+    except OSError as e:
+        print(f"Error: Failed to write data to file {resultpath}: {e}")
+
+# ---------------- main ---------------- #
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(
+                    prog='multi_site.py',
+                    description='This program runs the consecutive simulation for several parking sites in parallel. The solar forecast is fetched once and scaled to the peak solar power of each site. The site manifest is a JSON file, e.g.\n\
+                        {"sites": [{"name": "north", "testdatapath": "test/north.json", "peakSolarPower": 150000}, {"name": "south", "testdatapath": "test/south.json", "peakSolarPower": 300000, "scheduling": {"flatten": true}}]}\n\
+                        Values not set in the manifest are taken from the command line parameters.')
+    p.add_argument('manifest', help="Path of the site manifest *.json file.")
+    p.add_argument('-n', '--processes', type=int, help="Number of worker processes. Default: number of CPUs")
+    p.add_argument('--verbose', action='store_true', help="Print the simulation output of every site.")
+    simulation_parameters = simulation.parse(p)
+    args = p.parse_args()
+
+    sites = read_manifest(args.manifest, simulation_parameters)
+    if(len(sites)==0):
+        print("No sites to simulate.")
+        exit()
+
+    forecast: Forecast = simulation.fetch_forecast(simulation_parameters)
+
+    print(f"# Simulating {len(sites)} sites...")
+    start = time.perf_counter()
+    results = simulate_sites(sites, forecast, args.processes, args.verbose)
+    print(f"Simulated {len(sites)} sites in {time.perf_counter()-start:.1f}s.\n")
+
+    print_results(sites, results)
+
+    if(simulation_parameters.exportresults):
+        export_results(simulation_parameters.resultpath, simulation_parameters.simulationdate, sites, results)
@@ -0,0 +1,70 @@
+import argparse
+from datetime import datetime
+
+from scheduling_framework.decision_trace import DecisionTrace, diff_traces
+from scheduling_framework.headless_plot import RenderJob, render
+
+# ---------------- replay ---------------- #
+
+# rebuild the final state of a recorded run and compare its KPIs with the recorded ones
+def replay(trace: DecisionTrace, events=None, plotpath=None, quiet: bool = False) -> bool:
+    parameters = trace.header["parameters"]
+    simulationdate = datetime.fromtimestamp(parameters["simulationdate"])
+    consumers = trace.replay(events)
+    print(f"Replayed {len(trace.events) if events is None else min(events, len(trace.events))} of {len(trace.events)} scheduling events with {len(consumers)} consumers.")
+
+    metrics = trace.metrics(consumers)
+    if not quiet:
+        metrics.printVehicles()
+        metrics.printSite()
+
+    if plotpath is not None:
+        job = RenderJob.from_results(plotpath, simulationdate, parameters["peakSolarPower"], consumers, metrics)
+        print(f"Plot written to {render(job)}.")
+
+    if trace.result is None:
+        print("Warning: The trace has no result, the recorded run did not finish.")
+        return True
+    if events is not None and events<len(trace.events):
+        return True
+
+    scheduled = sum(1 for v in trace.header["vehicles"] if v["energy_required"]>0)
+    kpis = metrics.exportdata(simulationdate, parameters["peakSolarPower"], len(metrics.vehicles), scheduled)
+    recorded = trace.result["kpis"]
+    mismatches = [key for key, value in kpis.items() if isinstance(value, (int, float)) and abs(value-recorded.get(key, float("nan")))>1e-6*max(1, abs(value))]
+    if mismatches:
+        for key in mismatches:
+            print(f"Mismatch {key}: replayed {kpis[key]}, recorded {recorded.get(key)}")
+        return False
+    print("Replayed KPIs match the recorded run.")
+    return True
+
+# ---------------- main ---------------- #
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(
+                    prog='replay.py',
+                    description='This program rebuilds the final state of a simulation run from its decision trace (recorded with --tracepath) without running the scheduling search, prints the metrics and checks them against the KPIs recorded at the end of the run. With --diff, the decisions of two traces are compared event by event.')
+    p.add_argument('trace', type=str, help="Path of the recorded *.jsonl decision trace.")
+    p.add_argument('--diff', type=str, help="Compare the trace with this second trace and print all differences.")
+    p.add_argument('--events', type=int, help="Replay only the first n scheduling events.")
+    p.add_argument('-l', '--plotpath', type=str, help="Render the replayed scheduling plot headless to this *.png or *.svg file.")
+    p.add_argument('-q', '--quiet', action='store_true', help="Do not print the per-vehicle and site metrics.")
+    args = p.parse_args()
+
+    try:
+        trace = DecisionTrace.load(args.trace)
+        other = DecisionTrace.load(args.diff) if args.diff is not None else None
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        exit(1)
+
+    if other is not None:
+        differences = diff_traces(trace, other)
+        for difference in differences:
+            print(difference)
+        print(f"{len(differences)} differences between {args.trace} and {args.diff}.")
+        exit(1 if differences else 0)
+
+    if not replay(trace, args.events, args.plotpath, args.quiet):
+        exit(1)
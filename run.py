@@ -1,60 +1,56 @@
-import os
 import json
-import numpy as np
 import argparse
-from datetime import datetime
-from typing import List, Optional
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
 
-import scheduling_framework.energy_charts_api as energy_charts_api
 import simulation
-from simulation import SimulationParameters, generate_time_vector, total_power_usage
+from simulation import SimulationParameters, generate_time_vector
 from scheduling_framework.vehicle import Vehicle
+from scheduling_framework.fleet_ingest import read_fleet
 from scheduling_framework.forecast_power import Forecast
-from scheduling_framework.renewable_production import Production
+from scheduling_framework.energy_charts_api import ForecastError
 from scheduling_framework.consumer_model import Consumer
-from scheduling_framework.dynamic_scheduling import dynamic_scheduling, no_strategy, overcharge_scheduling
+from scheduling_framework.simulation_metrics import SimulationMetrics
+from scheduling_framework.result_sink import ResultSink
+from scheduling_framework.timeseries_store import TimeseriesStore
+from scheduling_framework.decision_trace import TraceRecorder
+from scheduling_framework.memory_profile import MemoryProfiler, MemoryBudgetExceeded
+from scheduling_framework.headless_plot import RenderJob
 
 # ---------------- functions ---------------- #
 
-# load vehicles from file
-def read_testdata_json(file_path: str) -> Optional[List[dict]]:
+# load the vehicles of the simulation date from a fleet file (.json, .jsonl or .csv)
+def read_vehicles(file_path: str, simulationdate: datetime) -> List[Vehicle]:
     try:
-        with open(file_path, 'r') as file:
-            data = json.load(file)
-            return data
+        return read_fleet(file_path, simulationdate)
     except FileNotFoundError:
         print(f"File {file_path} not found.")
         exit()
     except json.JSONDecodeError:
         print(f"Error decoding JSON from {file_path}.")
         exit()
+    except (KeyError, ValueError) as e:
+        print(f"Error reading the fleet from {file_path}: {e}")
+        exit()
 
 # ---------------- simulation ---------------- #
 
-def simulate(simulation_parameters: SimulationParameters):
+# simulate the scheduling process, an already fetched (unscaled) forecast can be passed to skip the API request
+# batch runs pass a shared result sink, otherwise the results are written directly if exportresults is set
+# updates: forecasts (unscaled) that replace the forecast at the given times, None fetches the forecast again
+# like the times of forecastupdates, the plan is then updated where the solar production changed
+# renderjobs: batch runs collect the plot of the plot path to render it later with render_batch
+def simulate(simulation_parameters: SimulationParameters, forecast: Optional[Forecast] = None, sink: Optional[ResultSink] = None, updates: Optional[Dict[datetime, Optional[Forecast]]] = None, renderjobs: Optional[List[RenderJob]] = None):
 
     simulationdate = simulation_parameters.simulationdate
+    memory = MemoryProfiler(simulation_parameters.memoryreport, simulation_parameters.memorybudget)
 
-    exportdata= {
-        "simulationdate" : None,
-        "peakSolarPower" : None,
-        "totalVehicles" : None,
-        "scheduledVehicles" : None,
-        "requiredEnergy" : None,
-        "solarEnergy" : None,
-        "consumedEnergy" : None,
-        "gridEnergy" : None,
-        "solarUnused" : None
-    }
-
+    memory.phase("read vehicles")
     print("# Reading vehicle data from file...")
-    data = read_testdata_json(simulation_parameters.testdatapath)
-    vehicles: List[Vehicle] = Vehicle.create_vehicles(data,simulationdate)
+    vehicles: List[Vehicle] = read_vehicles(simulation_parameters.testdatapath, simulationdate)
 
-    print("# Making forecast API request...")
-    forecast: Forecast = energy_charts_api.api_request(simulation_parameters.forecastapi)
-    forecast.scale(simulation_parameters.peakSolarPower, simulation_parameters.peakPowerForecast)
-    solarProduction = Production(forecast, simulationdate, smooth=simulation_parameters.smoothForecast) 
+    memory.phase("solar production")
+    forecast, solarProduction = simulation.solar_production(simulation_parameters, forecast)
 
     if(solarProduction.getEnergy()==0):
         print("Warning: No solar production for requested date!")
@@ -80,90 +76,84 @@ def simulate(simulation_parameters: SimulationParameters):
     if(required_energy>solar_energy):
         print("Warning: There is less solar power available than required. Power from the grid is necessary!")
 
-    exportdata["simulationdate"] = simulationdate
-    exportdata["peakSolarPower"] = simulation_parameters.peakSolarPower
-    exportdata["totalVehicles"] = len(allvehicles)
-    exportdata["scheduledVehicles"] = len(vehicles)
-    exportdata["requiredEnergy"] = required_energy*1000
-    exportdata["solarEnergy"] = solar_energy*1000
-
     print("\n------- Simulation starting -------")
+    memory.phase("scheduling")
 
     consumers: List[Consumer] = []
     powerUsage = [0.0]*24*60
     overchargePower = [0.0]*24*60
 
     time_vector: datetime = generate_time_vector(simulationdate)
+    updates = dict(updates or {})
+    for update in simulation_parameters.forecastupdates:
+        hours, minutes = update.split(":")
+        updates.setdefault(simulationdate+timedelta(hours=int(hours), minutes=int(minutes)), None)
+
+    trace: Optional[TraceRecorder] = None
+    if(simulation_parameters.tracepath is not None):
+        trace = TraceRecorder(simulation_parameters.tracepath, simulation_parameters.to_dict(), allvehicles, solarProduction.production)
 
     # iterate simulation for the simulationdate
     for t in time_vector:
+        if(t in updates):
+            try:
+                update = updates[t] if updates[t] is not None else simulation.fetch_forecast(simulation_parameters, refresh=True)
+                forecast, solarProduction, changed = simulation.update_production(simulation_parameters, solarProduction, update, t)
+                consumers, powerUsage, overchargePower = simulation.replan(simulation_parameters, solarProduction, vehicles, consumers, changed, t, overchargePower, trace)
+                memory.check()
+            except ForecastError as e:
+                print(f"Warning: Forecast update at {t} failed, the plan is kept. {e}")
+
         arriving_vehicles: List[Vehicle] = []
 
         arriving_vehicles = Vehicle.vehicles_arriving(vehicles,t)
 
-        schedule_vehicles = arriving_vehicles
-        if(len(schedule_vehicles) != 0):
-            consumer_ids = Consumer.unstarted_consumers(consumers,t)
-            unstarted_vehicles = [v for v in vehicles if v.id_user in consumer_ids]
-            for c in consumers[:]:  # Remove consumers that will be rescheduled
-                if c.id_user in consumer_ids:
-                    consumers.remove(c)
-            schedule_vehicles.extend(unstarted_vehicles) # reschedule unstarted consumers
-            print(f"{t}: "+"Schedule vehicles: "+str([v.id_user for v in schedule_vehicles]))
-
-            # remove overcharging after time t
-            for c in consumers:
-                if c.overpower.interval is not None:
-                    if c.overpower.interval.timeInInterval(t):
-                        index_in_interval = int((t.timestamp()-c.overpower.interval.time_start.timestamp())/60)
-                        c.overpower.interval.time_end = t #-timedelta(minutes=1)
-                        c.overpower.power = c.overpower.power[0:index_in_interval]
-
-            powerUsage = total_power_usage(simulationdate, consumers)
-            renewable_power = Production.renewable_available(solarProduction.production,powerUsage)
-            
-            added_consumers = dynamic_scheduling(simulation_parameters.scheduling, schedule_vehicles, t, renewable_power)
-            # added_consumers = no_strategy(simulation_parameters.scheduling, schedule_vehicles, t, renewable_power) # no_strategy instantly starts the charging process for arriving vehicles. There will be no overcharging.
-
-            consumers.extend(added_consumers)
-
-            powerUsage = total_power_usage(simulationdate, consumers)
-
-            ##### overcharging logic #####
-            if(simulation_parameters.scheduling.overcharge):
-                number_scheduled, consumers, overchargePower = overcharge_scheduling(consumers,vehicles,solarProduction,powerUsage,t)
-
-            powerUsage = list(np.add(powerUsage,overchargePower))
+        if(len(arriving_vehicles) != 0):
+            consumers, powerUsage, overchargePower = simulation.reschedule(simulation_parameters, solarProduction, vehicles, consumers, arriving_vehicles, t, overchargePower, trace)
+            memory.check()
 
     print("------- Simulation ended -------\n")
 
-    Consumer.printAllStats(allvehicles,consumers)
-
-    total_consumed_energy =(sum(powerUsage)/60/1000)
-    grid_energy = (sum([max(-(solarProduction.production[i]-powerUsage[i]),0) for i in range(len(powerUsage))])/60/1000)
-    unused_solar_energy = (sum([max(solarProduction.production[i]-powerUsage[i],0) for i in range(len(powerUsage))])/60/1000)
-    ### print stats (finished) ###
-    print(f"Total energy consumed: {total_consumed_energy:.2f} kWh ({(grid_energy/total_consumed_energy*100):.0f}% grid, {((1-grid_energy/total_consumed_energy)*100):.0f}% solar)")
-    print(f"Grid energy used: {grid_energy:.2f} kWh ({(grid_energy/total_consumed_energy*100):.0f}% from total energy)")
-    print(f"Solar energy unused: {unused_solar_energy:.2f} kWh ({(unused_solar_energy/solar_energy*100 if solar_energy!=0 else 0):.0f}% from total solar energy)")
+    memory.phase("metrics")
+    metrics = SimulationMetrics.compute(solarProduction.production, powerUsage, overchargePower, allvehicles, consumers)
+    metrics.printVehicles()
+    metrics.printSite()
 
-    exportdata["consumedEnergy"] = total_consumed_energy*1000
-    exportdata["gridEnergy"] = grid_energy*1000
-    exportdata["solarUnused"] = unused_solar_energy*1000
+    memory.phase("export")
+    if(trace is not None):
+        trace.result(allvehicles, metrics.exportdata(simulationdate, simulation_parameters.peakSolarPower, len(allvehicles), len(vehicles)))
+        print(f"Decision trace written to {simulation_parameters.tracepath}.")
 
-    if(simulation_parameters.exportresults):
-        if(not os.path.exists(simulation_parameters.resultpath)):
-            try:
-                simulation.csv_write(simulation_parameters.resultpath, exportdata.keys())
-            except:
-                print(f"Error: Failed to write data to file {simulation_parameters.resultpath}.")
+    if(sink is not None):
+        sink.add(metrics, simulationdate, simulation_parameters.peakSolarPower, len(allvehicles), len(vehicles))
+    elif(simulation_parameters.exportresults):
         try:
-            simulation.csv_write(simulation_parameters.resultpath, exportdata.values())
-        except:
-            print(f"Error: Failed to write data to file {simulation_parameters.resultpath}.")
-
+            with ResultSink(simulation_parameters.resultpath) as resultsink:
+                resultsink.add(metrics, simulationdate, simulation_parameters.peakSolarPower, len(allvehicles), len(vehicles))
+        except OSError as e:
+            print(f"Error: Failed to write data to file {simulation_parameters.resultpath}: {e}")
+
+    if(simulation_parameters.timeseriespath is not None):
+        metadata = {"testdatapath": simulation_parameters.testdatapath,
+                    "scheduling": simulation_parameters.scheduling.to_dict(),
+                    **metrics.exportdata(simulationdate, simulation_parameters.peakSolarPower, len(allvehicles), len(vehicles))}
+        try:
+            TimeseriesStore(simulation_parameters.timeseriespath).append(metrics, metadata)
+        except OSError as e:
+            print(f"Error: Failed to write timeseries to {simulation_parameters.timeseriespath}: {e}")
+
+    memory.phase("plot")
+    if(simulation_parameters.plotpath is not None and renderjobs is not None):
+        renderjobs.append(simulation.render_job(consumers,forecast,simulation_parameters,metrics))
+    elif(simulation_parameters.plotpath is not None):
+        simulation.render_results(consumers,forecast,simulation_parameters,metrics)
     if(not simulation_parameters.hideresults):
-        simulation.visualize_results(consumers,solarProduction,forecast,simulation_parameters,powerUsage,overchargePower)
+        simulation.visualize_results(consumers,solarProduction,forecast,simulation_parameters,metrics)
+
+    memory.finish()
+    if(memory.enabled):
+        print(memory.report())
+    return metrics
 
 # ---------------- main ---------------- #
     
@@ -172,4 +162,11 @@ if __name__ == "__main__":
                     prog='run.py',
                     description='This program allows the consecutive simulation of the scheduling process. By running this program, all vehicles specified in the testdata.json file are scheduled after arriving, and eventually rescheduled when other vehicles arrive. The simulation outputs all relevant actions to the command line, exports the results to a *.csv file and opens the scheduling plot at the end.')
     simulation_parameters = simulation.parse(p)
-    simulate(simulation_parameters)
\ No newline at end of file
+    try:
+        simulate(simulation_parameters)
+    except ForecastError as e:
+        print(e)
+        exit()
+    except MemoryBudgetExceeded as e:
+        print(e)
+        exit(1)
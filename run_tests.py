@@ -1,4 +1,13 @@
+import os
+import argparse
 import datetime
+from typing import List, Optional
+
+import scheduling_framework.energy_charts_api as energy_charts_api
+from scheduling_framework.energy_charts_api import ForecastError
+from scheduling_framework.checkpoint import Checkpoint, cell_key
+from scheduling_framework.result_sink import ResultSink
+from scheduling_framework.headless_plot import RenderJob, render_batch
 
 from scheduling_framework.parameters import SimulationParameters
 from generate_testdata import generate_testdata,TestdataParameters
@@ -10,11 +19,33 @@ YEAR=2024
 MONTH=2
 DAYS=29
 
-def run_tests():
+CHECKPOINTPATH="results/run_tests.jsonl"
+TESTDATAPATH="results/run_tests_testdata.json" # generated fleet of the current cell, test/testdata.json is left untouched
+
+# returns all parameters of a cell that influence its result
+def cell_parameters(simulation_parameters: SimulationParameters, testdata_parameters: TestdataParameters) -> dict:
+    simulation = simulation_parameters.to_dict()
+    for name in ["storepath", "testdatapath", "resultpath", "plotpath", "timeseriespath", "tracepath", "memoryreport", "memorybudget", "productioncachepath", "exportresults", "hideresults", "forecastapi"]:
+        simulation.pop(name)
+    testdata = dict(vars(testdata_parameters))
+    testdata.pop("filename")
+    return {"simulation": simulation, "testdata": testdata}
+
+# simulate one cell, its results are added to the sink and its plot (if any) to the render jobs, returns its result row
+def run_cell(simulation_parameters: SimulationParameters, testdata_parameters: TestdataParameters, sink: ResultSink, renderjobs: List[RenderJob]) -> dict:
+    generate_testdata(testdata_parameters)
+    metrics = simulate(simulation_parameters, sink=sink, renderjobs=renderjobs)
+    return metrics.exportdata(simulation_parameters.simulationdate, simulation_parameters.peakSolarPower, len(metrics.vehicles), sum(v.scheduled for v in metrics.vehicles))
+
+# run all cells of the study, cells completed in an earlier run are skipped
+# plotdir: the plots of the cells of a day are rendered to this directory in parallel after the day
+def run_tests(checkpointpath: str = CHECKPOINTPATH, restart: bool = False, timeseriespath: Optional[str] = None, plotdir: Optional[str] = None):
     simulation_parameters = SimulationParameters()
     simulation_parameters.peakSolarPower=150_000
     simulation_parameters.hideresults=True
-    simulation_parameters.exportresults=True
+    simulation_parameters.exportresults=False # the results of every completed cell are appended by the sink
+    simulation_parameters.timeseriespath=timeseriespath
+    simulation_parameters.testdatapath=TESTDATAPATH
     simulation_parameters.scheduling.allowgrid=False
     simulation_parameters.scheduling.flatten=False
     simulation_parameters.scheduling.overcharge=False
@@ -22,17 +53,69 @@ def run_tests():
 
     testdata_parameters = TestdataParameters()
     testdata_parameters.vehiclecount=10
-    testdata_parameters.filename="test/testdata.json"
-    
+    testdata_parameters.filename=TESTDATAPATH
+    os.makedirs(os.path.dirname(TESTDATAPATH), exist_ok=True)
+
+    if(restart and os.path.exists(checkpointpath)):
+        os.remove(checkpointpath)
+    checkpoint = Checkpoint(checkpointpath)
+    sink = ResultSink(simulation_parameters.resultpath)
+
+    # fetch the forecast for the whole study once, the daily requests are split locally
+    try:
+        energy_charts_api.prefetch(datetime.date(YEAR,MONTH,1)-datetime.timedelta(days=1),
+                                   datetime.date(YEAR,MONTH,DAYS)+datetime.timedelta(days=1),
+                                   simulation_parameters.forecastserver)
+    except ForecastError as e:
+        print(f"Warning: Prefetching the forecast failed, fetching per day. {e}")
+
+    skipped = 0
+    failed = 0
     for d in range(1,DAYS+1):
+        renderjobs: List[RenderJob] = []
         for i in range(0,ITERATIONS):
             simulation_parameters.simulationdate=datetime.datetime(YEAR,MONTH,d)
             simulation_parameters.update_forecastapi()
             testdata_parameters.seed=i
+            if(plotdir is not None):
+                simulation_parameters.plotpath=os.path.join(plotdir, f"{simulation_parameters.simulationdate.date()}_{i}.png")
+
+            cell = cell_parameters(simulation_parameters, testdata_parameters)
+            key = cell_key(cell)
+            if(checkpoint.done(key)):
+                skipped+=1
+                continue
+
+            try:
+                result = run_cell(simulation_parameters, testdata_parameters, sink, renderjobs)
+            except (Exception, SystemExit) as e: # a failed cell must not end the study
+                print(f"Error: Cell {simulation_parameters.simulationdate.date()} seed {i} failed: {e!r}")
+                checkpoint.record(key, cell, "failed", error=repr(e))
+                sink.discard() # nothing of a failed cell is exported
+                failed+=1
+                continue
+            try:
+                sink.flush() # appended before the cell is recorded as done, so a completed cell is never missing
+            except OSError as e:
+                print(f"Error: Failed to write data to file {simulation_parameters.resultpath}: {e}")
+            checkpoint.record(key, cell, "done", result=result)
+
+        if(len(renderjobs)>0):
+            os.makedirs(plotdir, exist_ok=True)
+            render_batch(renderjobs)
+            print(f"{len(renderjobs)} plots written to {plotdir}.")
 
-            generate_testdata(testdata_parameters)
-            
-            simulate(simulation_parameters)
+    print(f"Study finished: {DAYS*ITERATIONS-skipped-failed} cells simulated, {skipped} skipped (already completed), {failed} failed.")
+    if(failed>0):
+        print("Failed cells are retried on the next run.")
 
 if __name__ == "__main__":
-    run_tests()
\ No newline at end of file
+    p = argparse.ArgumentParser(
+                    prog='run_tests.py',
+                    description='This program runs the simulation for every day of the study period with several generated test datasets. Completed cells (date, seed and parameters) are recorded in a checkpoint file, so an interrupted study continues where it stopped. Failed cells are recorded and retried on the next run.')
+    p.add_argument('--checkpoint', type=str, default=CHECKPOINTPATH, help=f"Path of the checkpoint file. Default: {CHECKPOINTPATH}")
+    p.add_argument('--restart', action='store_true', help="Discard the checkpoint and simulate all cells again.")
+    p.add_argument('--timeseriespath', type=str, help="Append the per-minute power curves of every cell to the timeseries store in this directory.")
+    p.add_argument('--plotdir', type=str, help="Render the scheduling plot of every simulated cell to this directory, the plots of a day are rendered in parallel.")
+    args = p.parse_args()
+    run_tests(args.checkpoint, args.restart, args.timeseriespath, args.plotdir)
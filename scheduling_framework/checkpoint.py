@@ -0,0 +1,59 @@
+import os
+import json
+import hashlib
+from typing import Dict, List, Optional
+
+# returns the key of an experiment cell, derived from all parameters that influence its result
+def cell_key(cell: dict) -> str:
+    return hashlib.sha1(json.dumps(cell, sort_keys=True, default=str).encode()).hexdigest()
+
+# journal of finished experiment cells, every cell is appended as one json line and synced to disk
+# a line cut off by a crash is ignored when loading, so a cell is either fully recorded or not at all
+class Checkpoint:
+    def __init__(self, path: str):
+        self.path = path
+        self.cells: Dict[str, dict] = {}
+        self._newline = False # the file ends with a cut off line
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding="utf-8") as file:
+            content = file.read()
+        self._newline = len(content)>0 and not content.endswith("\n")
+        for line in content.splitlines():
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            self.cells[entry["key"]] = entry # later records override earlier failures
+
+    # check if the cell has been completed successfully
+    def done(self, key: str) -> bool:
+        return self.cells.get(key, {}).get("status") == "done"
+
+    # record the result or failure of a cell
+    def record(self, key: str, cell: dict, status: str, result: Optional[dict] = None, error: Optional[str] = None) -> None:
+        entry = {"key": key, "status": status, "cell": cell, "result": result, "error": error}
+        line = json.dumps(entry, default=str)+"\n"
+        if self._newline:
+            line = "\n"+line
+            self._newline = False
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a', encoding="utf-8") as file:
+            file.write(line)
+            file.flush()
+            os.fsync(file.fileno())
+        self.cells[key] = entry
+
+    # returns the results of all completed cells in the order of completion
+    def results(self) -> List[dict]:
+        return [entry["result"] for entry in self.cells.values() if entry["status"] == "done"]
+
+    # returns all failed cells
+    def failed(self) -> List[dict]:
+        return [entry for entry in self.cells.values() if entry["status"] == "failed"]
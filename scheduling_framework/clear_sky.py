@@ -0,0 +1,61 @@
+import numpy as np
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from scheduling_framework.forecast_power import Forecast
+
+# default site: center of Austria, the country of the energy-charts forecast
+LATITUDE = 47.5
+LONGITUDE = 14.5
+
+# returns the cosine of the solar zenith angle for each epoch second (NOAA solar position approximation)
+def cos_zenith(seconds: np.ndarray, latitude: float, longitude: float) -> np.ndarray:
+    utc = np.asarray(seconds, dtype=float).astype('datetime64[s]')
+    dayofyear = (utc.astype('datetime64[D]')-utc.astype('datetime64[Y]')).astype(float)
+    hour = (np.asarray(seconds, dtype=float) % 86400)/3600
+
+    gamma = 2*np.pi/365*(dayofyear+(hour-12)/24)
+    eqtime = 229.18*(0.000075+0.001868*np.cos(gamma)-0.032077*np.sin(gamma)-0.014615*np.cos(2*gamma)-0.040849*np.sin(2*gamma))
+    declination = (0.006918-0.399912*np.cos(gamma)+0.070257*np.sin(gamma)-0.006758*np.cos(2*gamma)
+                   +0.000907*np.sin(2*gamma)-0.002697*np.cos(3*gamma)+0.00148*np.sin(3*gamma))
+
+    solartime = hour*60+eqtime+4*longitude # true solar time in minutes
+    hourangle = np.radians(solartime/4-180)
+    lat = np.radians(latitude)
+    return np.sin(lat)*np.sin(declination)+np.cos(lat)*np.cos(declination)*np.cos(hourangle)
+
+# returns smooth random attenuation factors between 1-cloudiness and 1
+def cloud_factor(n: int, cloudiness: float, seed: Optional[int] = None, window: int = 30) -> np.ndarray:
+    if cloudiness<=0:
+        return np.ones(n)
+    rng = np.random.default_rng(seed)
+    noise = np.cumsum(rng.standard_normal(n+window))
+    smooth = (noise[window:]-noise[:-window])/np.sqrt(window) # moving average with unit variance
+    return 1-cloudiness*(0.5+0.5*np.tanh(smooth))
+
+# returns the clear-sky PV power in W for each epoch second, using the Haurwitz irradiance model
+def clear_sky_power(seconds: np.ndarray, peakpower: float, latitude: float = LATITUDE, longitude: float = LONGITUDE, cloudiness: float = 0, seed: Optional[int] = None) -> np.ndarray:
+    cosz = cos_zenith(seconds, latitude, longitude)
+    irradiance = np.zeros(len(cosz))
+    day = cosz>0
+    irradiance[day] = 1098*cosz[day]*np.exp(-0.057/cosz[day]) # W/m²
+    power = peakpower*np.minimum(irradiance/1000, 1) # peak power at standard test conditions of 1000 W/m²
+    return power*cloud_factor(len(power), cloudiness, seed)
+
+# returns the epoch seconds of every minute of the given (local) days
+def day_minutes(days: List[date]) -> np.ndarray:
+    midnights = np.array([datetime(d.year, d.month, d.day).timestamp() for d in days])
+    return (midnights[:,None]+60*np.arange(24*60)[None,:]).ravel()
+
+# returns the per-minute clear-sky production of each day as array (days x 1440)
+def clear_sky_profiles(days: List[date], peakpower: float, latitude: float = LATITUDE, longitude: float = LONGITUDE, cloudiness: float = 0, seed: Optional[int] = None) -> np.ndarray:
+    power = clear_sky_power(day_minutes(days), peakpower, latitude, longitude, cloudiness, seed)
+    return power.reshape(len(days), 24*60)
+
+# synthetic forecast from start to end date (inclusive), replacing the energy-charts API request
+def clear_sky_forecast(start: date, end: date, peakpower: float, latitude: float = LATITUDE, longitude: float = LONGITUDE, cloudiness: float = 0, seed: Optional[int] = None, resolution: int = 15) -> Forecast:
+    days = [start+timedelta(days=i) for i in range((end-start).days+1)]
+    seconds = day_minutes(days)[::resolution]
+    if seed is None:
+        seed = start.toordinal()
+    return Forecast(seconds=seconds, values=clear_sky_power(seconds, peakpower, latitude, longitude, cloudiness, seed))
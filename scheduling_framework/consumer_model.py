@@ -1,9 +1,9 @@
 import random
+import numpy as np
 import matplotlib.patches as patches
+from bisect import bisect_right
 from datetime import datetime, timedelta
-from typing import List
-
-from scheduling_framework.vehicle import Vehicle
+from typing import List, Optional, Tuple
 
 # Define intervals with start and end time using TimeInterval
 class TimeInterval:
@@ -43,39 +43,124 @@ class TimeInterval:
         return TimeInterval(time_start, time_end)
     
 # PowerCurve defines a (chaning) power curve within certain interval limits
+# the curve is stored as segments starting at the breakpoints (minutes from the interval start),
+# each with a start value and a slope per minute, so constant curves and linear ramps need a single segment
 class PowerCurve:
-    def __init__(self, power: list[float], interval: TimeInterval) -> None:
-        self.power: list[float] = power
+    def __init__(self, power: Optional[List[float]], interval: Optional[TimeInterval]) -> None:
         self.interval: TimeInterval = interval
-    
+        self.breakpoints, self.values, self.slopes = PowerCurve._segments(power if power is not None else [])
+        self.length = len(power) if power is not None else 0 # number of minutes
+
+    # creates a curve from segments without expanding it to minutes
+    @staticmethod
+    def from_segments(breakpoints: List[int], values: List[float], slopes: List[float], length: int, interval: Optional[TimeInterval]) -> "PowerCurve":
+        curve = PowerCurve(None, interval)
+        curve.breakpoints = np.asarray(breakpoints, dtype=np.int64)
+        curve.values = np.asarray(values, dtype=float)
+        curve.slopes = np.asarray(slopes, dtype=float)
+        curve.length = int(length)
+        return curve
+
+    # splits the per-minute power into linear segments, a segment starts wherever the per-minute change differs
+    @staticmethod
+    def _segments(power: List[float]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        power = np.asarray(power, dtype=float)
+        if(len(power)==0):
+            return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+        if(len(power)==1):
+            return np.zeros(1, dtype=np.int64), power.copy(), np.zeros(1)
+        slope = np.diff(power)
+        changes = np.flatnonzero(~np.isclose(slope[1:], slope[:-1], rtol=1e-9, atol=1e-9))+1
+        breakpoints = np.concatenate(([0], changes)).astype(np.int64)
+        slopes = slope[breakpoints]
+        slopes[np.diff(np.append(breakpoints, len(power)))==1] = 0.0 # single minute segments
+        return breakpoints, power[breakpoints], slopes
+
+    # returns the number of minutes of each segment
+    def _lengths(self) -> np.ndarray:
+        return np.diff(np.append(self.breakpoints, self.length))
+
+    # per-minute power values of the curve
+    @property
+    def power(self) -> List[float]:
+        return self.dense().tolist()
+
+    @power.setter
+    def power(self, power: List[float]) -> None:
+        self.breakpoints, self.values, self.slopes = PowerCurve._segments(power if power is not None else [])
+        self.length = len(power) if power is not None else 0
+
+    # returns the per-minute power values as array
+    def dense(self) -> np.ndarray:
+        lengths = self._lengths()
+        offsets = np.arange(self.length)-np.repeat(self.breakpoints, lengths)
+        return np.repeat(self.values, lengths)+np.repeat(self.slopes, lengths)*offsets
+
     # returns the power during the specified timestamp
     def getPower(self, timestamp: datetime) -> float:
         if(timestamp<self.interval.time_start or timestamp>self.interval.time_end):
             return 0
         minutes_diff = int((timestamp - self.interval.time_start).total_seconds() / 60.0)
-        if minutes_diff<0 or minutes_diff>=self.interval.intervalLength():
+        if minutes_diff<0 or minutes_diff>=self.interval.intervalLength() or minutes_diff>=self.length:
             return 0
-        return self.power[minutes_diff]
-    
+        i = bisect_right(self.breakpoints, minutes_diff)-1
+        return float(self.values[i]+self.slopes[i]*(minutes_diff-self.breakpoints[i]))
+
+    # returns the power of the last minute
+    def lastPower(self) -> float:
+        if(self.length==0):
+            raise IndexError("The power curve is empty.")
+        return float(self.values[-1]+self.slopes[-1]*(self.length-1-self.breakpoints[-1]))
+
     # returns the total energy in Watts
     def getEnergy(self) -> float:
-        if(self.power is None):
-            return 0
-        return sum(self.power)/60
-    
+        lengths = self._lengths()
+        return float(np.sum(self.values*lengths+self.slopes*lengths*(lengths-1)/2)/60)
+
+    # keep only the first minutes of the curve
+    def truncate(self, minutes: int) -> None:
+        minutes = max(min(minutes, self.length), 0)
+        keep = self.breakpoints<minutes
+        self.breakpoints = self.breakpoints[keep]
+        self.values = self.values[keep]
+        self.slopes = self.slopes[keep]
+        self.length = minutes
+
+    # returns the same curve within another interval
+    def withInterval(self, interval: TimeInterval) -> "PowerCurve":
+        return PowerCurve.from_segments(self.breakpoints, self.values, self.slopes, self.length, interval)
+
+    # add the curve to the per-minute ledger, starting at the given index
+    def addTo(self, ledger: np.ndarray, start: int) -> None:
+        lengths = self._lengths()
+        for b, value, slope, length in zip(self.breakpoints, self.values, self.slopes, lengths):
+            begin = max(start+b, 0)
+            end = min(start+b+length, len(ledger))
+            if(begin>=end):
+                continue
+            if(slope==0):
+                ledger[begin:end] += value
+            else:
+                ledger[begin:end] += value+slope*np.arange(begin-start-b, end-start-b)
+
     def to_dict(self):
         return {
-            "power": self.power,
+            "breakpoints": self.breakpoints.tolist(),
+            "values": self.values.tolist(),
+            "slopes": self.slopes.tolist(),
+            "length": self.length,
             "interval": self.interval.to_dict() if self.interval else None
         }
     
     @staticmethod
     def from_dict(data: dict) -> "PowerCurve":
         interval = TimeInterval.from_dict(data["interval"])
-        return PowerCurve(
-            power=data["power"],
-            interval=interval
-        )
+        if "power" in data: # per-minute format of older simulation files
+            return PowerCurve(
+                power=data["power"],
+                interval=interval
+            )
+        return PowerCurve.from_segments(data["breakpoints"], data["values"], data["slopes"], data["length"], interval)
     
 class Consumer:
     def __init__(self, id_user: str, power: PowerCurve, overpower: PowerCurve = PowerCurve([],None)):
@@ -85,7 +170,7 @@ class Consumer:
 
     def __str__(self) -> str:
         return (f"ID User: {self.id_user}\n"
-                f"Total Power: {(sum(self.power.power)/60/1000):.2f} kWh (+{(sum(self.overpower.power)/60/1000 if self.overpower.power is not None else 0):.2f} kWh overcharge)\n"
+                f"Total Power: {(self.power.getEnergy()/1000):.2f} kWh (+{(self.overpower.getEnergy()/1000):.2f} kWh overcharge)\n"
                 f"Time Start: {self.power.interval.time_start}\n"
                 f"Time End: {self.power.interval.time_end}\n"
                 f"Interval length: {self.power.interval.intervalLength()} min\n")
@@ -107,33 +192,6 @@ class Consumer:
         consumer_ids = [c.id_user for c in consumers if c.power.interval.time_start>timestamp]
         return consumer_ids
     
-    def printAllStats(vehicles: List[Vehicle], consumers: List["Consumer"]) -> None:
-        print('\n')
-        requirement_missed = []
-        for v in vehicles:
-            print(f"User ID: {v.id_user}")
-            print(f"Energy required: {v.energy_required:.1f} kWh")
-            print(f"SoC start: {v.percent_arrive:.0f}%")
-            print(f"SoC required: {v.percent_leave:.0f}%")
-            consumer = next((c for c in consumers if c.id_user == v.id_user), None)
-            if(consumer==None):
-                print("Vehicle not scheduled.")
-                print(f"Energy charged: 0 kWh")
-            else:
-                total_energy = consumer.power.getEnergy()/1000+(consumer.overpower.getEnergy()/1000 if consumer.overpower is not None else 0)
-                soc_charged = (v.battery_size*v.percent_arrive/100+total_energy)/v.battery_size
-                print(f"SoC charged: {soc_charged*100:.0f}%")
-                print(f"Energy charged: {total_energy:.1f} kWh")
-                print(f"Energy missing: {v.energy_required-total_energy:.2f}kWh")
-                print(f"Overpower energy: {consumer.overpower.getEnergy()/1000:.2f}kWh")
-                if(v.energy_required-total_energy>v.charge_max/60):
-                    requirement_missed.append(consumer.id_user)
-            print("------------------------")
-        if(len(requirement_missed)==0):
-            print("All vehicles are charged successfully.")
-        else:
-            print(f"Required SoC missed for vehicles: {requirement_missed}")    
-
     def to_dict(self):
         return {
             "id_user": self.id_user,
@@ -220,21 +278,21 @@ class ConsumerPlot:
 
             time += timedelta(minutes=1)
             
+    # returns a random color with the given string as seed for the random generator
+    @staticmethod
+    def color(string: str):
+        random.seed(string)
+        return (random.uniform(0, 1), random.uniform(0, 1), random.uniform(0, 1))
+
     # visualize the consumer plot
     def visualize(self,ax) -> None:
-        
-        # returns a random color with the given string as seed for the random generator
-        def color(string: str):
-            random.seed(string)
-            return (random.uniform(0, 1), random.uniform(0, 1), random.uniform(0, 1))
-
         # for eacht segment, add a rectangle to the visualization
         for s in self.consumerSegments:
             time_start = s.interval.time_start
             power_start = s.basePower
             width = timedelta(minutes=s.interval.intervalLength())+timedelta(minutes=1)
             height = s.power
-            randomcolor=color(s.id_user)
+            randomcolor=ConsumerPlot.color(s.id_user)
             rect = patches.Rectangle((time_start, power_start), 
                                     width, 
                                     height, 
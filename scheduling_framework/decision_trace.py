@@ -0,0 +1,176 @@
+import json
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from scheduling_framework.vehicle import Vehicle
+from scheduling_framework.consumer_model import PowerCurve, Consumer
+from scheduling_framework.simulation_metrics import MetricsResult, SimulationMetrics
+
+# parameters that do not influence the scheduling decisions, ignored when comparing traces
+OUTPUTPARAMETERS = ("storepath", "resultpath", "plotpath", "timeseriespath", "tracepath", "exportresults", "hideresults")
+
+# records the scheduling decisions of a simulation run as json lines
+# header: parameters, vehicles and solar production, then one line per scheduling event with the new
+# consumers and all changed overcharge curves, finally the vehicles and KPIs at the end of the run
+class TraceRecorder:
+    def __init__(self, path: str, parameters: dict, vehicles: List[Vehicle], production: List[float]):
+        self.path = path
+        self.file = open(path, 'w', encoding="utf-8")
+        self.overpower: Dict[str, str] = {} # last recorded overcharge curve of every consumer
+        self._write({"type": "header",
+                     "parameters": parameters,
+                     "vehicles": Vehicle.vehicles_to_dict(vehicles),
+                     "production": PowerCurve(list(production), None).to_dict()})
+
+    def _write(self, entry: dict) -> None:
+        self.file.write(json.dumps(entry, default=str)+"\n")
+        self.file.flush()
+
+    # record a scheduling event at time t
+    def schedule(self, t: datetime, arriving: List[str], rescheduled: List[str], added: List[Consumer], consumers: List[Consumer]) -> None:
+        for id_user in rescheduled:
+            self.overpower.pop(id_user, None)
+        overpower = {}
+        for c in consumers:
+            curve = json.dumps(c.overpower.to_dict())
+            if self.overpower.get(c.id_user) != curve:
+                overpower[c.id_user] = c.overpower.to_dict()
+                self.overpower[c.id_user] = curve
+        self._write({"type": "schedule",
+                     "t": t.timestamp(),
+                     "arriving": arriving,
+                     "rescheduled": rescheduled,
+                     "consumers": [{"id_user": c.id_user, "power": c.power.to_dict()} for c in added],
+                     "overpower": overpower})
+
+    # record the solar production of a forecast update at time t
+    def forecast(self, t: datetime, production: List[float]) -> None:
+        self._write({"type": "forecast",
+                     "t": t.timestamp(),
+                     "production": PowerCurve(list(production), None).to_dict()})
+
+    # record the final state and close the trace
+    def result(self, vehicles: List[Vehicle], exportdata: dict) -> None:
+        self._write({"type": "result",
+                     "vehicles": Vehicle.vehicles_to_dict(vehicles),
+                     "kpis": exportdata})
+        self.close()
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.file.close()
+
+# a recorded trace, replayed without running the scheduling search
+class DecisionTrace:
+    def __init__(self, header: dict, events: List[dict], result: Optional[dict], forecasts: List[dict] = []):
+        self.header = header
+        self.events = events
+        self.result = result # None if the run did not finish
+        self.forecasts = forecasts # solar productions of the forecast updates
+
+    @staticmethod
+    def load(path: str) -> "DecisionTrace":
+        header, events, result, forecasts = None, [], None, []
+        with open(path, 'r', encoding="utf-8") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError: # trace of an interrupted run
+                    break
+                if entry["type"] == "header":
+                    header = entry
+                elif entry["type"] == "schedule":
+                    events.append(entry)
+                elif entry["type"] == "forecast":
+                    forecasts.append(entry)
+                elif entry["type"] == "result":
+                    result = entry
+        if header is None:
+            raise ValueError(f"{path} is not a decision trace.")
+        return DecisionTrace(header, events, result, forecasts)
+
+    # returns the solar production of the last forecast update, the initial one if the forecast was not updated
+    def production(self) -> np.ndarray:
+        return PowerCurve.from_dict((self.forecasts[-1] if self.forecasts else self.header)["production"]).dense()
+
+    # returns the vehicles at the end of the run, or at the start if the run did not finish
+    def vehicles(self) -> List[Vehicle]:
+        return Vehicle.vehicles_from_dict((self.result or self.header)["vehicles"])
+
+    # rebuild the consumers after the given number of events (default: all) from the recorded decisions
+    def replay(self, events: Optional[int] = None) -> List[Consumer]:
+        state: Dict[str, Consumer] = {}
+        for event in self.events[:events]:
+            for id_user in event["rescheduled"]:
+                state.pop(id_user, None)
+            for c in event["consumers"]:
+                state[c["id_user"]] = Consumer(c["id_user"], PowerCurve.from_dict(c["power"]), PowerCurve([], None))
+            for id_user, curve in event["overpower"].items():
+                if id_user in state:
+                    state[id_user].overpower = PowerCurve.from_dict(curve)
+        return list(state.values())
+
+    # computes the metrics of the replayed run
+    def metrics(self, consumers: Optional[List[Consumer]] = None) -> MetricsResult:
+        if consumers is None:
+            consumers = self.replay()
+        simulationdate = datetime.fromtimestamp(self.header["parameters"]["simulationdate"])
+        production = self.production()
+        powerUsage = np.zeros(len(production))
+        overchargePower = np.zeros(len(production))
+        for c in consumers:
+            c.power.addTo(powerUsage, int((c.power.interval.time_start-simulationdate).total_seconds()/60))
+            if c.overpower.interval is not None:
+                c.overpower.addTo(overchargePower, int((c.overpower.interval.time_start-simulationdate).total_seconds()/60))
+        return SimulationMetrics.compute(production, powerUsage+overchargePower, overchargePower, self.vehicles(), consumers)
+
+# returns the differences between two traces, empty if the recorded decisions are identical
+def diff_traces(a: DecisionTrace, b: DecisionTrace, tolerance: float = 1e-6) -> List[str]:
+    differences = []
+
+    parameters_a, parameters_b = a.header["parameters"], b.header["parameters"]
+    for key in sorted(set(parameters_a) | set(parameters_b)):
+        if key in OUTPUTPARAMETERS:
+            continue
+        if parameters_a.get(key) != parameters_b.get(key):
+            differences.append(f"parameter {key}: {parameters_a.get(key)} != {parameters_b.get(key)}")
+
+    vehicles_a = {v["id_user"]: v for v in a.header["vehicles"]}
+    vehicles_b = {v["id_user"]: v for v in b.header["vehicles"]}
+    for id_user in sorted(set(vehicles_a) | set(vehicles_b), key=str):
+        if vehicles_a.get(id_user) != vehicles_b.get(id_user):
+            differences.append(f"vehicle {id_user}: {vehicles_a.get(id_user)} != {vehicles_b.get(id_user)}")
+
+    if not np.allclose(a.production(), b.production(), rtol=tolerance):
+        differences.append(f"production: {a.production().sum()/60/1000:.2f} kWh != {b.production().sum()/60/1000:.2f} kWh")
+
+    for i, (event_a, event_b) in enumerate(zip(a.events, b.events)):
+        t = datetime.fromtimestamp(event_a["t"])
+        if event_a["t"] != event_b["t"] or event_a["arriving"] != event_b["arriving"]:
+            differences.append(f"event {i}: {t} {event_a['arriving']} != {datetime.fromtimestamp(event_b['t'])} {event_b['arriving']}")
+            break # the following events are not comparable
+        starts_a = {c["id_user"]: c["power"]["interval"]["time_start"] for c in event_a["consumers"]}
+        starts_b = {c["id_user"]: c["power"]["interval"]["time_start"] for c in event_b["consumers"]}
+        for id_user in sorted(set(starts_a) | set(starts_b), key=str):
+            if starts_a.get(id_user) != starts_b.get(id_user):
+                start_a = datetime.fromtimestamp(starts_a[id_user]) if id_user in starts_a else None
+                start_b = datetime.fromtimestamp(starts_b[id_user]) if id_user in starts_b else None
+                differences.append(f"event {i} at {t}: start of {id_user}: {start_a} != {start_b}")
+        for id_user in sorted(set(event_a["overpower"]) | set(event_b["overpower"]), key=str):
+            energy_a = PowerCurve.from_dict(event_a["overpower"][id_user]).getEnergy() if id_user in event_a["overpower"] else None
+            energy_b = PowerCurve.from_dict(event_b["overpower"][id_user]).getEnergy() if id_user in event_b["overpower"] else None
+            if energy_a is None or energy_b is None or abs(energy_a-energy_b)>tolerance*max(1, abs(energy_a)):
+                differences.append(f"event {i} at {t}: overcharge of {id_user}: {energy_a} Wh != {energy_b} Wh")
+    if len(a.events) != len(b.events):
+        differences.append(f"number of events: {len(a.events)} != {len(b.events)}")
+
+    if a.result is not None and b.result is not None:
+        for key, value_a in a.result["kpis"].items():
+            value_b = b.result["kpis"].get(key)
+            if isinstance(value_a, (int, float)) and isinstance(value_b, (int, float)):
+                if abs(value_a-value_b)>tolerance*max(1, abs(value_a)):
+                    differences.append(f"{key}: {value_a} != {value_b}")
+            elif value_a != value_b:
+                differences.append(f"{key}: {value_a} != {value_b}")
+    return differences
@@ -1,15 +1,51 @@
+import math
+import functools
 import numpy as np
-from typing import List, Tuple
+from typing import Callable, Dict, List, Optional, Set, Tuple
 from datetime import datetime, timedelta
 
 from scheduling_framework.vehicle import Vehicle
 from scheduling_framework.consumer_model import TimeInterval, PowerCurve, Consumer
 from scheduling_framework.renewable_production import Production
 from scheduling_framework.parameters import SchedulingParameters
-
-    
-# no strategy scheduling starts the charging process on arrival
-def no_strategy(scheduling_parameters: SchedulingParameters, vehicles: List[Vehicle], timestamp: datetime, production: List[float]) -> Tuple[List[Consumer], List[float]]:
+from scheduling_framework.power_ledger import PowerLedger
+from scheduling_framework.water_filling import water_fill
+
+# a strategy schedules the vehicles from timestamp on, given the renewable power still available per minute
+# and the power already drawn by the consumers that are not rescheduled (baseload, needed for the site power cap)
+Strategy = Callable[[SchedulingParameters, List[Vehicle], datetime, List[float], Optional[List[float]]], List[Consumer]]
+
+# number of the best coarse start times refined to the minute by the coarse search
+REFINECANDIDATES = 3
+
+# minimum charge_max in kW to charge with 1/2 and 1/4 of it, like the reducemax rules of the dynamic strategy
+REDUCEDPOWER = {2: 15, 4: 20}
+
+# registered scheduling strategies by name
+STRATEGIES: Dict[str, Strategy] = {}
+
+# decorator registering a scheduling strategy under the given name
+def strategy(name: str):
+    def register(function: Strategy) -> Strategy:
+        STRATEGIES[name] = function
+        return function
+    return register
+
+# schedule the vehicles with the strategy selected in the scheduling parameters
+def apply_strategy(scheduling_parameters: SchedulingParameters, vehicles: List[Vehicle], timestamp: datetime, production: List[float], baseload: Optional[List[float]] = None) -> List[Consumer]:
+    if scheduling_parameters.strategy not in STRATEGIES:
+        raise ValueError(f"Unknown scheduling strategy {scheduling_parameters.strategy}. Available strategies: {list(STRATEGIES)}")
+    return STRATEGIES[scheduling_parameters.strategy](scheduling_parameters, vehicles, timestamp, production, baseload)
+
+# returns the power ledger of the site if a power cap is set
+def site_ledger(scheduling_parameters: SchedulingParameters, baseload: Optional[List[float]]) -> Optional[PowerLedger]:
+    if scheduling_parameters.powercap is None:
+        return None
+    return PowerLedger(baseload if baseload is not None else [0.0]*24*60)
+
+# no strategy scheduling starts the charging process on arrival, regardless of the site power cap
+@strategy("none")
+def no_strategy(scheduling_parameters: SchedulingParameters, vehicles: List[Vehicle], timestamp: datetime, production: List[float], baseload: Optional[List[float]] = None) -> List[Consumer]:
     consumers = []
 
     for v in vehicles:
@@ -23,10 +59,13 @@ def no_strategy(scheduling_parameters: SchedulingParameters, vehicles: List[Vehi
     return consumers
 
 # the dynamic scheduling algorithm applies multiple strategies in optimizing the charging process
-def dynamic_scheduling(scheduling_parameters: SchedulingParameters, vehicles: List[Vehicle], timestamp: datetime, production: List[float]) -> Tuple[List[Consumer], List[float]]:
+# with a site power cap, only start times keeping the site power below the cap are considered
+@strategy("dynamic")
+def dynamic_scheduling(scheduling_parameters: SchedulingParameters, vehicles: List[Vehicle], timestamp: datetime, production: List[float], baseload: Optional[List[float]] = None) -> List[Consumer]:
     vehicles = Vehicle.sort_vehicles_by_energy(vehicles)
     powerUsage = [0.0]*24*60
     consumers = []
+    ledger = site_ledger(scheduling_parameters, baseload)
 
     simulationdate = datetime(timestamp.year,timestamp.month,timestamp.day)
 
@@ -86,34 +125,42 @@ def dynamic_scheduling(scheduling_parameters: SchedulingParameters, vehicles: Li
 
         end_time = v.time_leave - timedelta(minutes=minduration)
 
-        bestStartTime = None
-        leastGridEnergy = float('inf')
-        t = timestamp
-        if(t==end_time):
-            bestStartTime=t
+        stationcurve = PowerCurve(stationpower, None)
+        leastPeak = float('inf') # start time exceeding the power cap the least, if no start time keeps the cap
+        leastPeakTime = None
+
+        start = int((timestamp-simulationdate).total_seconds()/60)
+        candidates = max(math.ceil((end_time-timestamp).total_seconds()/60), 0) # start times t with timestamp <= t < end_time
+
+        # grid energy of the start time j minutes after timestamp, None if it breaks the power cap
+        def score(j: int) -> Optional[float]:
+            nonlocal leastPeak, leastPeakTime
+            if ledger is not None:
+                peak = ledger.peak(start+j, stationcurve)
+                if peak > scheduling_parameters.powercap:
+                    if peak < leastPeak:
+                        leastPeak = peak
+                        leastPeakTime = timestamp+timedelta(minutes=j)
+                    return None
+            return grid_energy(production, powerUsage, stationpower, start+j, minduration, scheduling_parameters.allowgrid)
 
         # find the optimal starting time of the charging process
-        while t < end_time:
-            gridEnergyUsed = 0
-            chargeTime = t
-            while chargeTime < t + timedelta(minutes=minduration):
-                index = int((chargeTime-simulationdate).total_seconds()/60)
-                solarAvailable = production[index] - \
-                                powerUsage[index] - stationpower[int((chargeTime-t).total_seconds()/60)]
-                if solarAvailable < 0:
-                    gridEnergyUsed = gridEnergyUsed - solarAvailable/60
-                
-                chargeTime += timedelta(minutes=1)
-            
-            # allow 1 kWh energy from grid per vehicle
-            if(scheduling_parameters.allowgrid):
-                if gridEnergyUsed <= 1000:    
-                    gridEnergyUsed=0
-
-            if gridEnergyUsed < leastGridEnergy: 
-                leastGridEnergy = gridEnergyUsed
-                bestStartTime = t
-            t += timedelta(minutes=1)
+        bestStartTime = None
+        if(timestamp==end_time):
+            bestStartTime=timestamp
+        if scheduling_parameters.profiles == "best":
+            stationcurve, best, leastPeak, leastPeakStart = best_profile(scheduling_parameters, v, stationcurve, production, powerUsage, ledger, timestamp, start)
+            stationpower = stationcurve.power
+            minduration = stationcurve.length
+            if leastPeakStart is not None:
+                leastPeakTime = timestamp+timedelta(minutes=leastPeakStart)
+        else:
+            best = search_start(scheduling_parameters, score, start, candidates)
+        if best is not None:
+            bestStartTime = timestamp+timedelta(minutes=best)
+        if bestStartTime is None and leastPeakTime is not None:
+            print(f"Warning: Vehicle with ID {v.id_user} cannot be charged within the site power cap of {scheduling_parameters.powercap/1000:.1f} kW. The site power peaks at {leastPeak/1000:.1f} kW.")
+            bestStartTime = leastPeakTime
         # set start time to best possible time
         chargeTime = bestStartTime
         end_time = bestStartTime + timedelta(minutes=minduration)
@@ -124,15 +171,195 @@ def dynamic_scheduling(scheduling_parameters: SchedulingParameters, vehicles: Li
             chargeTime += timedelta(minutes=1)
 
         interval: TimeInterval = TimeInterval(bestStartTime,bestStartTime+timedelta(minutes=minduration))
-        powercurve: PowerCurve = PowerCurve(stationpower,interval)
+        powercurve: PowerCurve = stationcurve.withInterval(interval)
+        if ledger is not None:
+            ledger.addCurve(int((bestStartTime-simulationdate).total_seconds()/60), powercurve)
         consumer: Consumer = Consumer(v.id_user,powercurve)
         consumers.append(consumer)
         print("Added "+str(consumer.id_user)+" with starting time "+str(consumer.power.interval.time_start))
 
     return consumers
 
-# overcharge consumers if excess renewable power is available
-def overcharge_scheduling(consumers: List[Consumer], vehicles: List[Vehicle], solarProduction: Production, powerUsage: List[float], timestamp: datetime):
+# the water-filling strategy fills the required energy of every vehicle into the valleys of the residual solar power
+# within its parking time, at most charge_max (and the headroom to the site power cap) per minute
+# unlike the fixed profiles of the dynamic strategy, the charging power follows the solar power
+@strategy("waterfill")
+def waterfill_scheduling(scheduling_parameters: SchedulingParameters, vehicles: List[Vehicle], timestamp: datetime, production: List[float], baseload: Optional[List[float]] = None) -> List[Consumer]:
+    # the vehicles with the least flexibility (parking time minus charging time at full power) are filled in first
+    vehicles = sorted(vehicles, key=lambda v: (v.time_leave-max(v.time_arrive, timestamp)).total_seconds()/60-v.energy_required/v.charge_max*60)
+    simulationdate = datetime(timestamp.year,timestamp.month,timestamp.day)
+    residual = np.array(production, dtype=float) # renewable power left, negative if drawn from the grid
+    sitepower = np.array(baseload if baseload is not None else np.zeros(len(residual)), dtype=float)
+    consumers = []
+
+    for v in vehicles:
+        begin = max(math.ceil((max(timestamp, v.time_arrive)-simulationdate).total_seconds()/60), 0)
+        end = min(int((v.time_leave-simulationdate).total_seconds()/60), len(residual))
+        energy = v.energy_required*1000*60 # in W·min
+
+        limit = np.full(max(end-begin, 0), v.charge_max*1000.0)
+        if scheduling_parameters.powercap is not None:
+            limit = np.minimum(limit, scheduling_parameters.powercap-sitepower[begin:end])
+        power = water_fill(-residual[begin:end], limit, energy)
+
+        if power.sum()<energy*(1-1e-9):
+            print(f"Warning: Vehicle with ID {v.id_user} cannot be charged {v.energy_required:.2f} kWh within its parking time. At most {power.sum()/60/1000:.2f} kWh are possible.")
+        charging = np.flatnonzero(power>0)
+        if len(charging)==0:
+            print(f"Warning: Vehicle with ID {v.id_user} cannot be charged within its parking time.")
+            continue
+        first, last = begin+charging[0], begin+charging[-1]+1
+        curve = power[charging[0]:charging[-1]+1]
+        residual[first:last] -= curve
+        sitepower[first:last] += curve
+
+        interval: TimeInterval = TimeInterval(simulationdate+timedelta(minutes=int(first)),simulationdate+timedelta(minutes=int(last)))
+        consumer: Consumer = Consumer(v.id_user,PowerCurve(curve.tolist(),interval))
+        consumers.append(consumer)
+        print("Added "+str(consumer.id_user)+" with starting time "+str(consumer.power.interval.time_start))
+
+    return consumers
+
+# returns the grid energy in Wh used when charging with stationpower from the given minute of the day on
+def grid_energy(production: List[float], powerUsage: List[float], stationpower: List[float], start: int, minduration: int, allowgrid: bool) -> float:
+    gridEnergyUsed = 0
+    for k in range(minduration):
+        index = start+k
+        solarAvailable = production[index] - \
+                        powerUsage[index] - stationpower[k]
+        if solarAvailable < 0:
+            gridEnergyUsed = gridEnergyUsed - solarAvailable/60
+
+    # allow 1 kWh energy from grid per vehicle
+    if(allowgrid):
+        if gridEnergyUsed <= 1000:
+            gridEnergyUsed=0
+    return gridEnergyUsed
+
+# returns the candidate with the least score, the earliest one on ties, None if all candidates are infeasible
+def least_score(score: Callable[[int], Optional[float]], candidates) -> Optional[int]:
+    best = None
+    leastScore = float('inf')
+    for j in candidates:
+        value = score(j)
+        if value is not None and value < leastScore:
+            leastScore = value
+            best = j
+    return best
+
+# returns the best of the candidate start times 0..candidates-1 (minutes after the scheduling time)
+# exhaustive: every minute is scored
+# coarse: every searchstep minutes of the day are scored (aligned to the forecast steps), then every minute
+# within one step around the REFINECANDIDATES best coarse start times, every minute if no coarse start time is feasible
+def search_start(scheduling_parameters: SchedulingParameters, score: Callable[[int], Optional[float]], start: int, candidates: int) -> Optional[int]:
+    if scheduling_parameters.search == "exhaustive" or candidates <= 2*scheduling_parameters.searchstep:
+        return least_score(score, range(candidates))
+
+    step = scheduling_parameters.searchstep
+    scores: Dict[int, Optional[float]] = {}
+    def cached(j: int) -> Optional[float]:
+        if j not in scores:
+            scores[j] = score(j)
+        return scores[j]
+
+    coarse = sorted(set(range((-start) % step, candidates, step)) | {0, candidates-1})
+    ranked = sorted((cached(j), j) for j in coarse if cached(j) is not None)[:REFINECANDIDATES]
+    if not ranked: # feasible start times may lie between the coarse ones
+        return least_score(cached, range(candidates))
+    fine = sorted({k for _, j in ranked for k in range(max(j-step+1, 0), min(j+step, candidates))})
+    return least_score(cached, fine)
+
+# returns the constant charging profile with the given power in kW and duration in minutes, with flattened end if ramp>0:
+# 85% of the duration at full power, then ramp minutes descending to half the power (like the flatten rule)
+# the profiles are shared between vehicles and must not be modified
+@functools.lru_cache(maxsize=1024)
+def charging_profile(power: float, duration: int, ramp: int = 0) -> PowerCurve:
+    constant = int(duration*0.85) if ramp>0 else duration
+    curve = PowerCurve([power*1000]*constant+[(power-power/2*t/ramp)*1000 for t in range(ramp)], None)
+    for values in (curve.breakpoints, curve.values, curve.slopes):
+        values.flags.writeable = False
+    return curve
+
+# returns the profile variants of a vehicle fitting into its parking time: full power, 1/2 and 1/4 power (if reducemax)
+# and each of them with flattened end (if flatten and charging takes at least 2 hours)
+def profile_variants(scheduling_parameters: SchedulingParameters, v: Vehicle) -> List[PowerCurve]:
+    parkduration = int((v.time_leave-v.time_arrive).total_seconds()/60)
+    variants = []
+    for divisor in ([1, 2, 4] if scheduling_parameters.reducemax else [1]):
+        if divisor>1 and v.charge_max<=REDUCEDPOWER[divisor]:
+            continue
+        power = v.charge_max/divisor
+        duration = v.charge_duration*divisor
+        if duration>parkduration:
+            continue
+        variants.append(charging_profile(power, duration))
+        if scheduling_parameters.flatten and duration>=120:
+            ramp = int(0.15*v.energy_required/power*4/3*60)
+            if ramp>0 and int(duration*0.85)+ramp<=parkduration:
+                variants.append(charging_profile(power, duration, ramp))
+    return variants
+
+# returns the grid energy in Wh used when charging with the curve from the minutes start..start+count-1 of the day on
+# like grid_energy for all start times at once: constant segments are summed from the prefix sums of their grid power,
+# descending segments over a sliding window of the residual renewable power (production minus power usage)
+def grid_energies(residual: np.ndarray, curve: PowerCurve, start: int, count: int) -> np.ndarray:
+    energies = np.zeros(count)
+    for breakpoint, value, slope, length in zip(curve.breakpoints.tolist(), curve.values.tolist(), curve.slopes.tolist(), curve._lengths().tolist()):
+        first = start+breakpoint
+        if slope==0:
+            grid = np.concatenate(([0.0], np.cumsum(np.maximum(value-residual, 0))))
+            energies += grid[first+length:first+length+count]-grid[first:first+count]
+        else:
+            windows = np.lib.stride_tricks.sliding_window_view(residual, length)[first:first+count]
+            energies += np.maximum(value+slope*np.arange(length)-windows, 0).sum(axis=1)
+    return energies/60
+
+# chooses the charging profile and start time (minutes after timestamp) of a vehicle with the least grid energy
+# the profile of the rules and the profile variants are scored for all start times at once, ties keep the profile of
+# the rules and the earliest start time, start times breaking the power cap of the ledger are skipped: the start
+# times of a profile are checked with the ledger in the order of their grid energy until one keeps the cap
+# returns the profile, its start time (None if every start time breaks the power cap) and the start time exceeding the cap the least
+def best_profile(scheduling_parameters: SchedulingParameters, v: Vehicle, rulecurve: PowerCurve, production: List[float], powerUsage: List[float], ledger: Optional[PowerLedger], timestamp: datetime, start: int) -> Tuple[PowerCurve, Optional[int], float, Optional[int]]:
+    residual = np.subtract(production, powerUsage)
+    leave = (v.time_leave-timestamp).total_seconds()/60
+
+    bestCurve, bestStart, leastEnergy = rulecurve, None, float('inf')
+    leastPeakCurve, leastPeakStart, leastPeak = rulecurve, None, float('inf')
+    for curve in [rulecurve]+profile_variants(scheduling_parameters, v):
+        count = max(math.ceil(leave-curve.length), 0) # start times t with timestamp <= t < leave-length, like the rules
+        if count==0 and leave==curve.length:
+            count = 1
+        if count==0:
+            continue
+        energies = grid_energies(residual, curve, start, count)
+        if(scheduling_parameters.allowgrid): # allow 1 kWh energy from grid per vehicle
+            energies[energies<=1000] = 0
+        if ledger is None:
+            j = int(np.argmin(energies))
+            if energies[j]<leastEnergy:
+                bestCurve, bestStart, leastEnergy = curve, j, float(energies[j])
+            continue
+
+        curvePeak, curvePeakStart = float('inf'), None
+        for j in np.argsort(energies, kind='stable').tolist(): # least energy first, earliest on ties
+            if energies[j]>=leastEnergy:
+                break
+            peak = ledger.peak(start+j, curve)
+            if peak<=scheduling_parameters.powercap:
+                bestCurve, bestStart, leastEnergy = curve, j, float(energies[j])
+                break
+            if peak<curvePeak or (peak==curvePeak and j<curvePeakStart):
+                curvePeak, curvePeakStart = peak, j
+        if curvePeak<leastPeak:
+            leastPeakCurve, leastPeakStart, leastPeak = curve, curvePeakStart, curvePeak
+
+    if bestStart is None:
+        return leastPeakCurve, None, leastPeak, leastPeakStart
+    return bestCurve, bestStart, leastPeak, leastPeakStart
+
+# overcharge consumers if excess renewable power is available, without exceeding the site power cap (in W) if given
+# only: IDs of the consumers whose overcharging is scheduled again, the unstarted overcharging of the others is kept
+def overcharge_scheduling(consumers: List[Consumer], vehicles: List[Vehicle], solarProduction: Production, powerUsage: List[float], timestamp: datetime, powercap: Optional[float] = None, only: Optional[Set[str]] = None):
     simulationdate = datetime(timestamp.year,timestamp.month,timestamp.day)
     
     total_overcharge_power = [0.0]*24*60
@@ -141,11 +368,24 @@ def overcharge_scheduling(consumers: List[Consumer], vehicles: List[Vehicle], so
     overpower_consumers_: List[Consumer] = []
 
     for c in consumers: # check which consumers can use excess energy
-        if(c.overpower.interval is None or c.overpower.interval.time_start > timestamp):
-            c.overpower.power.clear()
-            c.overpower.interval = None
+        if((c.overpower.interval is None or c.overpower.interval.time_start > timestamp) and (only is None or c.id_user in only)):
+            c.overpower = PowerCurve([], None)
             overpower_consumers.append(c)
 
+    usedPower = powerUsage # power not available for overcharging
+    if only is not None: # the kept overcharging still uses the renewable power
+        usedPower = np.array(powerUsage, dtype=float)
+        for c in consumers:
+            if c not in overpower_consumers and c.overpower.interval is not None and c.overpower.interval.time_start > timestamp:
+                c.overpower.addTo(usedPower, int((c.overpower.interval.time_start.timestamp()-simulationdate.timestamp())/60))
+
+    ledger: Optional[PowerLedger] = None
+    if powercap is not None: # site power including the kept overcharging of started consumers
+        ledger = PowerLedger(powerUsage)
+        for c in consumers:
+            if c not in overpower_consumers and c.overpower.interval is not None:
+                ledger.addCurve(int((c.overpower.interval.time_start.timestamp()-simulationdate.timestamp())/60), c.overpower)
+
     number_scheduled=0
     for c in overpower_consumers:
         id_user: str = c.id_user
@@ -156,15 +396,15 @@ def overcharge_scheduling(consumers: List[Consumer], vehicles: List[Vehicle], so
         energy_left = soc_left*v.battery_size*1000
         if(True or energy_left>2000): # only overcharge if more than 2kWh can be charged
 
-            renewable_power = Production.renewable_available(solarProduction.production, np.add(powerUsage,total_overcharge_power))
+            renewable_power = Production.renewable_available(solarProduction.production, np.add(usedPower,total_overcharge_power))
 
             regular_end_index = int((c.power.interval.time_end.timestamp()-simulationdate.timestamp())/60)
             overpower_offset = int((c.overpower.interval.time_end.timestamp()-simulationdate.timestamp())/60) if c.overpower.interval is not None else 0
             lastRegularPower = 0
             if overpower_offset == 0:
-                lastRegularPower = c.power.power[-1]
+                lastRegularPower = c.power.lastPower()
             else:
-                lastRegularPower = c.overpower.power[-1]
+                lastRegularPower = c.overpower.lastPower()
 
             overcharge_start_index = regular_end_index
             overcharge_end_index = 0
@@ -178,15 +418,18 @@ def overcharge_scheduling(consumers: List[Consumer], vehicles: List[Vehicle], so
                 not_leaving: bool = i<vehicle_leave_index 
                 not_fully_charged: bool = energy_left-sum(overcharge_power)/60>0
                 min_charging_power_possible: bool = renewable_power[i]>=1000
+                headroom = powercap-ledger.max(i,i+1) if ledger is not None else float('inf')
 
-                if(not_leaving and not_fully_charged and min_charging_power_possible ):
+                if(not_leaving and not_fully_charged and min_charging_power_possible and headroom>=1000):
     
-                    charging_power = min(lastRegularPower,renewable_power[i])
+                    charging_power = min(lastRegularPower,renewable_power[i],headroom)
                     if(i != overcharge_start_index and overcharge_power[i-1-overcharge_start_index] > 0):
                         charging_power = min(overcharge_power[i-1-overcharge_start_index],charging_power)
 
                     overcharge_power.append(charging_power)
                     total_overcharge_power[i]+=charging_power
+                    if ledger is not None:
+                        ledger.add(i,i+1,charging_power)
                 else:
                     break
             overcharge_interval = TimeInterval(simulationdate+timedelta(minutes=overcharge_start_index),simulationdate+timedelta(minutes=overcharge_end_index))
@@ -199,11 +442,12 @@ def overcharge_scheduling(consumers: List[Consumer], vehicles: List[Vehicle], so
             number_scheduled+=1
 
     # return all consumers
+    total_overcharge_power = np.asarray(total_overcharge_power, dtype=float)
     for c in consumers:
         if c.id_user not in [o.id_user for o in overpower_consumers_]:
             overpower_consumers_.append(c)
             if(c.overpower.interval is not None):
                 overpower_start_index = int((c.overpower.interval.time_start.timestamp()-simulationdate.timestamp())/60)
-                total_overcharge_power = np.add(total_overcharge_power,[0]*(overpower_start_index)+c.overpower.power+[0]*(24*60-overpower_start_index-len(c.overpower.power)))
+                c.overpower.addTo(total_overcharge_power, overpower_start_index)
                 print(f"Overcharging: {c.id_user}: energy: {c.overpower.getEnergy()/1000:.2f} kWh")
     return number_scheduled,overpower_consumers_, total_overcharge_power
\ No newline at end of file
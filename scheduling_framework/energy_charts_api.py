@@ -1,37 +1,31 @@
 import requests
-from datetime import datetime
+from datetime import date
+from typing import Callable
 
-from scheduling_framework.forecast_power import Datapoint,Forecast
+from scheduling_framework.forecast_power import Forecast
+from scheduling_framework.forecast_client import API_SERVER, default_client
 
-# returns the PV production forecast, fetched from given API url
-def api_request(url: str) -> Forecast:
+# raised if the forecast cannot be fetched, so that batch runs can handle a failed request
+class ForecastError(Exception):
+    pass
 
+# runs a forecast request, failed requests and invalid responses are raised as ForecastError
+def forecast_request(request: Callable[..., Forecast], *args) -> Forecast:
     try:
-        response = requests.get(url, verify=True)
-    except requests.exceptions.SSLError:
-        print("SSL verification failed, retrying with verify=False...")
-        response = requests.get(url, verify=False)
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        exit()
+        return request(*args)
+    except requests.exceptions.HTTPError as e:
+        raise ForecastError(f"Error: {e.response.status_code}. Failed to fetch data.") from e
+    except (requests.exceptions.RequestException, ValueError) as e:
+        raise ForecastError(f"An error occurred: {e}") from e
 
-    if response.status_code == 200:
-        data = response.json()
-        
-        unix_seconds: int = data.get('unix_seconds', [])
-        
-        forecast_values = data.get('forecast_values', [])
-        forecast_values = [value*1_000_000 for value in forecast_values] # scale MW to W
+# returns the PV production forecast, fetched from given API url, refresh fetches it again even if the range was fetched before
+def api_request(url: str, refresh: bool = False) -> Forecast:
+    return forecast_request(default_client().get, url, refresh)
 
-        times = [datetime.fromtimestamp(seconds) for seconds in unix_seconds]
-
-        datapoints = [Datapoint(times[i],forecast_values[i]) for i in range(0,len(times))]
-        forecast = Forecast(datapoints)
-        
-        return forecast
-    else:
-        raise Exception(f"Error: {response.status_code}. Failed to fetch data.") 
+# fetch the forecast of a wide date range once, later requests within the range are served locally
+def prefetch(start: date, end: date, server: str = API_SERVER) -> Forecast:
+    return forecast_request(default_client().prefetch, start, end, server)
 
 if __name__ == "__main__":
     energy_charts_url = "https://api.energy-charts.info/public_power_forecast?country=at&production_type=solar&forecast_type=current"
-    print(api_request(energy_charts_url))
\ No newline at end of file
+    print(api_request(energy_charts_url))
@@ -0,0 +1,133 @@
+import os
+import csv
+import json
+import numpy as np
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from scheduling_framework.vehicle import Vehicle
+
+FIELDS = ["id_user", "time_arrive", "time_leave", "percent_arrive", "percent_leave", "battery_size", "charge_max"]
+NUMBERS = ["percent_arrive", "percent_leave", "battery_size", "charge_max"]
+
+# number of charging sessions parsed at once
+CHUNKSIZE = 65536
+
+# returns the minutes of the day of "HH:MM" times
+# the digits are read from the bytes of the whole column at once, other layouts (e.g. "8:05") are parsed one by one
+def parse_minutes(times: Sequence[str]) -> np.ndarray:
+    lengths = np.fromiter(map(len, times), dtype=np.int64, count=len(times))
+    if np.all(lengths==5):
+        codes = np.frombuffer("".join(times).encode("latin-1", "replace"), dtype=np.uint8).reshape(len(times), 5).astype(np.int64)
+    else:
+        codes = np.zeros((len(times), 5), dtype=np.int64)
+    digits = codes-ord('0')
+    hours = digits[:, 0]*10+digits[:, 1]
+    minutes = digits[:, 3]*10+digits[:, 4]
+
+    valid = np.all((digits[:, [0, 1, 3, 4]]>=0) & (digits[:, [0, 1, 3, 4]]<=9), axis=1) & (codes[:, 2]==ord(':')) & (lengths==5)
+    for i in np.flatnonzero(~valid):
+        try:
+            hours[i], minutes[i] = (int(part) for part in str(times[i]).split(':'))
+        except ValueError:
+            raise ValueError(f"Invalid time {times[i]!r}, expected HH:MM.")
+    invalid = np.flatnonzero((hours<0) | (hours>23) | (minutes<0) | (minutes>59))
+    if len(invalid)>0:
+        raise ValueError(f"Invalid time {times[invalid[0]]!r}, expected HH:MM.")
+    return hours*60+minutes
+
+# returns the values of a numeric column, numbers read from text are int if all of them are integral (like in a JSON fleet)
+def parse_numbers(values: Sequence) -> list:
+    if len(values)==0 or not isinstance(values[0], str):
+        return list(values)
+    numbers = np.asarray(values, dtype=float)
+    if np.all(numbers==np.floor(numbers)):
+        return numbers.astype(np.int64).tolist()
+    return numbers.tolist()
+
+# creates the vehicles of a chunk of charging sessions given as columns
+# if the desired SoC cannot be reached within the parking time, percent_leave is reduced to the possible SoC
+def create_fleet(columns: Dict[str, Sequence], simulationdate: datetime) -> List[Vehicle]:
+    missing = [f for f in FIELDS if f not in columns]
+    if missing:
+        raise ValueError(f"Missing fleet columns: {', '.join(missing)}.")
+    day = np.datetime64(datetime(simulationdate.year, simulationdate.month, simulationdate.day), 'm')
+    arrive = parse_minutes(columns["time_arrive"])
+    leave = parse_minutes(columns["time_leave"])
+    percent_arrive, percent_leave, battery_size, charge_max = (parse_numbers(columns[f]) for f in NUMBERS)
+
+    percent_arrive_, battery_size_, charge_max_ = (np.asarray(values, dtype=float) for values in (percent_arrive, battery_size, charge_max))
+    required_energy = (np.asarray(percent_leave, dtype=float)-percent_arrive_)/100*battery_size_ # in kWh
+    parking_time = (leave-arrive).astype(float) # in minutes
+    max_possible_energy = parking_time/60*charge_max_
+    possible = max_possible_energy*100/battery_size_+percent_arrive_
+
+    ids = [str(i) for i in columns["id_user"]]
+    clamped = np.flatnonzero(max_possible_energy<required_energy) # the desired SoC cannot be reached before leaving
+    for i, required, parking, maximum, soc in zip(clamped.tolist(), required_energy[clamped].tolist(), parking_time[clamped].tolist(), max_possible_energy[clamped].tolist(), possible[clamped].tolist()):
+        print(f"Warning: Vehicle with ID {ids[i]} cannot be charged {required:.2f} kWh ({int(percent_leave[i])}%) within {int(parking)} minutes. At most {maximum:.2f} kWh ({int(soc)}%) are possible.")
+        percent_leave[i] = soc
+
+    time_arrive = (day+arrive.astype('timedelta64[m]')).astype('datetime64[us]').tolist()
+    time_leave = (day+leave.astype('timedelta64[m]')).astype('datetime64[us]').tolist()
+    return [Vehicle(*session) for session in zip(ids, time_arrive, time_leave, percent_arrive, percent_leave, battery_size, charge_max)]
+
+# creates vehicles from a list of charging sessions as dictionaries, e.g. a JSON fleet or controller events
+def create_vehicles(data: Optional[List[dict]], simulationdate: datetime) -> List[Vehicle]:
+    if not data:
+        return []
+    return create_fleet({name: [entry[name] for entry in data] for name in FIELDS}, simulationdate)
+
+# yields the charging sessions of a CSV file with a header row as columns, chunk by chunk, other columns are ignored
+def read_csv_columns(path: str, chunksize: int = CHUNKSIZE) -> Iterator[Dict[str, Sequence[str]]]:
+    with open(path, 'r', newline='', encoding="utf-8") as file:
+        reader = csv.reader(file)
+        header = [name.strip() for name in next(reader, [])]
+        index = {name: header.index(name) for name in FIELDS if name in header}
+        while True:
+            rows = [row for row in islice(reader, chunksize) if row]
+            if not rows:
+                return
+            columns = list(zip(*rows))
+            yield {name: columns[i] for name, i in index.items()}
+
+# yields the charging sessions of a JSON lines file (one session object per line) as columns, chunk by chunk
+def read_jsonl_columns(path: str, chunksize: int = CHUNKSIZE) -> Iterator[Dict[str, list]]:
+    with open(path, 'r', encoding="utf-8") as file:
+        while True:
+            columns: Dict[str, list] = {name: [] for name in FIELDS}
+            for line in islice(file, chunksize):
+                if line.strip():
+                    session = json.loads(line)
+                    for name in FIELDS:
+                        columns[name].append(session[name])
+            if not columns["id_user"]:
+                return
+            yield columns
+
+# yields the charging sessions of a JSON list file as columns, chunk by chunk
+def read_json_columns(path: str, chunksize: int = CHUNKSIZE) -> Iterator[Dict[str, list]]:
+    with open(path, 'r', encoding="utf-8") as file:
+        data = json.load(file) or []
+    for start in range(0, len(data), chunksize):
+        yield {name: [session[name] for session in data[start:start+chunksize]] for name in FIELDS}
+
+# yields the vehicles of a fleet file chunk by chunk, the format is given by the extension (.json, .jsonl or .csv)
+def iter_fleet(path: str, simulationdate: datetime, chunksize: int = CHUNKSIZE) -> Iterator[List[Vehicle]]:
+    extension = os.path.splitext(path)[1].lower()
+    if extension==".csv":
+        chunks = read_csv_columns(path, chunksize)
+    elif extension in (".jsonl", ".ndjson"):
+        chunks = read_jsonl_columns(path, chunksize)
+    else:
+        chunks = read_json_columns(path, chunksize)
+    for columns in chunks:
+        yield create_fleet(columns, simulationdate)
+
+# reads all vehicles of a fleet file
+def read_fleet(path: str, simulationdate: datetime, chunksize: int = CHUNKSIZE) -> List[Vehicle]:
+    vehicles: List[Vehicle] = []
+    for chunk in iter_fleet(path, simulationdate, chunksize):
+        vehicles.extend(chunk)
+    return vehicles
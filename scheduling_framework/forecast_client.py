@@ -0,0 +1,116 @@
+import os
+import json
+import requests
+import numpy as np
+from datetime import date, datetime
+from requests.adapters import HTTPAdapter
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+from urllib3.util.retry import Retry
+
+from scheduling_framework.forecast_power import Forecast
+
+API_SERVER = "https://api.energy-charts.info"
+API_PATH = "/public_power_forecast"
+
+# converts an energy-charts API response to a forecast in Watts
+def parse_response(data: dict) -> Forecast:
+    unix_seconds = np.asarray(data.get('unix_seconds', []), dtype=float)
+    forecast_values = np.asarray(data.get('forecast_values', []), dtype=float)
+    forecast_values = np.nan_to_num(forecast_values)*1_000_000 # scale MW to W, missing values are null
+    return Forecast(seconds=unix_seconds, values=forecast_values)
+
+# returns the url of a forecast request for the given date range
+def forecast_url(start: date, end: date, server: str = API_SERVER, country: str = "at", production_type: str = "solar", forecast_type: str = "current") -> str:
+    query = urlencode({"country": country, "production_type": production_type, "forecast_type": forecast_type,
+                       "start": start.strftime("%Y-%m-%d"), "end": end.strftime("%Y-%m-%d")})
+    return f"{server}{API_PATH}?{query}"
+
+# splits a forecast url into the range independent request key and the requested date range
+def split_url(url: str) -> Tuple[str, Optional[date], Optional[date]]:
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    start = query.pop("start", None)
+    end = query.pop("end", None)
+    key = f"{parts.scheme}://{parts.netloc}{parts.path}?{urlencode(sorted(query.items()))}"
+    try:
+        start = datetime.strptime(start, "%Y-%m-%d").date() if start else None
+        end = datetime.strptime(end, "%Y-%m-%d").date() if end else None
+    except ValueError:
+        return url, None, None
+    return key, start, end
+
+# forecast client with connection pooling, timeouts and retries
+# fetched date ranges are kept, requests for a covered range are answered locally
+class ForecastClient:
+    def __init__(self,
+                 timeout: Tuple[float, float] = (5, 30), # connect and read timeout in seconds
+                 retries: int = 3,
+                 backoff: float = 0.5,
+                 poolsize: int = 4,
+                 recordpath: Optional[str] = None):
+        self.timeout = timeout
+        self.recordpath = recordpath
+        self.ranges: Dict[str, List[Tuple[date, date, Forecast]]] = {}
+        self.requests = 0
+
+        retry = Retry(total=retries,
+                      backoff_factor=backoff,
+                      status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=poolsize, pool_maxsize=poolsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    # returns the forecast for the url, from a prefetched range if possible
+    # refresh: fetch again (e.g. the intraday updates of the current forecast), replacing the kept ranges it covers
+    def get(self, url: str, refresh: bool = False) -> Forecast:
+        key, start, end = split_url(url)
+        if start is not None and end is not None and not refresh:
+            for range_start, range_end, forecast in self.ranges.get(key, []):
+                if range_start <= start and end <= range_end:
+                    return forecast.getForecastRange(start, end)
+
+        forecast = self._fetch(url)
+        if start is not None and end is not None:
+            if refresh:
+                self.ranges[key] = [r for r in self.ranges.get(key, []) if not (start <= r[0] and r[1] <= end)]
+            self.ranges.setdefault(key, []).append((start, end, forecast))
+            return forecast.getForecastRange(start, end) # callers may scale the returned forecast
+        return forecast
+
+    # fetch one wide date range, later requests within the range are split locally
+    def prefetch(self, start: date, end: date, server: str = API_SERVER) -> Forecast:
+        return self.get(forecast_url(start, end, server))
+
+    def _fetch(self, url: str) -> Forecast:
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        self.requests += 1
+
+        if self.recordpath is not None:
+            self._record(url, data)
+
+        return parse_response(data)
+
+    # store the raw response so it can be served by the stub server
+    def _record(self, url: str, data: dict) -> None:
+        os.makedirs(self.recordpath, exist_ok=True)
+        _, start, end = split_url(url)
+        name = f"forecast_{start}_{end}.json" if start is not None else f"forecast_{len(os.listdir(self.recordpath))}.json"
+        with open(os.path.join(self.recordpath, name), 'w') as file:
+            json.dump({"url": url, **data}, file)
+
+    def close(self) -> None:
+        self.session.close()
+
+_default_client: Optional[ForecastClient] = None
+
+# returns the process-wide forecast client
+def default_client() -> ForecastClient:
+    global _default_client
+    if _default_client is None:
+        _default_client = ForecastClient()
+    return _default_client
@@ -1,8 +1,9 @@
 import datetime
 import matplotlib.pyplot as plt
 import numpy as np
-from scipy.optimize import curve_fit
-from typing import List
+from typing import Dict, List, Optional, Tuple
+
+from scheduling_framework.solar_fit import fit_cache
 
 # define a timestamp-value pair for the forecast
 class Datapoint:
@@ -12,146 +13,137 @@ class Datapoint:
     def __str__(self) -> str:
         return f"{self.timestamp}, {self.forecast_value}"
 
-# renewable production forecast, containing datapoints
+# renewable production forecast, stored as parallel arrays of epoch seconds and values
 class Forecast:
-    def __init__(self, datapoints: list[Datapoint]):
-        self.datapoints = datapoints
+    def __init__(self, datapoints: Optional[List[Datapoint]] = None, seconds: Optional[np.ndarray] = None, values: Optional[np.ndarray] = None):
+        if datapoints is not None:
+            seconds = np.fromiter((d.timestamp.timestamp() for d in datapoints), dtype=float, count=len(datapoints))
+            values = np.fromiter((d.forecast_value for d in datapoints), dtype=float, count=len(datapoints))
+        self.seconds: np.ndarray = np.asarray(seconds if seconds is not None else [], dtype=float)
+        self.values: np.ndarray = np.asarray(values if values is not None else [], dtype=float)
+        assert(self.seconds.shape==self.values.shape)
+
+        if len(self.seconds)>1 and np.any(np.diff(self.seconds)<0):
+            order = np.argsort(self.seconds, kind='stable')
+            self.seconds = self.seconds[order]
+            self.values = self.values[order]
+
+        self._days: Optional[Dict[datetime.date, Tuple[int, int]]] = None
+        self.scaling: float = 1.0 # product of all scaling factors applied to the forecast
+
+    # the forecast as list of datapoints
+    @property
+    def datapoints(self) -> List[Datapoint]:
+        return [Datapoint(datetime.datetime.fromtimestamp(t), v) for t, v in zip(self.seconds.tolist(), self.values.tolist())]
+
+    def __len__(self) -> int:
+        return len(self.seconds)
 
     def __str__(self) -> str:
         return "\n".join(str(datapoint) for datapoint in self.datapoints)
 
     # visualize the renewable forecast
     def visualize(self, plt: plt):
-        times = [datapoint.timestamp for datapoint in self.datapoints]
-        forecast_values = [datapoint.forecast_value for datapoint in self.datapoints]
-        plt.step(times, forecast_values, where='post', marker='', linestyle='-', color='y',linewidth=2.0,label="scaled solar power forecast")
+        plt.step(self.getTimesteps(), self.values, where='post', marker='', linestyle='-', color='y',linewidth=2.0,label="scaled solar power forecast")
 
     # scales the forecast according to the scaling factor and the reference scale
     def scale(self, scaledpeak: float, austrianpeak: float):
         if scaledpeak<=0 or austrianpeak<=0:
             raise Exception("Scaling values must be greater than 0.")
         
-        for datapoint in self.datapoints:
-            scaled_value = (datapoint.forecast_value / austrianpeak) * scaledpeak
-            datapoint.forecast_value = scaled_value
+        self.values = (self.values / austrianpeak) * scaledpeak
+        self.scaling = self.scaling * scaledpeak / austrianpeak
 
     def get_forecast_by_timestamp(self, time: datetime.datetime, smooth=True) -> float:
-        for i in range(len(self.datapoints) - 1):
-            current_point = self.datapoints[i]
-            next_point = self.datapoints[i+1]
-            if current_point.timestamp <= time and next_point.timestamp > time:
-                if smooth:
-                    return current_point.forecast_value+(next_point.forecast_value-current_point.forecast_value)*(time-current_point.timestamp).total_seconds()/60/15
-                else:
-                    return current_point.forecast_value
-        return 0
+        return float(self.get_forecast_by_seconds(np.array([time.timestamp()]), smooth)[0])
+
+    # returns the forecast for all given epoch seconds, between two datapoints the value is held or linearized
+    def get_forecast_by_seconds(self, seconds: np.ndarray, smooth=True) -> np.ndarray:
+        seconds = np.asarray(seconds, dtype=float)
+        result = np.zeros(len(seconds))
+        if len(self.seconds)<2:
+            return result
+
+        index = np.searchsorted(self.seconds, seconds, side='right')-1
+        valid = (index>=0) & (index<len(self.seconds)-1)
+        index = index[valid]
+        current = self.values[index]
+        if smooth:
+            result[valid] = current+(self.values[index+1]-current)*(seconds[valid]-self.seconds[index])/60/15
+        else:
+            result[valid] = current
+        return result
+
+    # returns the index of the first datapoint of every day
+    def _dayIndex(self) -> Dict[datetime.date, Tuple[int, int]]:
+        if self._days is None:
+            self._days = {}
+            if len(self.seconds)>0:
+                first = datetime.datetime.fromtimestamp(self.seconds[0]).date()
+                last = datetime.datetime.fromtimestamp(self.seconds[-1]).date()
+                days = [first+datetime.timedelta(days=i) for i in range((last-first).days+2)]
+                midnights = [datetime.datetime(d.year, d.month, d.day).timestamp() for d in days]
+                offsets = np.searchsorted(self.seconds, midnights, side='left')
+                for i in range(len(days)-1):
+                    self._days[days[i]] = (int(offsets[i]), int(offsets[i+1]))
+        return self._days
+
+    # returns the index range of the datapoints from start to end date (inclusive)
+    def _range(self, start: datetime.date, end: datetime.date) -> Tuple[int, int]:
+        days = self._dayIndex()
+        if len(days)==0 or end<start:
+            return 0, 0
+        first, last = min(days), max(days)
+        start, end = max(start, first), min(end, last)
+        if end<start:
+            return 0, 0
+        return days[start][0], days[end][1]
+
+    def _slice(self, begin: int, end: int) -> "Forecast":
+        forecast = Forecast(seconds=self.seconds[begin:end].copy(), values=self.values[begin:end].copy())
+        forecast.scaling = self.scaling
+        return forecast
     
     # returns a new forecast, capped to the specified date
     def getDailyForecast(self, datetime: datetime.datetime):
-        datapoints = []
         date = datetime.date()
-        for datapoint in self.datapoints:
-            if(date==datapoint.timestamp.date()):
-                datapoints.append(datapoint)
-
-        return Forecast(datapoints)
+        return self._slice(*self._range(date, date))
     
+    # returns a copy of the forecast, capped to the dates from start to end (inclusive)
+    def getForecastRange(self, start: datetime.date, end: datetime.date):
+        return self._slice(*self._range(start, end))
+
     # returns the highest value of the specified date
     def getDailyPeak(self, datetime: datetime.datetime):
         date = datetime.date()
-        peak=0
-        for datapoint in self.datapoints:
-            if(date==datapoint.timestamp.date()):
-                if peak < datapoint.forecast_value:
-                    peak = datapoint.forecast_value
-        return peak
+        begin, end = self._range(date, date)
+        if begin==end:
+            return 0
+        return max(float(np.max(self.values[begin:end])), 0)
     
     # returns the timestamps of all datapoints as list
     def getTimesteps(self) -> List[datetime.datetime]:
-        return [d.timestamp for d in self.datapoints]
+        return [datetime.datetime.fromtimestamp(t) for t in self.seconds.tolist()]
     
     # returns all forecast values as list 
     def getValues(self) -> List[float]:
-        return [d.forecast_value for d in self.datapoints]
+        return self.values.tolist()
     
-    # fit and visualize a gauss curve to the forecast graph using least squares
+    # visualize a fitted gauss curve of the forecast graph
     def visualizeGauss(self, plt, simulationdate):
-        guesstime = datetime.datetime(simulationdate.year,simulationdate.month,simulationdate.day,hour=12)
-        gauss = lambda x,a,mu,sigma: a * np.exp(-(x - mu)**2 / (2 * sigma**2))
-        
-        day_time = [datetime.datetime.timestamp(time) for time in self.getDailyForecast(guesstime).getTimesteps()]
-        day_values = self.getDailyForecast(guesstime).getValues()
-
-        startTimeIndex = 0
-        endTimeIndex = 0
-        for i in range(0,len(day_time)):
-            if(day_values[i]!=0 and startTimeIndex==0):
-                startTimeIndex=i
-            if(day_values[-i-1]!=0 and endTimeIndex==0):
-                endTimeIndex=len(day_time)-i
-
-        # extend time for 15 Minutes
-        startTimeIndex=startTimeIndex-1
-        endTimeIndex=endTimeIndex+1
-
-        day_time = day_time[startTimeIndex:endTimeIndex]
-        day_values = day_values[startTimeIndex:endTimeIndex]
-
-        max_value = np.max(day_values)
-
-        initial_guess = [max_value, datetime.datetime.timestamp(guesstime), 10000]  # Initial guess for [a, mu, sigma]
-        params, covariance = curve_fit(gauss, 
-                                    day_time, 
-                                    day_values, 
-                                    p0=initial_guess,
-                                    bounds = (0, [np.inf, np.inf, np.inf]))
-
-        a_fit, mu_fit, sigma_fit = params
+        self._visualizeFit(plt, simulationdate, "gauss", 'b', "gauss fit of forecast")
 
-        x_values = np.arange(day_time[0], day_time[-1]+1,60)
-        y_values = [gauss(x, a_fit, mu_fit, sigma_fit) for x in x_values]
-
-        plt.plot([datetime.datetime.fromtimestamp(x) for x in x_values], y_values, marker='', linestyle='--', color='b',label="gauss fit of forecast")
-
-    # fit and visualize a sin^2 curve to the forecast graph using least squares
+    # visualize a fitted sin^2 curve of the forecast graph
     def visualizeSin2(self, plt, simulationdate):
-        guesstime = datetime.datetime(simulationdate.year,simulationdate.month,simulationdate.day,hour=12)
-        sin2 = lambda x,a,b,c: a * np.sin(np.pi*(x-c-1/b/2)*b) * np.sin(np.pi*(x-c-1/b/2)*b)
-        
-        dailyforecast = self.getDailyForecast(guesstime)
-
-        if(len(dailyforecast.datapoints)):
-        
-            day_time = [datetime.datetime.timestamp(time) for time in dailyforecast.getTimesteps()]
-            day_values = dailyforecast.getValues()
-
-            startTimeIndex = 0
-            endTimeIndex = 0
-            for i in range(0,len(day_time)):
-                if(day_values[i]!=0 and startTimeIndex==0):
-                    startTimeIndex=i
-                if(day_values[-i-1]!=0 and endTimeIndex==0):
-                    endTimeIndex=len(day_time)-i
-
-            # extend time for 15 Minutes
-            startTimeIndex=startTimeIndex-1
-            endTimeIndex=endTimeIndex+1
-
-            day_time = day_time[startTimeIndex:endTimeIndex]
-            day_values = day_values[startTimeIndex:endTimeIndex]
-
-            max_value = np.max(day_values)
-
-            initial_guess = [max_value, 1/(60*60*10), datetime.datetime.timestamp(guesstime)]
-            params, covariance = curve_fit(sin2, 
-                                        day_time, 
-                                        day_values, 
-                                        p0=initial_guess,
-                                        bounds = (0, [np.inf, np.inf, np.inf]))
-            a_fit, b_fit, c_fit = params
+        self._visualizeFit(plt, simulationdate, "sin2", 'g', "sin² fit of forecast")
 
-            x_values = np.arange(day_time[0], day_time[-1]+1,60)
+    # the least squares fit is computed once per date and forecast and then taken from the fit cache
+    def _visualizeFit(self, plt, simulationdate, model: str, color: str, label: str):
+        fit = fit_cache().get(self, simulationdate, model)
+        if(fit is None):
+            return
 
-            y_values = [sin2(x, a_fit, b_fit, c_fit) for x in x_values]
+        x_values = np.arange(fit.start, fit.end+1, 60)
+        y_values = fit.evaluate(x_values)
 
-            plt.plot([datetime.datetime.fromtimestamp(x) for x in x_values], y_values, marker='', linestyle='--', color='g',label="sin² fit of forecast")
\ No newline at end of file
+        plt.plot([datetime.datetime.fromtimestamp(x) for x in x_values], y_values, marker='', linestyle='--', color=color,label=label)
@@ -0,0 +1,115 @@
+import os
+import json
+import glob
+import argparse
+import threading
+import numpy as np
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+from scheduling_framework.forecast_client import API_PATH, split_url
+
+# local stand-in for the energy-charts forecast API, serving recorded responses
+class ForecastStubServer:
+    def __init__(self, recordings: List[dict], host: str = "127.0.0.1", port: int = 0, fail_first: int = 0):
+        self.fail_first = fail_first # number of requests answered with 503 to exercise retries
+        self.requests = 0
+
+        # merge all recordings into one sorted series
+        seconds = {}
+        for recording in recordings:
+            for t, v in zip(recording.get("unix_seconds", []), recording.get("forecast_values", [])):
+                seconds[int(t)] = v
+        self.unix_seconds = np.array(sorted(seconds), dtype=np.int64)
+        self.forecast_values = [seconds[t] for t in self.unix_seconds]
+
+        stub = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.handle(self)
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.thread: Optional[threading.Thread] = None
+
+    # loads all recorded responses (*.json) from the directory
+    @staticmethod
+    def from_directory(path: str, **kwargs) -> "ForecastStubServer":
+        recordings = []
+        for file_path in sorted(glob.glob(os.path.join(path, "*.json"))):
+            with open(file_path, 'r') as file:
+                recordings.append(json.load(file))
+        return ForecastStubServer(recordings, **kwargs)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handle(self, request: BaseHTTPRequestHandler) -> None:
+        self.requests += 1
+        if self.requests <= self.fail_first:
+            self._send(request, 503, {"detail": "Service unavailable"})
+            return
+        if urlsplit(request.path).path != API_PATH:
+            self._send(request, 404, {"detail": "Not found"})
+            return
+
+        _, start, end = split_url(request.path)
+        begin_index, end_index = 0, len(self.unix_seconds)
+        if start is not None:
+            begin_index = int(np.searchsorted(self.unix_seconds, datetime(start.year, start.month, start.day).timestamp()))
+        if end is not None:
+            end_day = datetime(end.year, end.month, end.day)+timedelta(days=1)
+            end_index = int(np.searchsorted(self.unix_seconds, end_day.timestamp()))
+        if begin_index >= end_index:
+            self._send(request, 404, {"detail": "No recorded data for the requested range"})
+            return
+
+        self._send(request, 200, {
+            "unix_seconds": self.unix_seconds[begin_index:end_index].tolist(),
+            "forecast_values": self.forecast_values[begin_index:end_index]
+        })
+
+    def _send(self, request: BaseHTTPRequestHandler, status: int, data: dict) -> None:
+        body = json.dumps(data).encode()
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    # serve in a background thread
+    def start(self) -> "ForecastStubServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "ForecastStubServer":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='forecast_stub_server.py',
+                    description='Serves recorded energy-charts forecast responses locally, so simulations, tests and benchmarks run offline. Use the printed url as --forecastserver of the simulation.')
+    parser.add_argument('recordings', help="Directory containing recorded *.json responses.")
+    parser.add_argument('--host', type=str, default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    server = ForecastStubServer.from_directory(args.recordings, host=args.host, port=args.port)
+    print(f"Serving {len(server.unix_seconds)} recorded datapoints on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
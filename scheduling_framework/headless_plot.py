@@ -0,0 +1,170 @@
+import os
+import numpy as np
+import matplotlib.dates as mdates
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection, PatchCollection
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+from matplotlib.patches import Rectangle
+from typing import List, Optional
+
+from scheduling_framework.consumer_model import Consumer, ConsumerPlot
+from scheduling_framework.simulation_metrics import MetricsResult
+
+MINUTES_PER_DAY = 24*60
+
+# all data required to render the results of one simulation run, picklable for worker processes
+class RenderJob:
+    def __init__(self,
+                 path: str,
+                 simulationdate: datetime,
+                 peakSolarPower: float,
+                 production: np.ndarray,
+                 powerUsage: np.ndarray,
+                 overchargePower: np.ndarray,
+                 solarUnusedPower: np.ndarray,
+                 gridPower: np.ndarray,
+                 segments: np.ndarray,
+                 segmentIds: List[str],
+                 forecastPeak: float = 0,
+                 dpi: int = 100):
+        self.path = path
+        self.simulationdate = simulationdate
+        self.peakSolarPower = peakSolarPower
+        self.production = production
+        self.powerUsage = powerUsage
+        self.overchargePower = overchargePower
+        self.solarUnusedPower = solarUnusedPower
+        self.gridPower = gridPower
+        self.segments = segments # rows of (start minute, length in minutes, base power, power)
+        self.segmentIds = segmentIds
+        self.forecastPeak = forecastPeak
+        self.dpi = dpi
+
+    # creates a render job from the results of a simulation
+    @staticmethod
+    def from_results(path: str, simulationdate: datetime, peakSolarPower: float, consumers: List[Consumer], metrics: MetricsResult, forecastPeak: float = 0) -> "RenderJob":
+        segments, segmentIds = consumer_segments(simulationdate, consumers)
+        return RenderJob(path,
+                         simulationdate,
+                         peakSolarPower,
+                         metrics.site.production,
+                         metrics.site.powerUsage,
+                         metrics.site.overchargePower,
+                         metrics.site.solarUnusedPower,
+                         metrics.site.gridPower,
+                         segments,
+                         segmentIds,
+                         forecastPeak)
+
+# returns the stacked rectangles of all consumers, equivalent to the segments of ConsumerPlot
+def consumer_segments(simulationdate: datetime, consumers: List[Consumer]):
+    ledger = np.zeros(MINUTES_PER_DAY)
+    segments = []
+    segmentIds = []
+
+    curves = []
+    for c in consumers:
+        curves.append((c.id_user, c.power))
+        if(c.overpower.interval is not None):
+            curves.append((c.id_user, c.overpower))
+
+    for id_user, curve in curves:
+        start = int((curve.interval.time_start.timestamp()-simulationdate.timestamp())/60)
+        power = curve.dense()[:max(MINUTES_PER_DAY-start,0)]
+        if(len(power)==0 or start<0):
+            continue
+        base = ledger[start:start+len(power)]
+
+        # a new segment starts wherever the base power or the power curve changes
+        changes = np.flatnonzero((np.diff(base)!=0) | (np.diff(power)!=0))+1
+        starts = np.concatenate(([0], changes))
+        ends = np.concatenate((changes, [len(power)]))
+        rows = np.column_stack((start+starts, ends-starts, base[starts], power[starts]))
+        rows = rows[rows[:,3]!=0]
+
+        segments.append(rows)
+        segmentIds.extend([id_user]*len(rows))
+        ledger[start:start+len(power)] += power
+
+    if(len(segments)==0):
+        return np.zeros((0,4)), segmentIds
+    return np.concatenate(segments), segmentIds
+
+# returns the vertices of a post-step line through the per-minute values
+def step_vertices(day: float, values: np.ndarray) -> np.ndarray:
+    edges = day+np.arange(len(values)+1)/MINUTES_PER_DAY
+    x = np.repeat(edges, 2)[1:-1]
+    y = np.repeat(np.asarray(values, dtype=float), 2)
+    return np.column_stack((x, y))
+
+# render the results of one simulation run to a png or svg file without opening a window
+def render(job: RenderJob) -> str:
+    fmt = os.path.splitext(job.path)[1].lstrip('.').lower() or 'png'
+    rasterize = fmt=='svg' # embed the collections as bitmap to keep large svg files small
+
+    fig = Figure(figsize=(10, 8))
+    FigureCanvasAgg(fig)
+    ax1, ax2 = fig.subplots(2, 1, gridspec_kw={'height_ratios': [3, 2]})
+    day = mdates.date2num(job.simulationdate)
+
+    ax1.set_title('Solar forecast and BEV consumption - {}kWp'.format(job.peakSolarPower / 1000), fontsize=16)
+    for ax in (ax1, ax2):
+        ax.set_xlabel('Time (CEST)', fontsize=12)
+        ax.set_ylabel('Power (W)', fontsize=12)
+        ax.grid(True)
+        ax.tick_params(axis='x', rotation=45)
+        ax.xaxis_date()
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+
+    # one collection for all consumer segments
+    if(len(job.segments)>0):
+        rects = [Rectangle((day+s[0]/MINUTES_PER_DAY, s[2]), s[1]/MINUTES_PER_DAY, s[3]) for s in job.segments]
+        colors = [ConsumerPlot.color(id_user) for id_user in job.segmentIds]
+        collection = PatchCollection(rects, facecolors=colors, edgecolors='black', linewidths=1)
+        collection.set_rasterized(rasterize)
+        ax1.add_collection(collection)
+
+    # one line collection per axis for all power curves
+    styles = [
+        (job.production, 'y', '-', 2.0, "scaled solar power forecast", (ax1, ax2)),
+        (job.powerUsage, 'black', '-', 1.0, "total consumed power", (ax1, ax2)),
+        (job.overchargePower, 'lime', '-.', 1.0, "overcharge power", (ax2,)),
+        (job.solarUnusedPower, 'tab:blue', ':', 1.0, "remaining solar power", (ax2,)),
+        (job.gridPower, 'r', '-', 1.0, "power drawn from grid", (ax2,)),
+    ]
+    for ax in (ax1, ax2):
+        lines = [s for s in styles if ax in s[5]]
+        collection = LineCollection([step_vertices(day, s[0]) for s in lines],
+                                    colors=[s[1] for s in lines],
+                                    linestyles=[s[2] for s in lines],
+                                    linewidths=[s[3] for s in lines])
+        collection.set_rasterized(rasterize)
+        ax.add_collection(collection)
+        ax.legend(handles=[Line2D([], [], color=s[1], linestyle=s[2], linewidth=s[3], label=s[4]) for s in lines], loc="upper left")
+
+    # limit the plot to the charging period
+    active = np.flatnonzero(job.powerUsage)
+    if(len(active)>0):
+        xlim = (day+(active[0]-30)/MINUTES_PER_DAY, day+(active[-1]+30)/MINUTES_PER_DAY)
+    else:
+        xlim = (day, day+1)
+    ymax = max(job.forecastPeak, float(np.max(job.production)), float(np.max(job.powerUsage)))*1.15
+    for ax in (ax1, ax2):
+        ax.set_xlim(xlim)
+        ax.set_ylim((0, ymax if ymax>0 else 1))
+
+    fig.tight_layout()
+    fig.savefig(job.path, format=fmt, dpi=job.dpi)
+    return job.path
+
+# render many simulation runs in parallel worker processes
+def render_batch(jobs: List[RenderJob], processes: Optional[int] = None) -> List[str]:
+    if(len(jobs)==0):
+        return []
+    if(processes==1 or len(jobs)==1):
+        return [render(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(render, jobs))
@@ -0,0 +1,129 @@
+import time
+import numpy as np
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from scheduling_framework.vehicle import Vehicle
+from scheduling_framework.consumer_model import TimeInterval, Consumer
+
+# a move sets the start minute of the consumer with the given index
+Move = Tuple[int, int]
+
+# grid energy of a schedule, moves are evaluated on the affected minutes only
+# with a per-minute limit (site power cap minus baseload), moves increasing the excess over the limit are rejected
+class GridEvaluator:
+    def __init__(self, production: List[float], curves: List[np.ndarray], starts: List[int], limit: Optional[np.ndarray] = None):
+        self.production = np.asarray(production, dtype=float)
+        self.limit = limit
+        self.curves = curves
+        self.starts = list(starts)
+        self.load = np.zeros(len(self.production))
+        for curve, start in zip(curves, starts):
+            self.load[start:start+len(curve)] += curve
+        self.gridEnergy = self._deficit(self.load, 0) # in Wh
+
+    def _deficit(self, load: np.ndarray, offset: int) -> float:
+        return float(np.maximum(load-self.production[offset:offset+len(load)], 0).sum()/60)
+
+    def _window(self, moves: List[Move]) -> Tuple[int, int]:
+        begin = min(min(self.starts[i], start) for i, start in moves)
+        end = max(max(self.starts[i], start)+len(self.curves[i]) for i, start in moves)
+        return begin, end
+
+    # returns the change of grid energy if the moves were applied
+    def delta(self, moves: List[Move]) -> float:
+        begin, end = self._window(moves)
+        load = self.load[begin:end].copy()
+        before = self._deficit(load, begin)
+        for i, start in moves:
+            curve = self.curves[i]
+            load[self.starts[i]-begin:self.starts[i]-begin+len(curve)] -= curve
+            load[start-begin:start-begin+len(curve)] += curve
+        if self.limit is not None:
+            limit = self.limit[begin:end]
+            if np.max(load-limit)>max(np.max(self.load[begin:end]-limit), 0)+1e-9:
+                return float('inf')
+        return self._deficit(load, begin)-before
+
+    def apply(self, moves: List[Move], delta: float) -> None:
+        for i, start in moves:
+            curve = self.curves[i]
+            self.load[self.starts[i]:self.starts[i]+len(curve)] -= curve
+            self.load[start:start+len(curve)] += curve
+            self.starts[i] = start
+        self.gridEnergy += delta
+
+# improve the start times of the scheduled consumers by simulated annealing until the time limit (in seconds) is reached
+# or no grid energy is left
+# start times of unstarted consumers are shifted and swapped within the remaining parking time, the best schedule found is returned
+# with a site power cap (in W), the power of the consumers plus the baseload is kept below the cap
+def improve_schedule(consumers: List[Consumer], vehicles: List[Vehicle], timestamp: datetime, production: List[float], timelimit: float, seed: int = 0, baseload: Optional[List[float]] = None, powercap: Optional[float] = None) -> List[Consumer]:
+    begin = time.perf_counter()
+    deadline = begin+timelimit
+    simulationdate = datetime(timestamp.year,timestamp.month,timestamp.day)
+    now = int((timestamp-simulationdate).total_seconds()/60)
+    arrive = {v.id_user: int((v.time_arrive-simulationdate).total_seconds()/60) for v in vehicles}
+    leave = {v.id_user: int((v.time_leave-simulationdate).total_seconds()/60) for v in vehicles}
+
+    curves = [c.power.dense() for c in consumers]
+    starts = [int((c.power.interval.time_start-simulationdate).total_seconds()/60) for c in consumers]
+    # unstarted consumers move between now (or their arrival) and their departure, started ones keep their start time
+    earliest = [s if s<now else max(now, min(arrive.get(c.id_user, s), s)) for c, s in zip(consumers, starts)]
+    latest = [s if s<now else max(min(leave.get(c.id_user, s+len(curve)), len(production))-len(curve), s) for c, curve, s in zip(consumers, curves, starts)]
+    movable = [i for i in range(len(consumers)) if latest[i]>earliest[i]]
+
+    limit = None
+    if powercap is not None:
+        limit = powercap-(np.asarray(baseload, dtype=float) if baseload is not None else np.zeros(len(production)))
+    evaluator = GridEvaluator(production, curves, starts, limit)
+    initialEnergy = evaluator.gridEnergy
+    if(len(movable)==0 or initialEnergy==0):
+        return consumers
+
+    rng = np.random.default_rng(seed)
+    temperature = max(float(c.sum()) for c in curves)/60*0.01 # 1% of the largest charging energy
+    bestEnergy = initialEnergy
+    bestStarts = list(starts)
+    iterations = 0
+
+    while True:
+        current = time.perf_counter()
+        if current>=deadline:
+            break
+        iterations += 1
+        i = movable[rng.integers(len(movable))]
+        r = rng.random()
+        if r<0.5: # small shift
+            moves = [(i, int(np.clip(evaluator.starts[i]+rng.integers(-30, 31), earliest[i], latest[i])))]
+        elif r<0.8: # random start time
+            moves = [(i, int(rng.integers(earliest[i], latest[i]+1)))]
+        else: # swap the start times of two consumers
+            j = movable[rng.integers(len(movable))]
+            si, sj = evaluator.starts[i], evaluator.starts[j]
+            if i==j or not (earliest[i]<=sj<=latest[i] and earliest[j]<=si<=latest[j]):
+                continue
+            moves = [(i, sj), (j, si)]
+        if all(evaluator.starts[k]==start for k, start in moves):
+            continue
+
+        delta = evaluator.delta(moves)
+        t = temperature*(1-(current-begin)/timelimit)
+        if delta<=0 or (t>0 and rng.random()<np.exp(-delta/t)):
+            evaluator.apply(moves, delta)
+            if evaluator.gridEnergy<bestEnergy-1e-9:
+                bestEnergy = evaluator.gridEnergy
+                bestStarts = list(evaluator.starts)
+                if bestEnergy<=1e-9: # no grid energy left, no further improvement is possible
+                    break
+
+    if bestEnergy>=initialEnergy-1e-9:
+        print(f"Local search: no improvement of {initialEnergy/1000:.2f} kWh grid energy ({iterations} iterations)")
+        return consumers
+
+    print(f"Local search: grid energy reduced from {initialEnergy/1000:.2f} kWh to {bestEnergy/1000:.2f} kWh ({iterations} iterations)")
+    improved = []
+    for c, start in zip(consumers, bestStarts):
+        time_start = simulationdate+timedelta(minutes=start)
+        interval = TimeInterval(time_start, time_start+(c.power.interval.time_end-c.power.interval.time_start))
+        improved.append(Consumer(c.id_user, c.power.withInterval(interval)))
+    return improved
@@ -0,0 +1,147 @@
+import os
+import tracemalloc
+from typing import Dict, List, Optional
+
+MB = 1024*1024
+try:
+    PAGESIZE = os.sysconf("SC_PAGE_SIZE") # bytes per page of the resident size
+except (AttributeError, ValueError, OSError):
+    PAGESIZE = 4096
+FRAMES = 4 # traced frames per allocation, to find the calling site within the repository behind numpy
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# raised if the memory budget is exceeded, the message contains the memory report up to that point
+class MemoryBudgetExceeded(Exception):
+    pass
+
+# memory used by one phase of a simulation
+class PhaseMemory:
+    def __init__(self, name: str, resident: float, start: int = 0, peak: int = 0, end: int = 0, sites: List[tuple] = []):
+        self.name = name
+        self.resident = resident # resident size of the process at the end of the phase in MB
+        self.start = start # traced memory at the beginning of the phase in bytes
+        self.peak = peak # highest traced memory during the phase
+        self.end = end
+        self.sites = sites # (file:line, size difference in bytes) of the sites allocating the most memory in the phase
+
+    def to_dict(self) -> dict:
+        return {"phase": self.name,
+                "residentMB": self.resident,
+                "startMB": self.start/MB,
+                "peakMB": self.peak/MB,
+                "endMB": self.end/MB,
+                "sites": [{"site": site, "sizeMB": size/MB} for site, size in self.sites]}
+
+# memory report and budget of the phases of a simulation, a new phase ends the current one
+# report: the allocations are traced with tracemalloc, which slows down the simulation considerably
+# budget: current resident size of the process in MB, checked at the end of every phase and on check() (cheap)
+# unlike the maximum resident size, it falls again, so a long-lived process (e.g. a worker) is not charged for earlier runs
+# a disabled profiler does nothing, so the phases can be marked unconditionally
+class MemoryProfiler:
+    def __init__(self, report: bool = True, budget: Optional[float] = None, top: int = 3):
+        self.tracing = report or (budget is not None and not RESIDENT)
+        self.enabled = self.tracing or budget is not None
+        self.budget = budget
+        self.top = top
+        self.phases: List[PhaseMemory] = []
+        self.current: Optional[str] = None
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+        self.started = False # tracing was started by the profiler and is stopped by finish()
+        if self.tracing and not tracemalloc.is_tracing():
+            tracemalloc.start(FRAMES)
+            self.started = True
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),
+                                                          tracemalloc.Filter(False, __file__),
+                                                          tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+                                                          tracemalloc.Filter(False, "<unknown>")))
+
+    # start the next phase, ending the current one
+    def phase(self, name: str) -> None:
+        if not self.enabled:
+            return
+        self._end()
+        self.current = name
+        if self.tracing:
+            self.snapshot = self._snapshot()
+            self.start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+
+    def _end(self) -> None:
+        if self.current is None:
+            return
+        phase = PhaseMemory(self.current, resident_size())
+        if self.tracing:
+            phase.end, phase.peak = tracemalloc.get_traced_memory()
+            phase.start = self.start
+            sites: Dict[str, int] = {}
+            for difference in self._snapshot().compare_to(self.snapshot, 'traceback'):
+                site = allocation_site(difference.traceback)
+                sites[site] = sites.get(site, 0)+difference.size_diff
+            phase.sites = sorted([(site, size) for site, size in sites.items() if size>0], key=lambda s: -s[1])[:self.top]
+        self.phases.append(phase)
+        self.current = None
+        self.snapshot = None
+        if self.budget is not None and self.usage(phase)>self.budget:
+            self.stop()
+            raise MemoryBudgetExceeded(f"Error: Memory budget of {self.budget:.1f} MB exceeded in phase {phase.name} ({self.usage(phase):.1f} MB).\n"+self.report())
+
+    # memory in MB compared with the budget
+    def usage(self, phase: Optional[PhaseMemory] = None) -> float:
+        if RESIDENT:
+            return phase.resident if phase is not None else resident_size()
+        return (phase.peak if phase is not None else tracemalloc.get_traced_memory()[1])/MB
+
+    # abort with MemoryBudgetExceeded if the budget is exceeded within the current phase, e.g. in a long loop
+    def check(self) -> None:
+        if self.current is not None and self.budget is not None and self.usage()>self.budget:
+            self._end()
+
+    # end the last phase and stop tracing, returns the phases
+    def finish(self) -> List[PhaseMemory]:
+        if self.enabled:
+            self._end()
+            self.stop()
+        return self.phases
+
+    def stop(self) -> None:
+        if self.started:
+            tracemalloc.stop()
+            self.started = False
+
+    def report(self) -> str:
+        summary = []
+        if RESIDENT:
+            summary.append(f"highest resident size {max(p.resident for p in self.phases):.1f} MB")
+        if self.tracing:
+            summary.append(f"peak {max(p.peak for p in self.phases)/MB:.1f} MB traced")
+        if self.budget is not None:
+            summary.append(f"budget {self.budget:.1f} MB")
+        lines = ["Memory report: "+", ".join(summary),
+                 f"{'Phase':<24} {'Resident MB':>12}"+(f" {'Peak MB':>9} {'End MB':>9} {'Change MB':>10}" if self.tracing else "")]
+        for p in self.phases:
+            traced = f" {p.peak/MB:>9.1f} {p.end/MB:>9.1f} {(p.end-p.start)/MB:>+10.1f}" if self.tracing else ""
+            lines.append(f"{p.name:<24} {p.resident:>12.1f}"+traced)
+            for site, size in p.sites:
+                lines.append(f"    {site}: {size/1024:+.1f} kB")
+        return "\n".join(lines)
+
+# returns the most recent frame of the allocation within the repository as file:line, the most recent frame if there is none
+def allocation_site(traceback: tracemalloc.Traceback) -> str:
+    frame = traceback[-1]
+    for f in reversed(traceback):
+        if f.filename.startswith(ROOT) and "site-packages" not in f.filename:
+            frame = f
+            break
+    return f"{os.path.relpath(frame.filename, ROOT) if frame.filename.startswith(ROOT) else frame.filename}:{frame.lineno}"
+
+# current resident size of the process in MB, 0 if unknown (only linux provides it without further packages)
+def resident_size() -> float:
+    try:
+        with open("/proc/self/statm", 'rb') as file:
+            return int(file.read().split()[1])*PAGESIZE/MB
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+RESIDENT = resident_size()>0 # without the resident size, the budget is checked against the traced memory
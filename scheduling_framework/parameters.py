@@ -1,24 +1,45 @@
 from datetime import datetime, timedelta
 
+from scheduling_framework.forecast_client import API_SERVER, forecast_url
+from scheduling_framework.clear_sky import LATITUDE, LONGITUDE
+
 # define variable parameters for the scheduling algorithm
 class SchedulingParameters:
     def __init__(self,
                  flatten = False,
                  overcharge = True,
                  reducemax = True,
-                 allowgrid = False
+                 allowgrid = False,
+                 strategy = "dynamic",
+                 improvetime = 0.0,
+                 powercap = None,
+                 search = "exhaustive",
+                 searchstep = 15,
+                 profiles = "rules"
                 ):
         self.flatten=flatten
         self.overcharge=overcharge
         self.reducemax=reducemax
         self.allowgrid=allowgrid
+        self.strategy=strategy # name of a registered scheduling strategy
+        self.improvetime=improvetime # seconds of local search after each scheduling, 0 disables it
+        self.powercap=powercap # grid connection limit of the site in W, None for no limit
+        self.search=search # start time search: exhaustive (every minute) or coarse (coarse grid, refined around the best candidates)
+        self.searchstep=searchstep # minutes between the start times of the coarse grid
+        self.profiles=profiles # charging profile of the dynamic strategy: rules (reducemax/flatten rules) or best (best scoring variant)
 
     def to_dict(self):
         return {
             "flatten": self.flatten,
             "overcharge": self.overcharge,
             "reducemax": self.reducemax,
-            "allowgrid": self.allowgrid
+            "allowgrid": self.allowgrid,
+            "strategy": self.strategy,
+            "improvetime": self.improvetime,
+            "powercap": self.powercap,
+            "search": self.search,
+            "searchstep": self.searchstep,
+            "profiles": self.profiles
         }
     
     @staticmethod
@@ -26,7 +47,14 @@ class SchedulingParameters:
         return SchedulingParameters(
             flatten=data.get("flatten", False),
             overcharge=data.get("overcharge", True),
-            reducemax=data.get("reducemax", True)
+            reducemax=data.get("reducemax", True),
+            allowgrid=data.get("allowgrid", False),
+            strategy=data.get("strategy", "dynamic"),
+            improvetime=data.get("improvetime", 0.0),
+            powercap=data.get("powercap"),
+            search=data.get("search", "exhaustive"),
+            searchstep=data.get("searchstep", 15),
+            profiles=data.get("profiles", "rules")
         )
 
 # define variable parameters for the simulation
@@ -35,25 +63,53 @@ class SimulationParameters:
                  storepath = 'test/simulation.json',
                  testdatapath = 'test/testdata.json',
                  resultpath = 'results/result.csv',
+                 plotpath = None,
+                 timeseriespath = None,
+                 tracepath = None,
+                 memoryreport = False,
+                 memorybudget = None,
                  exportresults = False,
                  hideresults = False,
                  simulationdate = datetime.now() + timedelta(days=1),
                  peakSolarPower = 300_000, # 300 kWp
                  peakPowerForecast = 4_196_000_000, # 4196 MW peak in June 2024 / energy-charts.info
                  smoothForecast = True,
+                 productionmodel = "forecast",
+                 fitcachepath = None,
+                 productioncachepath = None,
                  forecastapi = None,
+                 forecastserver = API_SERVER,
+                 forecastsource = "api",
+                 latitude = LATITUDE,
+                 longitude = LONGITUDE,
+                 cloudiness = 0.0,
+                 forecastupdates = None,
                  scheduling = SchedulingParameters()
                 ):
         self.storepath = storepath
         self.testdatapath = testdatapath
         self.resultpath = resultpath
+        self.plotpath = plotpath
+        self.timeseriespath = timeseriespath # directory of the per-minute timeseries store
+        self.tracepath = tracepath # json lines file of the recorded scheduling decisions
+        self.memoryreport = memoryreport # print the memory used by every phase of the simulation
+        self.memorybudget = memorybudget # abort if the resident size of the process exceeds this many MB
         self.exportresults = exportresults
         self.hideresults = hideresults
         self.simulationdate = datetime(simulationdate.year,simulationdate.month,simulationdate.day)
         self.peakSolarPower = peakSolarPower
         self.peakPowerForecast = peakPowerForecast
         self.smoothForecast = smoothForecast
+        self.productionmodel = productionmodel # forecast, sin2 or gauss
+        self.fitcachepath = fitcachepath
+        self.productioncachepath = productioncachepath # directory of the on-disk production cache
         self.forecastapi = forecastapi
+        self.forecastserver = forecastserver
+        self.forecastsource = forecastsource # api or clearsky
+        self.latitude = latitude # site location of the clear-sky model
+        self.longitude = longitude
+        self.cloudiness = cloudiness # 0 (clear sky) to 1 (fully attenuated)
+        self.forecastupdates = list(forecastupdates or []) # times HH:MM of the day at which the forecast is fetched again and the plan is updated
         self.scheduling = scheduling
 
         self.update_forecastapi()
@@ -62,24 +118,34 @@ class SimulationParameters:
     def update_forecastapi(self):
         begindate = self.simulationdate - timedelta(days=1)
         enddate = self.simulationdate + timedelta(days=1)
-        day_string_begin=str(begindate.year)+"-"+str(begindate.month)+"-"+str(begindate.day)
-        day_string_begin=datetime.strptime(day_string_begin, "%Y-%m-%d").strftime("%Y-%m-%d")
-        day_string_end=str(enddate.year)+"-"+str(enddate.month)+"-"+str(enddate.day)
-        day_string_end=datetime.strptime(day_string_end, "%Y-%m-%d").strftime("%Y-%m-%d")
-        self.forecastapi = f"https://api.energy-charts.info/public_power_forecast?country=at&production_type=solar&forecast_type=current&start={day_string_begin}&end={day_string_end}"
+        self.forecastapi = forecast_url(begindate, enddate, self.forecastserver)
 
     def to_dict(self):
         return {
             "storepath": self.storepath,
             "testdatapath": self.testdatapath,
             "resultpath": self.resultpath,
+            "plotpath": self.plotpath,
+            "timeseriespath": self.timeseriespath,
+            "tracepath": self.tracepath,
+            "memoryreport": self.memoryreport,
+            "memorybudget": self.memorybudget,
             "exportresults": self.exportresults,
             "hideresults": self.hideresults,
             "simulationdate": self.simulationdate.timestamp(),
             "peakSolarPower": self.peakSolarPower,
             "peakPowerForecast": self.peakPowerForecast,
             "smoothForecast": self.smoothForecast,
+            "productionmodel": self.productionmodel,
+            "fitcachepath": self.fitcachepath,
+            "productioncachepath": self.productioncachepath,
             "forecastapi": self.forecastapi,
+            "forecastserver": self.forecastserver,
+            "forecastsource": self.forecastsource,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "cloudiness": self.cloudiness,
+            "forecastupdates": self.forecastupdates,
             "scheduling": self.scheduling.to_dict()
         }
     
@@ -92,12 +158,26 @@ class SimulationParameters:
             storepath=data["storepath"],
             testdatapath=data["testdatapath"],
             resultpath=data["resultpath"],
+            plotpath=data.get("plotpath"),
+            timeseriespath=data.get("timeseriespath"),
+            tracepath=data.get("tracepath"),
+            memoryreport=data.get("memoryreport", False),
+            memorybudget=data.get("memorybudget"),
             exportresults=data["exportresults"],
             hideresults=data["hideresults"],
             simulationdate=simulationdate,
             peakSolarPower=data["peakSolarPower"],
             peakPowerForecast=data["peakPowerForecast"],
             smoothForecast=data["smoothForecast"],
+            productionmodel=data.get("productionmodel", "forecast"),
+            fitcachepath=data.get("fitcachepath"),
+            productioncachepath=data.get("productioncachepath"),
             forecastapi=data["forecastapi"],
+            forecastserver=data.get("forecastserver", API_SERVER),
+            forecastsource=data.get("forecastsource", "api"),
+            latitude=data.get("latitude", LATITUDE),
+            longitude=data.get("longitude", LONGITUDE),
+            cloudiness=data.get("cloudiness", 0.0),
+            forecastupdates=data.get("forecastupdates"),
             scheduling=scheduling
         )
\ No newline at end of file
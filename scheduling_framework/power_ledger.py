@@ -0,0 +1,105 @@
+from typing import List
+
+from scheduling_framework.consumer_model import PowerCurve
+
+# per-minute power of the site as segment tree with lazy range additions of linear power (offset+slope*minute)
+# adding power to a range of minutes and the maximum power within a range both take O(log n)
+# the maximum over a range with a pending ramp is bounded by the highest value of the ramp at its start or end, so
+# ranges containing ramps may report a higher maximum than the exact one (never a lower one), single minutes are exact
+class PowerLedger:
+    def __init__(self, power: List[float]):
+        self.n = len(power)
+        self.height = max(self.n-1, 0).bit_length()
+        self.size = 1 << self.height # leaves, padded to a power of two so that every node covers consecutive minutes
+        self.tree = [float('-inf')]*(2*self.size) # node i covers the children 2i and 2i+1
+        self.tree[self.size:self.size+self.n] = [float(p) for p in power]
+        self.offset = [0.0]*self.size # linear addition not yet applied to the children of a node
+        self.slope = [0.0]*self.size
+        for i in range(self.size-1, 0, -1):
+            self.tree[i] = max(self.tree[2*i], self.tree[2*i+1])
+
+    # highest value of the linear power offset+slope*minute within the minutes of a node
+    def _bound(self, node: int, offset: float, slope: float) -> float:
+        shift = self.height-node.bit_length()+1
+        first = (node << shift)-self.size
+        last = first+(1 << shift)-1
+        return offset+slope*(first if slope<0 else last)
+
+    def _apply(self, node: int, offset: float, slope: float) -> None:
+        self.tree[node] += self._bound(node, offset, slope)
+        if node<self.size:
+            self.offset[node] += offset
+            self.slope[node] += slope
+
+    # recompute the parents of a leaf after an addition
+    def _build(self, node: int) -> None:
+        while node>1:
+            node >>= 1
+            self.tree[node] = max(self.tree[2*node], self.tree[2*node+1])+self._bound(node, self.offset[node], self.slope[node])
+
+    # apply the pending additions on the path from the root to a leaf
+    def _push(self, node: int) -> None:
+        for shift in range(self.height, 0, -1):
+            i = node >> shift
+            if self.offset[i]!=0 or self.slope[i]!=0:
+                self._apply(2*i, self.offset[i], self.slope[i])
+                self._apply(2*i+1, self.offset[i], self.slope[i])
+                self.offset[i] = 0.0
+                self.slope[i] = 0.0
+
+    # add the power offset+slope*minute to the minutes [start, end)
+    def _add(self, start: int, end: int, offset: float, slope: float) -> None:
+        start, end = max(start, 0), min(end, self.n)
+        if start>=end:
+            return
+        left, right = start+self.size, end+self.size
+        self._push(left)
+        self._push(right-1)
+        while left<right:
+            if left&1:
+                self._apply(left, offset, slope)
+                left += 1
+            if right&1:
+                right -= 1
+                self._apply(right, offset, slope)
+            left >>= 1
+            right >>= 1
+        self._build(start+self.size)
+        self._build(end-1+self.size)
+
+    # add constant power to the minutes [start, end)
+    def add(self, start: int, end: int, value: float) -> None:
+        self._add(start, end, value, 0.0)
+
+    # returns the maximum power within the minutes [start, end)
+    def max(self, start: int, end: int) -> float:
+        start, end = max(start, 0), min(end, self.n)
+        if start>=end:
+            return float('-inf')
+        left, right = start+self.size, end+self.size
+        self._push(left)
+        self._push(right-1)
+        result = float('-inf')
+        while left<right:
+            if left&1:
+                result = max(result, self.tree[left])
+                left += 1
+            if right&1:
+                right -= 1
+                result = max(result, self.tree[right])
+            left >>= 1
+            right >>= 1
+        return result
+
+    # add a power curve starting at the given minute, every segment (constant or ramp) is added as one range
+    def addCurve(self, start: int, curve: PowerCurve) -> None:
+        for b, value, slope, length in zip(curve.breakpoints.tolist(), curve.values.tolist(), curve.slopes.tolist(), curve._lengths().tolist()):
+            self._add(start+b, start+b+length, value-slope*(start+b), slope)
+
+    # returns the maximum site power if the curve was added at the given minute
+    # a ramp is bounded by its highest value at the start or end, like the maximum of a range
+    def peak(self, start: int, curve: PowerCurve) -> float:
+        result = float('-inf')
+        for b, value, slope, length in zip(curve.breakpoints.tolist(), curve.values.tolist(), curve.slopes.tolist(), curve._lengths().tolist()):
+            result = max(result, self.max(start+b, start+b+length)+max(value, value+slope*(length-1)))
+        return result
@@ -1,20 +1,29 @@
+import os
+import copy
+import hashlib
 import numpy as np
 import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 from scheduling_framework.forecast_power import Forecast
+from scheduling_framework.solar_fit import SolarFit
+
+# returns the array as read-only array, productions are shared between runs
+def readonly(values) -> np.ndarray:
+    values = np.asarray(values, dtype=float)
+    if values.flags.writeable:
+        values = values.copy()
+        values.flags.writeable = False
+    return values
 
 # the renewable power production based on the forecast
 class Production:
     def __init__(self, forecast: Forecast, timestamp: datetime, smooth: bool = True):
         self.day = datetime(timestamp.year, timestamp.month, timestamp.day)
         forecast = forecast.getDailyForecast(timestamp)
-        self.production: list[float] = []
-        time = self.day
-        while time < self.day+timedelta(days=1):
-            self.production.append(forecast.get_forecast_by_timestamp(time, smooth))
-            time=time+timedelta(minutes=1)
+        minutes = self.day.timestamp()+60*np.arange(24*60)
+        self.production: np.ndarray = readonly(forecast.get_forecast_by_seconds(minutes, smooth))
     def __str__(self) -> str:
         return str(self.production)
     
@@ -27,6 +36,11 @@ class Production:
         times = [self.day+timedelta(minutes=t) for t in range(0,60*24)]
         plt.step(times, self.production, where='post', marker='', linestyle='-', color='y',linewidth=2.0,label="scaled solar power forecast")
 
+    # returns the minutes of the day from start on whose production differs from the other production by more than tolerance W
+    def changed_minutes(self, other: "Production", start: int = 0, tolerance: float = 1.0) -> np.ndarray:
+        start = max(start, 0)
+        return start+np.flatnonzero(np.abs(np.asarray(self.production[start:])-np.asarray(other.production[start:]))>tolerance)
+
     # returns the power curve of the remaining renewable power
     @staticmethod
     def renewable_available(production: List[float], powerUsage: List[float]):
@@ -35,4 +49,72 @@ class Production:
         renewable_power = production
         renewable_power = np.subtract(renewable_power,powerUsage)
         renewable_power = np.maximum(renewable_power,0)
-        return renewable_power
\ No newline at end of file
+        return renewable_power
+
+# analytic renewable power production from a fitted solar model
+class FittedProduction(Production):
+    def __init__(self, fit: Optional[SolarFit], timestamp: datetime):
+        self.day = datetime(timestamp.year, timestamp.month, timestamp.day)
+        minutes = self.day.timestamp()+60*np.arange(24*60)
+        self.production: np.ndarray = readonly(fit.evaluate(minutes) if fit is not None else np.zeros(24*60))
+
+# production of a day from an already built per-minute array
+class CachedProduction(Production):
+    def __init__(self, day: datetime, production: np.ndarray):
+        self.day = datetime(day.year, day.month, day.day)
+        self.production: np.ndarray = production
+
+# identifies a forecast by its content, for forecasts passed in instead of fetched
+def forecast_fingerprint(forecast: Forecast) -> str:
+    digest = hashlib.sha1(forecast.seconds.tobytes()+forecast.values.tobytes())
+    digest.update(np.float64(forecast.scaling).tobytes())
+    return "forecast:"+digest.hexdigest()
+
+# cache of built productions per (date, scale, smoothing, production model, forecast source), in memory and optionally on disk
+# the scaled forecast is kept with the production, so a hit skips fetching the forecast as well
+class ProductionCache:
+    def __init__(self, cachepath: Optional[str] = None):
+        self.cachepath = cachepath
+        self.entries: Dict[Tuple[str, float, bool, str, str], Tuple[Forecast, np.ndarray]] = {}
+        self.builds = 0 # number of productions built instead of taken from the cache
+
+    def _filename(self, key: Tuple[str, float, bool, str, str]) -> str:
+        date, scale, smooth, model, source = key
+        source = hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.cachepath, f"{date}_{scale:.12g}_{'smooth' if smooth else 'step'}_{model}_{source}.npz")
+
+    # returns the scaled forecast and the production of the key, None if neither memory nor disk contain it
+    # the forecast is a shallow copy sharing the read-only arrays, so it can be scaled again without changing the cache
+    def get(self, key: Tuple[str, float, bool, str, str]) -> Optional[Tuple[Forecast, Production]]:
+        if key not in self.entries and self.cachepath is not None and os.path.exists(self._filename(key)):
+            with np.load(self._filename(key)) as data:
+                forecast = Forecast(seconds=readonly(data["seconds"]), values=readonly(data["values"]))
+                forecast.scaling = float(data["scaling"])
+                self.entries[key] = (forecast, readonly(data["production"]))
+        if key not in self.entries:
+            return None
+        forecast, production = self.entries[key]
+        return copy.copy(forecast), CachedProduction(datetime.fromisoformat(key[0]), production)
+
+    # store the scaled forecast and the built production of the key
+    def put(self, key: Tuple[str, float, bool, str, str], forecast: Forecast, production: Production) -> None:
+        self.builds += 1
+        forecast = copy.copy(forecast)
+        forecast.seconds, forecast.values = readonly(forecast.seconds), readonly(forecast.values)
+        self.entries[key] = (forecast, readonly(production.production))
+        if self.cachepath is not None:
+            os.makedirs(self.cachepath, exist_ok=True)
+            temporary = self._filename(key)+f".{os.getpid()}.tmp"
+            with open(temporary, 'wb') as file: # parallel runs may write the same entry
+                np.savez(file, seconds=forecast.seconds, values=forecast.values, scaling=forecast.scaling, production=production.production)
+            os.replace(temporary, self._filename(key))
+
+_default_cache = ProductionCache()
+
+# returns the process-wide production cache
+def production_cache() -> ProductionCache:
+    return _default_cache
+
+# enable the on-disk cache of the process-wide production cache
+def set_cachepath(cachepath: Optional[str]) -> None:
+    _default_cache.cachepath = cachepath
@@ -0,0 +1,96 @@
+import os
+import csv
+import hashlib
+from datetime import datetime
+from typing import List, Optional
+
+try:
+    import fcntl
+except ImportError: # no file locking on windows, parallel writers need separate result files there
+    fcntl = None
+
+from scheduling_framework.simulation_metrics import MetricsResult
+
+# returns the path of the per-vehicle table next to the site results, e.g. results/result_vehicles.csv
+def vehicle_path(resultpath: str) -> str:
+    root, extension = os.path.splitext(resultpath)
+    return f"{root}_vehicles{extension or '.csv'}"
+
+# returns the path of a result file for rows with other columns, e.g. results/result_1a2b3c4d.csv
+def columns_path(file_path: str, columns: List[str]) -> str:
+    root, extension = os.path.splitext(file_path)
+    return f"{root}_{hashlib.sha1(','.join(columns).encode('utf-8')).hexdigest()[:8]}{extension or '.csv'}"
+
+# buffers result rows and appends them in batches to the site results and the per-vehicle table
+# the files are locked while writing, so several processes can share the same result files
+class ResultSink:
+    def __init__(self, resultpath: str, vehiclepath: Optional[str] = None, batchsize: int = 100, vehicles: bool = True):
+        self.resultpath = resultpath
+        self.vehiclepath = vehiclepath if vehiclepath is not None else vehicle_path(resultpath)
+        self.batchsize = batchsize
+        self.vehicles = vehicles # write the per-vehicle table
+        self.rows: List[dict] = []
+        self.vehicleRows: List[dict] = []
+
+    def __enter__(self) -> "ResultSink":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.flush()
+
+    # add the results of one simulation run, labels (e.g. site or strategy) are prepended to the rows
+    def add(self, metrics: MetricsResult, simulationdate: datetime, peakSolarPower: float, totalVehicles: Optional[int] = None, scheduledVehicles: Optional[int] = None, **labels) -> None:
+        if totalVehicles is None:
+            totalVehicles = len(metrics.vehicles)
+        if scheduledVehicles is None:
+            scheduledVehicles = sum(v.scheduled for v in metrics.vehicles)
+        self.rows.append({**labels, **metrics.exportdata(simulationdate, peakSolarPower, totalVehicles, scheduledVehicles)})
+        if self.vehicles:
+            for v in metrics.vehicles:
+                self.vehicleRows.append({**labels, "simulationdate": simulationdate, "peakSolarPower": peakSolarPower, **v.to_dict()})
+        if len(self.rows)>=self.batchsize:
+            self.flush()
+
+    # append all buffered rows to the result files
+    def flush(self) -> None:
+        if len(self.rows)>0:
+            path = ResultSink._append(self.resultpath, self.rows)
+            print(f"Results written to {path}.")
+            self.rows = []
+        if len(self.vehicleRows)>0:
+            ResultSink._append(self.vehiclepath, self.vehicleRows)
+            self.vehicleRows = []
+
+    # drop the buffered rows, e.g. of a failed run
+    def discard(self) -> None:
+        self.rows = []
+        self.vehicleRows = []
+
+    # append rows to a csv file, the header is written if the file is empty
+    # rows with other columns than the header of the file (e.g. other labels) are appended to a separate file instead
+    # of shifting the columns of the table, returns the path of the written file
+    @staticmethod
+    def _append(file_path: str, rows: List[dict]) -> str:
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        columns = [str(key) for key in rows[0].keys()]
+        with open(file_path, mode="a+", newline="", encoding="utf-8") as file:
+            if fcntl is not None:
+                fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                file.seek(0)
+                header = next(csv.reader(file), None)
+                if header is None:
+                    csv.writer(file).writerow(columns)
+                if header is None or header == columns:
+                    csv.writer(file).writerows(row.values() for row in rows)
+                    file.flush()
+                    return file_path
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(file, fcntl.LOCK_UN)
+
+        otherpath = columns_path(file_path, columns)
+        print(f"Warning: The columns of the results differ from the header of {file_path}, writing them to {otherpath}.")
+        return ResultSink._append(otherpath, rows)
@@ -0,0 +1,174 @@
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from scheduling_framework.vehicle import Vehicle
+from scheduling_framework.consumer_model import Consumer
+
+# charging results of a single vehicle, energies in kWh
+class VehicleMetrics:
+    def __init__(self,
+                 id_user: str,
+                 energy_required: float,
+                 percent_arrive: float,
+                 percent_leave: float,
+                 charge_max: float,
+                 scheduled: bool,
+                 energy_charged: float,
+                 overcharge_energy: float,
+                 soc_charged: float):
+        self.id_user: str = id_user
+        self.energy_required: float = energy_required
+        self.percent_arrive: float = percent_arrive
+        self.percent_leave: float = percent_leave
+        self.charge_max: float = charge_max
+        self.scheduled: bool = scheduled
+        self.energy_charged: float = energy_charged
+        self.overcharge_energy: float = overcharge_energy
+        self.soc_charged: float = soc_charged
+
+        self.energy_missing: float = energy_required-energy_charged
+        self.requirement_missed: bool = scheduled and self.energy_missing>charge_max/60
+
+    def __str__(self) -> str:
+        lines = [f"User ID: {self.id_user}",
+                 f"Energy required: {self.energy_required:.1f} kWh",
+                 f"SoC start: {self.percent_arrive:.0f}%",
+                 f"SoC required: {self.percent_leave:.0f}%"]
+        if(not self.scheduled):
+            lines.append("Vehicle not scheduled.")
+            lines.append(f"Energy charged: 0 kWh")
+        else:
+            lines.append(f"SoC charged: {self.soc_charged*100:.0f}%")
+            lines.append(f"Energy charged: {self.energy_charged:.1f} kWh")
+            lines.append(f"Energy missing: {self.energy_missing:.2f}kWh")
+            lines.append(f"Overpower energy: {self.overcharge_energy:.2f}kWh")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {
+            "id_user": self.id_user,
+            "energy_required": self.energy_required,
+            "percent_arrive": self.percent_arrive,
+            "percent_leave": self.percent_leave,
+            "scheduled": self.scheduled,
+            "energy_charged": self.energy_charged,
+            "overcharge_energy": self.overcharge_energy,
+            "soc_charged": self.soc_charged,
+            "energy_missing": self.energy_missing,
+            "requirement_missed": self.requirement_missed
+        }
+
+# site level results of a simulation, energies in Wh and per-minute power curves in W
+class SiteMetrics:
+    def __init__(self,
+                 production: np.ndarray,
+                 powerUsage: np.ndarray,
+                 overchargePower: np.ndarray,
+                 requiredEnergy: float):
+        self.production: np.ndarray = production
+        self.powerUsage: np.ndarray = powerUsage
+        self.overchargePower: np.ndarray = overchargePower
+
+        surplus = production-powerUsage
+        self.solarUnusedPower: np.ndarray = np.maximum(surplus,0)
+        self.gridPower: np.ndarray = np.maximum(-surplus,0)
+
+        self.requiredEnergy: float = requiredEnergy
+        self.solarEnergy: float = float(production.sum())/60
+        self.consumedEnergy: float = float(powerUsage.sum())/60
+        self.gridEnergy: float = float(self.gridPower.sum())/60
+        self.solarUnused: float = float(self.solarUnusedPower.sum())/60
+
+    # share of the consumed energy drawn from the grid
+    def gridShare(self) -> float:
+        return self.gridEnergy/self.consumedEnergy if self.consumedEnergy!=0 else 0
+
+    # share of the solar energy that was not consumed
+    def unusedShare(self) -> float:
+        return self.solarUnused/self.solarEnergy if self.solarEnergy!=0 else 0
+
+    def __str__(self) -> str:
+        consumed = self.consumedEnergy/1000
+        grid = self.gridEnergy/1000
+        unused = self.solarUnused/1000
+        solar_share = (1-self.gridShare()) if self.consumedEnergy!=0 else 0
+        return (f"Total energy consumed: {consumed:.2f} kWh ({self.gridShare()*100:.0f}% grid, {solar_share*100:.0f}% solar)\n"
+                f"Grid energy used: {grid:.2f} kWh ({self.gridShare()*100:.0f}% from total energy)\n"
+                f"Solar energy unused: {unused:.2f} kWh ({self.unusedShare()*100:.0f}% from total solar energy)")
+
+# typed result of the metrics computation, read by the print, csv and plot paths
+class MetricsResult:
+    def __init__(self, site: SiteMetrics, vehicles: List[VehicleMetrics]):
+        self.site: SiteMetrics = site
+        self.vehicles: List[VehicleMetrics] = vehicles
+        self._by_id: Dict[str, VehicleMetrics] = {v.id_user: v for v in vehicles}
+
+    # returns the metrics of the vehicle with the given ID
+    def vehicle(self, id_user: str) -> Optional[VehicleMetrics]:
+        return self._by_id.get(id_user)
+
+    # returns the IDs of vehicles that missed the required SoC
+    def requirementMissed(self) -> List[str]:
+        return [v.id_user for v in self.vehicles if v.requirement_missed]
+
+    # print the per-vehicle stats to command line
+    def printVehicles(self) -> None:
+        print('\n')
+        for v in self.vehicles:
+            print(v)
+            print("------------------------")
+        requirement_missed = self.requirementMissed()
+        if(len(requirement_missed)==0):
+            print("All vehicles are charged successfully.")
+        else:
+            print(f"Required SoC missed for vehicles: {requirement_missed}")
+
+    # print the site level stats to command line
+    def printSite(self) -> None:
+        print(self.site)
+
+    # returns the row written to the results csv file
+    def exportdata(self, simulationdate: datetime, peakSolarPower: float, totalVehicles: int, scheduledVehicles: int) -> dict:
+        return {
+            "simulationdate" : simulationdate,
+            "peakSolarPower" : peakSolarPower,
+            "totalVehicles" : totalVehicles,
+            "scheduledVehicles" : scheduledVehicles,
+            "requiredEnergy" : self.site.requiredEnergy,
+            "solarEnergy" : self.site.solarEnergy,
+            "consumedEnergy" : self.site.consumedEnergy,
+            "gridEnergy" : self.site.gridEnergy,
+            "solarUnused" : self.site.solarUnused
+        }
+
+# computes all site level and per-vehicle KPIs of a simulation in one pass
+class SimulationMetrics:
+    @staticmethod
+    def compute(production: List[float], powerUsage: List[float], overchargePower: List[float], vehicles: List[Vehicle], consumers: List[Consumer]) -> MetricsResult:
+        production = np.asarray(production, dtype=float)
+        powerUsage = np.asarray(powerUsage, dtype=float)
+        overchargePower = np.asarray(overchargePower, dtype=float)
+        assert(production.shape==powerUsage.shape)
+
+        requiredEnergy = sum(v.energy_required for v in vehicles)*1000
+        site = SiteMetrics(production, powerUsage, overchargePower, requiredEnergy)
+
+        # energy of all power curves, computed from their segments
+        regular = np.array([c.power.getEnergy() for c in consumers])/1000
+        overcharge = np.array([c.overpower.getEnergy() for c in consumers])/1000
+        index = {c.id_user: i for i, c in enumerate(consumers)}
+
+        vehicle_metrics: List[VehicleMetrics] = []
+        for v in vehicles:
+            i = index.get(v.id_user)
+            if i is None:
+                vehicle_metrics.append(VehicleMetrics(v.id_user, v.energy_required, v.percent_arrive, v.percent_leave, v.charge_max,
+                                                      False, 0, 0, v.percent_arrive/100))
+                continue
+            total_energy = regular[i]+overcharge[i]
+            soc_charged = (v.battery_size*v.percent_arrive/100+total_energy)/v.battery_size
+            vehicle_metrics.append(VehicleMetrics(v.id_user, v.energy_required, v.percent_arrive, v.percent_leave, v.charge_max,
+                                                  True, total_energy, overcharge[i], soc_charged))
+
+        return MetricsResult(site, vehicle_metrics)
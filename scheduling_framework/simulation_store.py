@@ -0,0 +1,170 @@
+import os
+import json
+from typing import List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError: # no file locking on windows, concurrent commands need separate stores there
+    fcntl = None
+
+from scheduling_framework.vehicle import Vehicle
+from scheduling_framework.consumer_model import Consumer
+from scheduling_framework.parameters import SimulationParameters
+
+# journal entries after which the journal is compacted into the snapshot
+COMPACTINTERVAL = 64
+
+# returns the path of the journal next to the snapshot, e.g. simulation.json.journal
+def journal_path(storepath: str) -> str:
+    return storepath+".journal"
+
+# returns the entries of the list changed from old to new (by id_user): the new and changed entries, the removed ids
+# and the new order of the ids if applying the changes (replace in place, append new ones) does not result in it
+def list_changes(old: List[dict], new: List[dict]) -> Tuple[List[dict], List[str], Optional[List[str]]]:
+    oldById = {entry["id_user"]: entry for entry in old}
+    newIds = [entry["id_user"] for entry in new]
+    newIdSet = set(newIds)
+    changed = [entry for entry in new if oldById.get(entry["id_user"]) != entry]
+    removed = [id_user for id_user in oldById if id_user not in newIdSet]
+    order = [entry["id_user"] for entry in old if entry["id_user"] in newIdSet]+[entry["id_user"] for entry in new if entry["id_user"] not in oldById]
+    return changed, removed, (newIds if order != newIds else None)
+
+# applies the changes of list_changes to the list
+def apply_changes(entries: List[dict], changed: List[dict], removed: List[str], order: Optional[List[str]]) -> List[dict]:
+    removed = set(removed)
+    entries = [entry for entry in entries if entry["id_user"] not in removed]
+    index = {entry["id_user"]: i for i, entry in enumerate(entries)}
+    for entry in changed:
+        if entry["id_user"] in index:
+            entries[index[entry["id_user"]]] = entry
+        else:
+            index[entry["id_user"]] = len(entries)
+            entries.append(entry)
+    if order is not None:
+        byId = {entry["id_user"]: entry for entry in entries}
+        entries = [byId[id_user] for id_user in order]
+    return entries
+
+# store of the iterative simulation: a snapshot (parameters, vehicles and consumers) and an append-only journal (json lines)
+# of the vehicles and consumers changed by every command since the snapshot, so a command writes only its changes
+# the commands lock the journal from loading to appending (exclusive if they change the store), so concurrent commands,
+# e.g. adds of several chargers, are serialized instead of overwriting each other
+# every compactinterval entries, the journal is compacted into the snapshot, loading replays only the entries after it
+class SimulationStore:
+    def __init__(self, storepath: str, compactinterval: int = COMPACTINTERVAL):
+        self.storepath = storepath
+        self.journalpath = journal_path(storepath)
+        self.compactinterval = compactinterval
+        self.parameters: Optional[dict] = None
+        self.vehicles: List[dict] = [] # state as loaded, the changes of a command are computed against it
+        self.consumers: List[dict] = []
+        self.seq = 0 # sequence number of the last change
+        self.snapshotSeq = 0 # last change contained in the snapshot
+        self.journalSize = 0 # bytes of the complete journal entries
+        self.file = None
+
+    # lock the store, exclusive for commands changing it
+    def lock(self, exclusive: bool = True) -> "SimulationStore":
+        directory = os.path.dirname(self.journalpath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(self.journalpath, 'ab')
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        return self
+
+    def __enter__(self) -> "SimulationStore":
+        return self if self.file is not None else self.lock()
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self.file is not None:
+            if fcntl is not None:
+                fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+
+    # start a new simulation, the journal of the previous one is emptied first
+    def create(self, simulation_parameters: SimulationParameters) -> None:
+        if os.path.exists(self.journalpath):
+            with open(self.journalpath, 'ab') as journal:
+                journal.truncate(0)
+        self.parameters = simulation_parameters.to_dict()
+        self.vehicles, self.consumers = [], []
+        self.seq = 0
+        self.compact()
+
+    # load the snapshot and replay the journal entries after it
+    def load(self) -> Tuple[SimulationParameters, List[Vehicle], List[Consumer]]:
+        with open(self.storepath, 'r', encoding="utf-8") as file:
+            data = json.load(file)
+        self.parameters = data["simulation_parameters"]
+        self.vehicles = data["vehicles"]
+        self.consumers = data["consumers"]
+        self.seq = self.snapshotSeq = data.get("seq", 0)
+
+        self.journalSize = 0
+        if os.path.exists(self.journalpath):
+            with open(self.journalpath, 'rb') as journal:
+                for line in journal:
+                    if not line.endswith(b"\n"): # entry cut off by a crash
+                        break
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    self.journalSize += len(line)
+                    if entry["seq"] > self.seq: # entries up to the snapshot remain after a crash during compaction
+                        self._apply(entry)
+        return SimulationParameters.from_dict(self.parameters), Vehicle.vehicles_from_dict(self.vehicles), Consumer.consumers_from_dict(self.consumers)
+
+    def _apply(self, entry: dict) -> None:
+        self.vehicles = apply_changes(self.vehicles, entry.get("vehicles", []), entry.get("removedVehicles", []), entry.get("vehicleOrder"))
+        self.consumers = apply_changes(self.consumers, entry.get("consumers", []), entry.get("removedConsumers", []), entry.get("consumerOrder"))
+        self.seq = entry["seq"]
+
+    # append the changes of a command to the loaded state to the journal, returns False if nothing changed
+    def append(self, operation: str, vehicles: List[Vehicle], consumers: List[Consumer]) -> bool:
+        entry = {"seq": self.seq+1, "operation": operation}
+        for name, old, new in (("Vehicle", self.vehicles, Vehicle.vehicles_to_dict(vehicles)), ("Consumer", self.consumers, Consumer.consumers_to_dict(consumers))):
+            changed, removed, order = list_changes(old, json.loads(json.dumps(new))) # compared like loaded from json
+            if changed:
+                entry[name.lower()+"s"] = changed
+            if removed:
+                entry[f"removed{name}s"] = removed
+            if order is not None:
+                entry[f"{name.lower()}Order"] = order
+        if len(entry) == 2:
+            return False
+
+        line = (json.dumps(entry)+"\n").encode("utf-8")
+        with open(self.journalpath, 'ab') as journal:
+            journal.truncate(self.journalSize) # drop an entry cut off by a crash
+            journal.write(line)
+            journal.flush()
+            os.fsync(journal.fileno())
+        self.journalSize += len(line)
+        self._apply(entry)
+
+        if self.seq-self.snapshotSeq >= self.compactinterval:
+            self.compact()
+        return True
+
+    # write the loaded state as snapshot (replacing it atomically) and empty the journal
+    def compact(self) -> None:
+        data = {"simulation_parameters": self.parameters,
+                "vehicles": self.vehicles,
+                "consumers": self.consumers,
+                "seq": self.seq}
+        temporary = self.storepath+".tmp"
+        with open(temporary, 'w', encoding="utf-8") as file:
+            json.dump(data, file, indent=4)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.storepath)
+        with open(self.journalpath, 'ab') as journal:
+            journal.truncate(0)
+        self.snapshotSeq = self.seq
+        self.journalSize = 0
@@ -0,0 +1,125 @@
+import os
+import json
+import hashlib
+import datetime
+import numpy as np
+from scipy.optimize import curve_fit
+from typing import Dict, Optional, Tuple
+
+# sin² model of the daily solar production
+def sin2(x, a, b, c):
+    return a * np.sin(np.pi*(x-c-1/b/2)*b) * np.sin(np.pi*(x-c-1/b/2)*b)
+
+# gauss model of the daily solar production
+def gauss(x, a, mu, sigma):
+    return a * np.exp(-(x - mu)**2 / (2 * sigma**2))
+
+MODELS = {
+    "sin2": sin2,
+    "gauss": gauss
+}
+
+# fitted parameters of a solar production model for one day
+class SolarFit:
+    def __init__(self, model: str, params: Tuple[float, ...], start: float, end: float):
+        if model not in MODELS:
+            raise ValueError(f"Unknown solar model {model}. Available models: {list(MODELS)}")
+        self.model = model
+        self.params = tuple(float(p) for p in params)
+        self.start = start # epoch seconds of the fitted daylight period
+        self.end = end
+
+    # returns the modeled power at the given epoch seconds, zero outside of the fitted period
+    def evaluate(self, seconds: np.ndarray) -> np.ndarray:
+        seconds = np.asarray(seconds, dtype=float)
+        inside = (seconds>=self.start) & (seconds<=self.end)
+        power = np.zeros(len(seconds))
+        power[inside] = MODELS[self.model](seconds[inside], *self.params)
+        return power
+
+    def to_dict(self):
+        return {
+            "model": self.model,
+            "params": list(self.params),
+            "start": self.start,
+            "end": self.end
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> "SolarFit":
+        return SolarFit(data["model"], tuple(data["params"]), data["start"], data["end"])
+
+# fit the model to the daily forecast using least squares
+def fit_forecast(forecast, simulationdate: datetime.datetime, model: str = "sin2") -> Optional[SolarFit]:
+    guesstime = datetime.datetime(simulationdate.year,simulationdate.month,simulationdate.day,hour=12)
+    dailyforecast = forecast.getDailyForecast(guesstime)
+
+    day_time = dailyforecast.seconds
+    day_values = dailyforecast.values
+    nonzero = np.flatnonzero(day_values)
+    if(len(nonzero)==0):
+        return None
+
+    # extend time for 15 Minutes
+    startTimeIndex = max(nonzero[0]-1, 0)
+    endTimeIndex = min(nonzero[-1]+2, len(day_time))
+    day_time = day_time[startTimeIndex:endTimeIndex]
+    day_values = day_values[startTimeIndex:endTimeIndex]
+
+    max_value = np.max(day_values)
+    if(model=="sin2"):
+        initial_guess = [max_value, 1/(60*60*10), guesstime.timestamp()]
+    else:
+        initial_guess = [max_value, guesstime.timestamp(), 10000] # Initial guess for [a, mu, sigma]
+
+    params, covariance = curve_fit(MODELS[model],
+                                   day_time,
+                                   day_values,
+                                   p0=initial_guess,
+                                   bounds = (0, [np.inf, np.inf, np.inf]))
+    return SolarFit(model, tuple(params), float(day_time[0]), float(day_time[-1]))
+
+# identifies the (scaled) forecast of the day by its content, the fit depends on nothing else
+def daily_fingerprint(forecast, simulationdate: datetime.datetime) -> str:
+    dailyforecast = forecast.getDailyForecast(datetime.datetime(simulationdate.year,simulationdate.month,simulationdate.day,hour=12))
+    return hashlib.sha1(dailyforecast.seconds.tobytes()+dailyforecast.values.tobytes()).hexdigest()
+
+# cache of fitted models per (model, date, daily forecast), in memory and optionally on disk
+class FitCache:
+    def __init__(self, cachepath: Optional[str] = None):
+        self.cachepath = cachepath
+        self.fits: Dict[Tuple[str, str, str], Optional[SolarFit]] = {}
+
+    def _filename(self, key: Tuple[str, str, str]) -> str:
+        model, date, fingerprint = key
+        return os.path.join(self.cachepath, f"{model}_{date}_{fingerprint[:16]}.json")
+
+    # returns the fitted model of the forecast, fitting only if neither memory nor disk contain it
+    def get(self, forecast, simulationdate: datetime.datetime, model: str = "sin2") -> Optional[SolarFit]:
+        key = (model, simulationdate.strftime("%Y-%m-%d"), daily_fingerprint(forecast, simulationdate))
+        if key in self.fits:
+            return self.fits[key]
+
+        if self.cachepath is not None and os.path.exists(self._filename(key)):
+            with open(self._filename(key), 'r') as file:
+                data = json.load(file)
+            fit = SolarFit.from_dict(data) if data is not None else None
+        else:
+            fit = fit_forecast(forecast, simulationdate, model)
+            if self.cachepath is not None:
+                os.makedirs(self.cachepath, exist_ok=True)
+                with open(self._filename(key), 'w') as file:
+                    json.dump(fit.to_dict() if fit is not None else None, file)
+
+        self.fits[key] = fit
+        return fit
+
+_default_cache = FitCache()
+
+# returns the process-wide fit cache
+def fit_cache() -> FitCache:
+    return _default_cache
+
+# enable the on-disk cache of the process-wide fit cache
+def set_cachepath(cachepath: Optional[str]) -> None:
+    _default_cache.cachepath = cachepath
@@ -0,0 +1,133 @@
+import os
+import sys
+import json
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError: # no file locking on windows, parallel writers need separate stores there
+    fcntl = None
+
+from scheduling_framework.simulation_metrics import MetricsResult
+
+CHANNELS = ("production", "powerUsage", "overchargePower", "gridPower", "solarUnusedPower")
+MINUTES = 24*60
+
+# append-only store of the per-minute curves of simulation runs (runs x channels x minutes, float32)
+# the curves are appended to a raw cube file, the run metadata to an index with one json line per run
+# a small header holds the number of runs and the size of their index lines, so appending and counting runs never read the index
+# a run is complete once the header counts it, so a run cut off by a crash is overwritten by the next append
+class TimeseriesStore:
+    def __init__(self, path: str):
+        self.path = path # directory of the store
+        self.cubepath = os.path.join(path, "cube.f32")
+        self.indexpath = os.path.join(path, "index.jsonl")
+        self.headerpath = os.path.join(path, "header.json")
+        self.runsize = len(CHANNELS)*MINUTES*4 # bytes per run
+
+    # append the curves of one run, returns the run number
+    def append(self, metrics: MetricsResult, metadata: Optional[dict] = None) -> int:
+        site = metrics.site
+        data = np.zeros((len(CHANNELS), MINUTES), dtype=np.float32)
+        for i, channel in enumerate(CHANNELS):
+            values = np.asarray(getattr(site, channel), dtype=np.float32)[:MINUTES]
+            data[i, :len(values)] = values
+
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.cubepath, mode="ab") as cube:
+            if fcntl is not None:
+                fcntl.flock(cube, fcntl.LOCK_EX)
+            try:
+                run, size = self._readHeader()
+                cube.truncate(run*self.runsize) # drop a run not counted by the header
+                cube.write(data.tobytes())
+                cube.flush()
+                os.fsync(cube.fileno())
+                line = (json.dumps({"run": run, **(metadata or {})}, default=str)+"\n").encode("utf-8")
+                with open(self.indexpath, mode="ab") as index:
+                    index.truncate(size) # drop an index line not counted by the header
+                    index.write(line)
+                    index.flush()
+                    os.fsync(index.fileno())
+                self._writeHeader(run+1, size+len(line))
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(cube, fcntl.LOCK_UN)
+        return run
+
+    # returns the number of complete runs and the size of their index lines in bytes
+    # stores written without header are counted once from their index
+    def _readHeader(self) -> Tuple[int, int]:
+        try:
+            with open(self.headerpath, 'r') as file:
+                header = json.load(file)
+            return header["runs"], header["indexsize"]
+        except FileNotFoundError:
+            entries, size = self._readIndex()
+            return len(entries), size
+
+    # replace the header at once, so a crash leaves the old or the new header
+    def _writeHeader(self, runs: int, indexsize: int) -> None:
+        temppath = self.headerpath+".tmp"
+        with open(temppath, 'w') as file:
+            json.dump({"runs": runs, "indexsize": indexsize}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temppath, self.headerpath)
+
+    # returns the complete index lines (at most the given size in bytes) and their size in bytes
+    def _readIndex(self, limit: Optional[int] = None) -> Tuple[List[dict], int]:
+        if not os.path.exists(self.indexpath):
+            return [], 0
+        entries = []
+        size = 0
+        with open(self.indexpath, 'rb') as file:
+            for line in file:
+                if not line.endswith(b"\n") or (limit is not None and size+len(line)>limit): # line cut off by a crash
+                    break
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+                size += len(line)
+        return entries, size
+
+    # returns the metadata of all complete runs
+    def index(self) -> List[dict]:
+        runs, size = self._readHeader()
+        return self._readIndex(size)[0][:runs]
+
+    def __len__(self) -> int:
+        return self._readHeader()[0]
+
+    # returns the memory mapped cube of all complete runs (read only)
+    def cube(self) -> np.ndarray:
+        runs = len(self)
+        if(runs==0):
+            return np.zeros((0, len(CHANNELS), MINUTES), dtype=np.float32)
+        return np.memmap(self.cubepath, dtype=np.float32, mode="r", shape=(runs, len(CHANNELS), MINUTES))
+
+    # returns the curves of one channel of all runs (runs x minutes)
+    def channel(self, name: str) -> np.ndarray:
+        if name not in CHANNELS:
+            raise ValueError(f"Unknown channel {name}. Available channels: {list(CHANNELS)}")
+        return self.cube()[:, CHANNELS.index(name), :]
+
+    # returns the numbers of the runs whose metadata matches all given values
+    def select(self, **metadata) -> List[int]:
+        return [entry["run"] for entry in self.index() if all(entry.get(k) == v for k, v in metadata.items())]
+
+    # returns the energy in kWh of every channel summed over all runs, computed in chunks of runs
+    def energies(self, chunk: int = 1024) -> Dict[str, float]:
+        cube = self.cube()
+        totals = np.zeros(len(CHANNELS))
+        for start in range(0, len(cube), chunk):
+            totals += cube[start:start+chunk].sum(axis=(0, 2), dtype=np.float64)
+        return {channel: float(total)/60/1000 for channel, total in zip(CHANNELS, totals)}
+
+if __name__ == "__main__":
+    store = TimeseriesStore(sys.argv[1] if len(sys.argv)>1 else "results/timeseries")
+    print(f"{len(store)} runs in {store.path}")
+    for channel, energy in store.energies().items():
+        print(f"{channel:<20}{energy:>14.2f} kWh")
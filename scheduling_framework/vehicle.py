@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import List
 
 # the Vehicle class defines the BEV parameters
 class Vehicle:
@@ -51,48 +51,6 @@ class Vehicle:
     def sort_vehicles_by_energy(vehicles: List["Vehicle"]) -> List["Vehicle"]:
         return sorted(vehicles, reverse=True, key=lambda vehicle: vehicle.energy_required)
 
-    # creates vehicles from dictionary
-    def create_vehicles(data: Optional[List[dict]], simulationdate: datetime) -> List["Vehicle"]:
-        vehicles: List[Vehicle] = []
-        if data:
-            for entry in data:
-                time_arrive: datetime = datetime(simulationdate.year,
-                                                        simulationdate.month,
-                                                        simulationdate.day,
-                                                        int(entry['time_arrive'][:2]),
-                                                        int(entry['time_arrive'][3:]))
-                time_leave: datetime = datetime(simulationdate.year,
-                                                        simulationdate.month,
-                                                        simulationdate.day,
-                                                        int(entry['time_leave'][:2]),
-                                                        int(entry['time_leave'][3:]))
-                
-                id_user=str(entry['id_user'])# +"_"+entry['time_arrive'][:2]+entry['time_arrive'][3:] # make user id unique by extending the id by the the arrive time
-                percent_arrive=entry['percent_arrive']
-                percent_leave=entry['percent_leave']
-                battery_size=entry['battery_size']
-                charge_max=entry['charge_max']
-                required_energy = (percent_leave-percent_arrive)/100*battery_size # in kWh
-                parking_time = int((time_leave-time_arrive).total_seconds())/60 # in minutes
-
-                max_possible_energy = parking_time/60*charge_max
-                if(max_possible_energy<required_energy): # check if the desired SoC can possibly be reached bevore leaving
-                    percent_leave_old = percent_leave
-                    percent_leave = max_possible_energy*100/battery_size+percent_arrive # recalculate SoC_leave so that the vehicle can be charged within parking time
-                    print(f"Warning: Vehicle with ID {id_user} cannot be charged {required_energy:.2f} kWh ({int(percent_leave_old)}%) within {int(parking_time)} minutes. At most {max_possible_energy:.2f} kWh ({int(percent_leave)}%) are possible.")
-            
-                vehicle = Vehicle(
-                    id_user=id_user,
-                    time_arrive=time_arrive,
-                    time_leave=time_leave,
-                    percent_arrive=percent_arrive,
-                    percent_leave=percent_leave,
-                    battery_size=battery_size,
-                    charge_max=charge_max
-                )
-                vehicles.append(vehicle)
-        return vehicles
-    
     # returns a list of vehicles arriving at the given timestamp 
     def vehicles_arriving(vehicles: List["Vehicle"],time: datetime) -> List["Vehicle"]:
         return [v for v in vehicles if v.time_arrive==time]
@@ -0,0 +1,33 @@
+import numpy as np
+
+# returns the water level at which filling the valleys of the net load up to the per-minute limit takes the given energy
+# the filled energy sum(clip(level-netload, 0, limit)) is piecewise linear in the level with breakpoints at netload and
+# netload+limit, so it is evaluated at all breakpoints from sorted prefix sums: O(n log n)
+def water_level(netload: np.ndarray, limit: np.ndarray, energy: float) -> float:
+    lower = np.sort(netload)
+    upper = np.sort(netload+limit)
+    lowersum = np.concatenate(([0.0], np.cumsum(lower)))
+    uppersum = np.concatenate(([0.0], np.cumsum(upper)))
+
+    levels = np.unique(np.concatenate((lower, upper)))
+    below = np.searchsorted(lower, levels) # minutes filled above their net load
+    full = np.searchsorted(upper, levels) # minutes filled up to their limit
+    filled = below*levels-lowersum[below]-(full*levels-uppersum[full])
+
+    j = int(np.searchsorted(filled, energy))
+    if j==0:
+        return float(levels[0])
+    if j>=len(levels):
+        return float(levels[-1])
+    return float(levels[j-1]+(energy-filled[j-1])*(levels[j]-levels[j-1])/(filled[j]-filled[j-1]))
+
+# returns the power per minute filling the energy (in W·min) into the valleys of the net load, at most limit per minute
+# if the energy exceeds the limits, every minute is filled up to its limit
+def water_fill(netload: np.ndarray, limit: np.ndarray, energy: float) -> np.ndarray:
+    netload = np.asarray(netload, dtype=float)
+    limit = np.maximum(np.asarray(limit, dtype=float), 0)
+    if energy<=0 or len(netload)==0:
+        return np.zeros(len(netload))
+    if limit.sum()<=energy:
+        return limit
+    return np.clip(water_level(netload, limit, energy)-netload, 0, limit)
@@ -1,51 +1,86 @@
 import argparse
-import json
 import numpy as np
 import matplotlib.pyplot as plt
-import csv
-import os
+import copy
 from datetime import timedelta, datetime
-from typing import List
+from typing import List, Optional, Tuple
 
 import scheduling_framework.energy_charts_api as energy_charts_api
 from scheduling_framework.vehicle import Vehicle, add_vehicle
 from scheduling_framework.forecast_power import Forecast
-from scheduling_framework.renewable_production import Production
+from scheduling_framework.renewable_production import Production, FittedProduction, forecast_fingerprint
+import scheduling_framework.renewable_production as renewable_production
+import scheduling_framework.solar_fit as solar_fit
+import scheduling_framework.clear_sky as clear_sky
 from scheduling_framework.consumer_model import Consumer, ConsumerPlot
-from scheduling_framework.dynamic_scheduling import SchedulingParameters, dynamic_scheduling, no_strategy, overcharge_scheduling
+from scheduling_framework.dynamic_scheduling import SchedulingParameters, STRATEGIES, apply_strategy, overcharge_scheduling
+from scheduling_framework.local_search import improve_schedule
 from scheduling_framework.parameters import SimulationParameters
+from scheduling_framework.simulation_metrics import MetricsResult, SimulationMetrics
+from scheduling_framework.headless_plot import RenderJob, render
+from scheduling_framework.result_sink import ResultSink
+from scheduling_framework.decision_trace import TraceRecorder
+from scheduling_framework.simulation_store import SimulationStore
+from scheduling_framework.memory_profile import MemoryProfiler, MemoryBudgetExceeded
 
 # ---------------- functions ---------------- #
 
-# write generic data to csv file
-def csv_write(file_path: str, data) -> None:
-    with open(file_path, mode="a", newline="", encoding="utf-8") as file:
-        writer = csv.writer(file)
-        writer.writerow(data)
-    print(f"Results written to {file_path}.")
-
-# generate json file containing all simulation information
-def generate_json(filename: str, simulation_parameters: SimulationParameters, vehicles: List[Vehicle], consumers: List[Consumer]):
-    dict_data = {"simulation_parameters": simulation_parameters.to_dict(),
-                 "vehicles": Vehicle.vehicles_to_dict(vehicles),
-                 "consumers": Consumer.consumers_to_dict(consumers)
-                }
-
-    with open(filename, 'w') as file:
-        json.dump(dict_data, file, indent=4)
-
-# load the json file containing all simulation information
-def load_json(filename: str):
-    with open(filename, "r") as file:
-        data = json.load(file)
-        
-        # Deserialize each object
-        simulation_parameters = SimulationParameters.from_dict(data["simulation_parameters"])
-        vehicles = Vehicle.vehicles_from_dict(data["vehicles"])
-        consumers = Consumer.consumers_from_dict(data["consumers"])
-        
-        return simulation_parameters, vehicles, consumers
-    
+# fetch the forecast around the simulation date from the energy-charts API or generate it offline from the clear-sky model
+# the clear-sky forecast peaks at peakPowerForecast, so it is scaled to the plant like the API forecast
+# refresh: request the API again for an updated forecast instead of using a fetched range
+def fetch_forecast(simulation_parameters: SimulationParameters, refresh: bool = False) -> Forecast:
+    if(simulation_parameters.forecastsource == "clearsky"):
+        print("# Generating clear-sky forecast...")
+        simulationdate = simulation_parameters.simulationdate.date()
+        return clear_sky.clear_sky_forecast(simulationdate-timedelta(days=1),
+                                            simulationdate+timedelta(days=1),
+                                            simulation_parameters.peakPowerForecast,
+                                            simulation_parameters.latitude,
+                                            simulation_parameters.longitude,
+                                            simulation_parameters.cloudiness)
+    print("# Making forecast API request...")
+    return energy_charts_api.api_request(simulation_parameters.forecastapi, refresh)
+
+# identifies the forecast fetched for the simulation date: the API request or the clear-sky model of the site
+def forecast_source(simulation_parameters: SimulationParameters) -> str:
+    if(simulation_parameters.forecastsource == "clearsky"):
+        return f"clearsky:{simulation_parameters.latitude}:{simulation_parameters.longitude}:{simulation_parameters.cloudiness}:{simulation_parameters.peakPowerForecast}"
+    return simulation_parameters.forecastapi
+
+# fetch (if not given) and scale the forecast, then build the solar production of the simulation date
+# built productions are cached per date, scale, smoothing, production model and forecast, so repeated runs of a day
+# (e.g. several fleets) neither fetch the forecast nor build the production again
+def solar_production(simulation_parameters: SimulationParameters, forecast: Optional[Forecast] = None) -> Tuple[Forecast, Production]:
+    simulationdate = simulation_parameters.simulationdate
+    scaling = simulation_parameters.peakSolarPower/simulation_parameters.peakPowerForecast
+    if(forecast is None):
+        source = forecast_source(simulation_parameters)
+    else:
+        source = forecast_fingerprint(forecast)
+        scaling = scaling*forecast.scaling
+    key = (simulationdate.strftime("%Y-%m-%d"), scaling, simulation_parameters.smoothForecast, simulation_parameters.productionmodel, source)
+
+    cache = renewable_production.production_cache()
+    renewable_production.set_cachepath(simulation_parameters.productioncachepath)
+    solar_fit.set_cachepath(simulation_parameters.fitcachepath) # also used by the fit of the visualization
+    cached = cache.get(key)
+    if(cached is not None):
+        return cached
+
+    if(forecast is None):
+        forecast = fetch_forecast(simulation_parameters)
+    else:
+        forecast = copy.deepcopy(forecast) # scaling modifies the forecast
+    forecast.scale(simulation_parameters.peakSolarPower, simulation_parameters.peakPowerForecast)
+
+    if(simulation_parameters.productionmodel == "forecast"):
+        production = Production(forecast, simulationdate, smooth=simulation_parameters.smoothForecast)
+    else:
+        fit = solar_fit.fit_cache().get(forecast, simulationdate, simulation_parameters.productionmodel)
+        production = FittedProduction(fit, simulationdate)
+    cache.put(key, forecast, production)
+    return forecast, production
+
 # generate a one-minute step time vector for the duration of 1 day
 def generate_time_vector(date: datetime):
     vector = []
@@ -57,23 +92,131 @@ def generate_time_vector(date: datetime):
 
 # return the total power usage of all consumers
 def total_power_usage(simulationdate: datetime, consumers: List[Consumer]):
-    powerUsage = [0.0]*24*60
+    powerUsage = np.zeros(24*60)
     for c in consumers:
         power_start_index =int((c.power.interval.time_start.timestamp()-simulationdate.timestamp())/60)
-        powerUsage = np.add(powerUsage,[0]*(power_start_index)+c.power.power+[0]*(24*60-power_start_index-len(c.power.power)))
+        c.power.addTo(powerUsage, power_start_index)
     return powerUsage
 
 # return the power from overcharging of all consumers
 def overcharge_power(simulationdate: datetime, consumers: List[Consumer]):
-    overchargePower = [0.0]*24*60
+    overchargePower = np.zeros(24*60)
     for c in consumers:
         if c.overpower.interval is not None:
             power_start_index =int((c.overpower.interval.time_start.timestamp()-simulationdate.timestamp())/60)
-            overchargePower = np.add(overchargePower,[0]*(power_start_index)+c.overpower.power+[0]*(24*60-power_start_index-len(c.overpower.power)))
+            c.overpower.addTo(overchargePower, power_start_index)
     return overchargePower
 
+# reschedule arriving vehicles together with all unstarted consumers at time t
+# the decisions are recorded if a trace recorder is passed
+def reschedule(simulation_parameters: SimulationParameters, solarProduction: Production, vehicles: List[Vehicle], consumers: List[Consumer], arriving_vehicles: List[Vehicle], t: datetime, overchargePower: List[float], trace: Optional[TraceRecorder] = None):
+    simulationdate = datetime(t.year,t.month,t.day)
+
+    schedule_vehicles = arriving_vehicles[:]
+    consumer_ids = Consumer.unstarted_consumers(consumers,t)
+    unstarted_vehicles = [v for v in vehicles if v.id_user in consumer_ids]
+    for c in consumers[:]:  # Remove consumers that will be rescheduled
+        if c.id_user in consumer_ids:
+            consumers.remove(c)
+    schedule_vehicles.extend(unstarted_vehicles) # reschedule unstarted consumers
+    print(f"{t}: "+"Schedule vehicles: "+str([v.id_user for v in schedule_vehicles]))
+
+    # remove overcharging after time t
+    for c in consumers:
+        if c.overpower.interval is not None:
+            if c.overpower.interval.timeInInterval(t):
+                index_in_interval = int((t.timestamp()-c.overpower.interval.time_start.timestamp())/60)
+                c.overpower.interval.time_end = t #-timedelta(minutes=1)
+                c.overpower.truncate(index_in_interval)
+
+    powerUsage = total_power_usage(simulationdate, consumers)
+    renewable_power = Production.renewable_available(solarProduction.production,powerUsage)
+    
+    added_consumers = apply_strategy(simulation_parameters.scheduling, schedule_vehicles, t, renewable_power, powerUsage)
+    if(simulation_parameters.scheduling.improvetime>0):
+        added_consumers = improve_schedule(added_consumers, schedule_vehicles, t, renewable_power, simulation_parameters.scheduling.improvetime, baseload=powerUsage, powercap=simulation_parameters.scheduling.powercap)
+
+    consumers.extend(added_consumers)
+
+    powerUsage = total_power_usage(simulationdate, consumers)
+
+    ##### overcharging logic #####
+    if(simulation_parameters.scheduling.overcharge):
+        number_scheduled, consumers, overchargePower = overcharge_scheduling(consumers,vehicles,solarProduction,powerUsage,t,simulation_parameters.scheduling.powercap)
+
+    if(trace is not None):
+        trace.schedule(t, [v.id_user for v in arriving_vehicles], consumer_ids, added_consumers, consumers)
+
+    powerUsage = list(np.add(powerUsage,overchargePower))
+    return consumers, powerUsage, overchargePower
+
+# build the solar production of an updated (unscaled) forecast at time t
+# returns the forecast, the production and the minutes from t on whose production changed
+def update_production(simulation_parameters: SimulationParameters, solarProduction: Production, forecast: Forecast, t: datetime) -> Tuple[Forecast, Production, np.ndarray]:
+    forecast, production = solar_production(simulation_parameters, forecast)
+    changed = production.changed_minutes(solarProduction, int((t-solarProduction.day).total_seconds()/60))
+    print(f"{t}: Forecast update changes the solar production of {len(changed)} minutes.")
+    return forecast, production, changed
+
+# replan at time t after the solar production changed in the given minutes of the day, the rest of the plan is kept:
+# only the unstarted consumers whose remaining parking time overlaps the changed minutes are rescheduled, and only
+# the overcharging of consumers whose overcharge window (charging end to departure) overlaps the changed minutes or
+# the moved charging processes is scheduled again, so the work grows with the size of the change
+def replan(simulation_parameters: SimulationParameters, solarProduction: Production, vehicles: List[Vehicle], consumers: List[Consumer], changed: np.ndarray, t: datetime, overchargePower: List[float], trace: Optional[TraceRecorder] = None):
+    simulationdate = datetime(t.year,t.month,t.day)
+    affected = np.zeros(24*60, dtype=bool)
+    affected[changed] = True
+
+    # minutes of the day from begin to end
+    def window(begin: datetime, end: datetime) -> slice:
+        return slice(max(int((begin-simulationdate).total_seconds()/60), 0), max(min(int((end-simulationdate).total_seconds()/60), 24*60), 0))
+
+    vehicles_by_id = {v.id_user: v for v in vehicles}
+    consumer_ids = set(Consumer.unstarted_consumers(consumers,t))
+    replanned = [c for c in consumers if c.id_user in consumer_ids and affected[window(max(t, vehicles_by_id[c.id_user].time_arrive), vehicles_by_id[c.id_user].time_leave)].any()]
+    for c in replanned: # remove the consumers that will be rescheduled, their charging power is free again
+        consumers.remove(c)
+        affected[window(c.power.interval.time_start, c.power.interval.time_end)] = True
+    schedule_vehicles = [vehicles_by_id[c.id_user] for c in replanned]
+    print(f"{t}: "+"Replan vehicles: "+str([v.id_user for v in schedule_vehicles]))
+
+    # remove running overcharging after time t if it overlaps the changed minutes
+    for c in consumers:
+        if c.overpower.interval is not None and c.overpower.interval.timeInInterval(t) and affected[window(t, c.overpower.interval.time_end)].any():
+            affected[window(t, c.overpower.interval.time_end)] = True
+            index_in_interval = int((t.timestamp()-c.overpower.interval.time_start.timestamp())/60)
+            c.overpower.interval.time_end = t
+            c.overpower.truncate(index_in_interval)
+
+    powerUsage = total_power_usage(simulationdate, consumers)
+    added_consumers: List[Consumer] = []
+    if(len(schedule_vehicles)>0):
+        renewable_power = Production.renewable_available(solarProduction.production,powerUsage)
+        added_consumers = apply_strategy(simulation_parameters.scheduling, schedule_vehicles, t, renewable_power, powerUsage)
+        if(simulation_parameters.scheduling.improvetime>0):
+            added_consumers = improve_schedule(added_consumers, schedule_vehicles, t, renewable_power, simulation_parameters.scheduling.improvetime, baseload=powerUsage, powercap=simulation_parameters.scheduling.powercap)
+        for c in added_consumers:
+            affected[window(c.power.interval.time_start, c.power.interval.time_end)] = True
+        consumers.extend(added_consumers)
+        powerUsage = total_power_usage(simulationdate, consumers)
+
+    ##### overcharging logic #####
+    overcharged = set()
+    if(simulation_parameters.scheduling.overcharge):
+        overcharged = {c.id_user for c in consumers if c.id_user in vehicles_by_id and affected[window(max(t, c.power.interval.time_end), vehicles_by_id[c.id_user].time_leave)].any()}
+        if(len(overcharged)>0):
+            number_scheduled, consumers, overchargePower = overcharge_scheduling(consumers,vehicles,solarProduction,powerUsage,t,simulation_parameters.scheduling.powercap,overcharged)
+
+    if(trace is not None):
+        trace.forecast(t, solarProduction.production)
+        if(len(replanned)>0 or len(overcharged)>0):
+            trace.schedule(t, [], [c.id_user for c in replanned], added_consumers, consumers)
+
+    powerUsage = list(np.add(powerUsage,overchargePower))
+    return consumers, powerUsage, overchargePower
+
 # plot power curves and scheduling graph
-def visualize_results(consumers: List[Consumer], solarProduction: Production, forecast: Forecast, simulation_parameters: SimulationParameters, powerUsage: List[float], overchargePower: List[float]):
+def visualize_results(consumers: List[Consumer], solarProduction: Production, forecast: Forecast, simulation_parameters: SimulationParameters, metrics: MetricsResult):
     print("# Visualizing results...")
     simulationdate = simulation_parameters.simulationdate
     #plt.figure(figsize=(10, 6))
@@ -98,12 +241,13 @@ def visualize_results(consumers: List[Consumer], solarProduction: Production, fo
     forecast.visualizeSin2(ax1,simulationdate)
 
     time_vector: datetime = generate_time_vector(simulationdate)
+    powerUsage = metrics.site.powerUsage
     
     ax1.step(time_vector, powerUsage, where='post', marker='', linestyle='-', color='black', label="total consumed power")
     ax2.step(time_vector, powerUsage, where='post', marker='', linestyle='-', color='black', label="total consumed power")
-    ax2.step(time_vector, overchargePower, where='post', marker='', linestyle='-.', color='lime', label="overcharge power")
-    ax2.step(time_vector,[max(solarProduction.production[i]-powerUsage[i],0) for i in range(len(powerUsage))], where='post', linestyle=':', label="remaining solar power")
-    ax2.step(time_vector,[max(-(solarProduction.production[i]-powerUsage[i]),0) for i in range(len(powerUsage))], color='r', where='post', label="power drawn from grid")
+    ax2.step(time_vector, metrics.site.overchargePower, where='post', marker='', linestyle='-.', color='lime', label="overcharge power")
+    ax2.step(time_vector, metrics.site.solarUnusedPower, where='post', linestyle=':', label="remaining solar power")
+    ax2.step(time_vector, metrics.site.gridPower, color='r', where='post', label="power drawn from grid")
     
     if(len(consumers)>0):
         consumerPlot: ConsumerPlot = ConsumerPlot(consumers)
@@ -124,6 +268,15 @@ def visualize_results(consumers: List[Consumer], solarProduction: Production, fo
     plt.savefig('./results/output.svg')
     plt.show()
 
+# returns the job rendering the scheduling graph to the plot path
+def render_job(consumers: List[Consumer], forecast: Forecast, simulation_parameters: SimulationParameters, metrics: MetricsResult) -> RenderJob:
+    simulationdate = simulation_parameters.simulationdate
+    return RenderJob.from_results(simulation_parameters.plotpath, simulationdate, simulation_parameters.peakSolarPower, consumers, metrics, forecast.getDailyPeak(simulationdate))
+
+# render the scheduling graph headless to the plot path
+def render_results(consumers: List[Consumer], forecast: Forecast, simulation_parameters: SimulationParameters, metrics: MetricsResult):
+    print(f"Plot written to {render(render_job(consumers, forecast, simulation_parameters, metrics))}.")
+
 # create a new simulation 
 def create(simulation_parameters: SimulationParameters):
     return [], []
@@ -141,10 +294,7 @@ def add(simulation_parameters: SimulationParameters, vehicles: List[Vehicle], ve
 def schedule(simulation_parameters: SimulationParameters, vehicles: List[Vehicle], consumers: List[Consumer]):
     simulationdate = simulation_parameters.simulationdate
 
-    print("# Making forecast API request...")
-    forecast: Forecast = energy_charts_api.api_request(simulation_parameters.forecastapi)
-    forecast.scale(simulation_parameters.peakSolarPower, simulation_parameters.peakPowerForecast)
-    solarProduction = Production(forecast, simulationdate, smooth=simulation_parameters.smoothForecast) 
+    forecast, solarProduction = solar_production(simulation_parameters)
 
     if(solarProduction.getEnergy()==0):
         print("Warning: No solar production for requested date!")
@@ -200,12 +350,14 @@ def schedule(simulation_parameters: SimulationParameters, vehicles: List[Vehicle
                 if c.overpower.interval.timeInInterval(t):
                     index_in_interval = int((t.timestamp()-c.overpower.interval.time_start.timestamp())/60)
                     c.overpower.interval.time_end = t #-timedelta(minutes=1)
-                    c.overpower.power = c.overpower.power[0:index_in_interval]
+                    c.overpower.truncate(index_in_interval)
 
         powerUsage = total_power_usage(simulationdate, consumers)
         renewable_power = Production.renewable_available(solarProduction.production,powerUsage)
         
-        added_consumers = dynamic_scheduling(simulation_parameters.scheduling, schedule_vehicles, t, renewable_power)
+        added_consumers = apply_strategy(simulation_parameters.scheduling, schedule_vehicles, t, renewable_power, powerUsage)
+        if(simulation_parameters.scheduling.improvetime>0):
+            added_consumers = improve_schedule(added_consumers, schedule_vehicles, t, renewable_power, simulation_parameters.scheduling.improvetime, baseload=powerUsage, powercap=simulation_parameters.scheduling.powercap)
    
         consumers.extend(added_consumers)
 
@@ -217,10 +369,7 @@ def schedule(simulation_parameters: SimulationParameters, vehicles: List[Vehicle
 def visualize(simulation_parameters: SimulationParameters, vehicles: List[Vehicle], consumers: List[Consumer]):
     simulationdate = simulation_parameters.simulationdate
 
-    print("# Making forecast API request...")
-    forecast: Forecast = energy_charts_api.api_request(simulation_parameters.forecastapi)
-    forecast.scale(simulation_parameters.peakSolarPower, simulation_parameters.peakPowerForecast)
-    solarProduction = Production(forecast, simulationdate, smooth=simulation_parameters.smoothForecast) 
+    forecast, solarProduction = solar_production(simulation_parameters)
 
     print("Starting information:")
     required_energy = sum([v.energy_required for v in vehicles])
@@ -233,22 +382,18 @@ def visualize(simulation_parameters: SimulationParameters, vehicles: List[Vehicl
 
     print("\n")
 
-    Consumer.printAllStats(vehicles,consumers)
-
     powerUsage = total_power_usage(simulationdate, consumers)
     overchargePower = overcharge_power(simulationdate,consumers)
     powerUsage = np.add(powerUsage,overchargePower)
 
-    total_consumed_energy =(sum(powerUsage)/60/1000)
-    grid_energy = (sum([max(-(solarProduction.production[i]-powerUsage[i]),0) for i in range(len(powerUsage))])/60/1000) if powerUsage is not None else 0
-    unused_solar_energy = (sum([max(solarProduction.production[i]-powerUsage[i],0) for i in range(len(powerUsage))])/60/1000)
-    ### print stats (finished) ###
-    print(f"Total energy consumed: {total_consumed_energy:.2f} kWh ({(grid_energy/total_consumed_energy*100 if total_consumed_energy != 0 else 0):.0f}% grid, {((1-grid_energy/total_consumed_energy)*100  if total_consumed_energy != 0 else 0):.0f}% solar)")
-    print(f"Grid energy used: {grid_energy:.2f} kWh ({(grid_energy/total_consumed_energy*100  if total_consumed_energy != 0 else 0):.0f}% from total energy)")
-    print(f"Solar energy unused: {unused_solar_energy:.2f} kWh ({(unused_solar_energy/solar_energy*100 if solar_energy!=0 else 0):.0f}% from total solar energy)")
+    metrics = SimulationMetrics.compute(solarProduction.production, powerUsage, overchargePower, vehicles, consumers)
+    metrics.printVehicles()
+    metrics.printSite()
 
+    if(simulation_parameters.plotpath is not None):
+        render_results(consumers,forecast,simulation_parameters,metrics)
     if(not simulation_parameters.hideresults):
-        visualize_results(consumers,solarProduction,forecast,simulation_parameters,powerUsage,overchargePower)
+        visualize_results(consumers,solarProduction,forecast,simulation_parameters,metrics)
 
 # overcharge egligible vehicles
 def overcharge(simulation_parameters: SimulationParameters, vehicles: List[Vehicle], consumers: List[Consumer]):
@@ -259,17 +404,14 @@ def overcharge(simulation_parameters: SimulationParameters, vehicles: List[Vehic
     if(len(vehicles)>0):
         t = vehicles[-1].time_arrive
 
-    print("# Making forecast API request...")
-    forecast: Forecast = energy_charts_api.api_request(simulation_parameters.forecastapi)
-    forecast.scale(simulation_parameters.peakSolarPower, simulation_parameters.peakPowerForecast)
-    solarProduction = Production(forecast, simulationdate, smooth=simulation_parameters.smoothForecast) 
+    forecast, solarProduction = solar_production(simulation_parameters)
 
     powerUsage = total_power_usage(simulation_parameters.simulationdate, consumers)
     
     ##### overcharging logic #####
     number_scheduled=0
     if(simulation_parameters.scheduling.overcharge):
-        number_scheduled, consumers, overchargePower = overcharge_scheduling(consumers,vehicles,solarProduction,powerUsage,t)
+        number_scheduled, consumers, overchargePower = overcharge_scheduling(consumers,vehicles,solarProduction,powerUsage,t,simulation_parameters.scheduling.powercap)
 
     return number_scheduled,vehicles,consumers
 
@@ -277,20 +419,40 @@ def overcharge(simulation_parameters: SimulationParameters, vehicles: List[Vehic
 
 def argument_parser(parser):
     parser.add_argument('-e', '--storepath', type=str, help="Path for simulation *.json savefile.")
-    parser.add_argument('-t', '--testdatapath', type=str, help="Path for testdata *.json file.")
+    parser.add_argument('-t', '--testdatapath', type=str, help="Path for the fleet *.json file, or a *.csv or *.jsonl file of charging sessions.")
     parser.add_argument('-r', '--resultpath', type=str, help="Path for *.csv file if result export is enabled.")
+    parser.add_argument('-l', '--plotpath', type=str, help="Render the scheduling plot headless to this *.png or *.svg file.")
+    parser.add_argument('--timeseriespath', type=str, help="Append the per-minute power curves of the run to the timeseries store in this directory.")
+    parser.add_argument('--tracepath', type=str, help="Record every scheduling decision of the run to this *.jsonl file, see replay.py.")
+    parser.add_argument('--memoryreport', action='store_true', help="Trace the memory allocations with tracemalloc and print the peak memory and the top allocation sites of every phase of the run. Slows down the simulation considerably.")
+    parser.add_argument('--memorybudget', type=float, help="Abort with the memory report if the resident size of the process exceeds this budget in MB. Checked after every phase and every scheduling decision.")
     parser.add_argument('-x', '--exportresults', action='store_true', help="Exports scheduling results to *.csv file.")
     parser.add_argument('-v', '--hideresults', action='store_true', help="Do not show plot after simulation run.")
     parser.add_argument('-d', '--simulationdate', type=str, help="Set the date for the simulation. e.g.: 2025-01-30")
     parser.add_argument('-p', '--peaksolarpower', type=float, help="The peak solar power in Watts for the simulated power plant.")
     parser.add_argument('-f', '--peakpowerforecast', type=float, help="The scaling factor for the forcast.")
     parser.add_argument('-o', '--smoothforecast', type=str, help="Linearize data points from forecast.")
+    parser.add_argument('--productionmodel', choices=["forecast", "sin2", "gauss"], help="Solar production from the forecast or from a fitted sin² or gauss model of the forecast. Default: forecast")
+    parser.add_argument('--fitcachepath', type=str, help="Directory for caching fitted solar models on disk.")
+    parser.add_argument('--productioncachepath', type=str, help="Directory for caching the built solar production of every date on disk. Runs of an already cached date neither fetch the forecast nor build the production again.")
     parser.add_argument('-a', '--forecastapi', type=str, help="Forecast API url.")
+    parser.add_argument('--forecastserver', type=str, help="Forecast API server, e.g. the url of a local forecast stub server.")
+    parser.add_argument('--forecastsource', choices=["api", "clearsky"], help="Forecast from the energy-charts API or an offline clear-sky model of the site. Default: api")
+    parser.add_argument('--latitude', type=float, help="Latitude of the site in degrees for the clear-sky model.")
+    parser.add_argument('--longitude', type=float, help="Longitude of the site in degrees for the clear-sky model.")
+    parser.add_argument('--cloudiness', type=float, help="Random cloud attenuation of the clear-sky model from 0 (clear sky) to 1.")
+    parser.add_argument('--forecastupdates', nargs='+', type=str, help="Times HH:MM at which the forecast is fetched again during the simulation, only the charging processes affected by the changed solar production are replanned.")
     
     parser.add_argument('-b', '--flatten', type=str, help="Flatten the power draw at the end to fit the descending solar generation.")
     parser.add_argument('-c', '--overcharge', type=str, help="Allow charging more power than requested.")
     parser.add_argument('-m', '--reducemax', type=str, help="Reduce the maximum power draw to optimize the scheduling.")
     parser.add_argument('-g', '--allowgrid', type=str, help="Allow drawing power from the grid at the beginning of the charging process to optimize the scheduling.")
+    parser.add_argument('-s', '--strategy', choices=list(STRATEGIES), help="Scheduling strategy. Default: dynamic")
+    parser.add_argument('--improvetime', type=float, help="Seconds of local search improving the start times after each scheduling. Default: 0 (disabled)")
+    parser.add_argument('--powercap', type=float, help="Grid connection limit of the site in Watts, the charging power of all vehicles together stays below it. Default: no limit")
+    parser.add_argument('--search', choices=["exhaustive", "coarse"], help="Start time search of the dynamic strategy: every minute, or a coarse grid refined to the minute around the best candidates. Default: exhaustive")
+    parser.add_argument('--searchstep', type=int, help="Minutes between the start times of the coarse search grid. Default: 15")
+    parser.add_argument('--profiles', choices=["rules", "best"], help="Charging profile of the dynamic strategy: chosen by the reducemax/flatten rules, or the variant (full, 1/2, 1/4 power, flattened) and start time with the least grid energy. Default: rules")
 
     return parser
 
@@ -298,7 +460,7 @@ def parse(parser, op=False):
     parser = argument_parser(parser)
 
     if(op):
-        parser.add_argument('operation', help='Available operations: create, add, schedule, overcharge, visualize')
+        parser.add_argument('operation', help='Available operations: create, add, schedule, overcharge, visualize, compact')
         parser.add_argument('--vehicle', type=str, help="Add vehicle to simulation. Format: \"id_user,time_arrive,time_leave,percent_arrive,percent_leave,battery_size,charge_max\"")
 
     args = parser.parse_args()
@@ -310,6 +472,16 @@ def parse(parser, op=False):
         simulation_parameters.testdatapath = args.testdatapath
     if args.resultpath is not None:
         simulation_parameters.resultpath = args.resultpath
+    if args.plotpath is not None:
+        simulation_parameters.plotpath = args.plotpath
+    if args.timeseriespath is not None:
+        simulation_parameters.timeseriespath = args.timeseriespath
+    if args.tracepath is not None:
+        simulation_parameters.tracepath = args.tracepath
+    if args.memoryreport:
+        simulation_parameters.memoryreport = True
+    if args.memorybudget is not None:
+        simulation_parameters.memorybudget = args.memorybudget
     if args.exportresults is not None:
         simulation_parameters.exportresults = args.exportresults
     if args.hideresults is not None:
@@ -330,8 +502,27 @@ def parse(parser, op=False):
         simulation_parameters.peakPowerForecast = args.peakPowerForecast
     if args.smoothforecast is not None:
         simulation_parameters.smoothForecast = args.smoothforecast.lower() == 'true'
+    if args.productionmodel is not None:
+        simulation_parameters.productionmodel = args.productionmodel
+    if args.fitcachepath is not None:
+        simulation_parameters.fitcachepath = args.fitcachepath
+    if args.productioncachepath is not None:
+        simulation_parameters.productioncachepath = args.productioncachepath
+    if args.forecastserver is not None:
+        simulation_parameters.forecastserver = args.forecastserver
+        simulation_parameters.update_forecastapi()
     if args.forecastapi is not None:
         simulation_parameters.forecastapi = args.forecastapi
+    if args.forecastsource is not None:
+        simulation_parameters.forecastsource = args.forecastsource
+    if args.latitude is not None:
+        simulation_parameters.latitude = args.latitude
+    if args.longitude is not None:
+        simulation_parameters.longitude = args.longitude
+    if args.cloudiness is not None:
+        simulation_parameters.cloudiness = args.cloudiness
+    if args.forecastupdates is not None:
+        simulation_parameters.forecastupdates = args.forecastupdates
     
     scheduling_parameters = SchedulingParameters()
     if args.flatten is not None:
@@ -342,6 +533,18 @@ def parse(parser, op=False):
         scheduling_parameters.reducemax = args.reducemax.lower() == 'true'
     if args.allowgrid is not None:
         scheduling_parameters.allowgrid = args.allowgrid.lower() == 'true'
+    if args.strategy is not None:
+        scheduling_parameters.strategy = args.strategy
+    if args.improvetime is not None:
+        scheduling_parameters.improvetime = args.improvetime
+    if args.powercap is not None:
+        scheduling_parameters.powercap = args.powercap
+    if args.search is not None:
+        scheduling_parameters.search = args.search
+    if args.searchstep is not None:
+        scheduling_parameters.searchstep = args.searchstep
+    if args.profiles is not None:
+        scheduling_parameters.profiles = args.profiles
 
     simulation_parameters.scheduling = scheduling_parameters
 
@@ -357,80 +560,66 @@ def parse(parser, op=False):
 if __name__ == "__main__":
     p = argparse.ArgumentParser(
                 prog='simulation.py',
-                description='This program allows the iterative simulation of the scheduling process. The different operations are: create, add, schedule, overcharge and visualize.\n\
+                description='This program allows the iterative simulation of the scheduling process. The different operations are: create, add, schedule, overcharge, visualize and compact.\n\
                             create: creates a new simulation file with the set simulation parameters.\n\
                             add: add new vehicle to simulation using --vehicle\n\
                             schedule: (re)schedule all vehicles\n\
                             overcharge: if possible, charge vehicles more than required\n\
-                            visualize: show stats and open plot of scheduling overwiew')
+                            visualize: show stats and open plot of scheduling overwiew\n\
+                            compact: write the journal of changes into the simulation file')
     operation, vehicle, simulation_parameters = parse(p,op=True)
-
-    if(operation!="create"):
-        try:
-            simulation_parameters, vehicles, consumers = load_json(filename=simulation_parameters.storepath)
-        except:
-            print("Error: Can not read simulation file!")
-            exit()
-
-    number_scheduled = 0
-    if operation == "create":
-        vehicles, consumers = create(simulation_parameters)
-    elif operation == "add":
-        vehicles = add(simulation_parameters,vehicles,vehicle)
-    elif operation == "schedule":
-        number_scheduled, vehicles, consumers = schedule(simulation_parameters,vehicles,consumers)
-    elif operation == "visualize":
-        visualize(simulation_parameters,vehicles,consumers)
-    elif operation == "overcharge":
-        number_scheduled, vehicles, consumers = overcharge(simulation_parameters,vehicles,consumers)
-
-    generate_json(simulation_parameters.storepath, simulation_parameters, vehicles, consumers)
-
-    if(simulation_parameters.exportresults):
-        exportdata= {
-            "simulationdate" : None,
-            "peakSolarPower" : None,
-            "totalVehicles" : None,
-            "scheduledVehicles" : None,
-            "requiredEnergy" : None,
-            "solarEnergy" : None,
-            "consumedEnergy" : None,
-            "gridEnergy" : None,
-            "solarUnused" : None
-        }
-
-        required_energy = sum([v.energy_required for v in vehicles])
-
-        forecast: Forecast = energy_charts_api.api_request(simulation_parameters.forecastapi)
-        forecast.scale(simulation_parameters.peakSolarPower, simulation_parameters.peakPowerForecast)
-        solarProduction = Production(forecast, simulation_parameters.simulationdate, smooth=simulation_parameters.smoothForecast) 
-        solar_energy = (solarProduction.getEnergy()/1000)
-
-        exportdata["simulationdate"] = simulation_parameters.simulationdate
-        exportdata["peakSolarPower"] = simulation_parameters.peakSolarPower
-        exportdata["totalVehicles"] = len(vehicles)
-        exportdata["scheduledVehicles"] = number_scheduled
-        exportdata["requiredEnergy"] = required_energy*1000
-        exportdata["solarEnergy"] = solar_energy*1000
-
-        powerUsage = total_power_usage(simulation_parameters.simulationdate, consumers)
-        overchargePower = overcharge_power(simulation_parameters.simulationdate,consumers)
-        powerUsage = np.add(powerUsage,overchargePower)
-
-        total_consumed_energy =(sum(powerUsage)/60/1000)
-        grid_energy = (sum([max(-(solarProduction.production[i]-powerUsage[i]),0) for i in range(len(powerUsage))])/60/1000)
-        unused_solar_energy = (sum([max(solarProduction.production[i]-powerUsage[i],0) for i in range(len(powerUsage))])/60/1000)
-
-        exportdata["consumedEnergy"] = total_consumed_energy*1000
-        exportdata["gridEnergy"] = grid_energy*1000
-        exportdata["solarUnused"] = unused_solar_energy*1000
-
-        if(not os.path.exists(simulation_parameters.resultpath)):
+    memory = MemoryProfiler(simulation_parameters.memoryreport, simulation_parameters.memorybudget)
+
+    try:
+        memory.phase("load store")
+        # the store is locked from loading to saving, so concurrent commands do not overwrite each other's changes
+        with SimulationStore(simulation_parameters.storepath).lock(exclusive=operation!="visualize") as store:
+            if(operation!="create"):
+                try:
+                    simulation_parameters, vehicles, consumers = store.load()
+                except:
+                    print("Error: Can not read simulation file!")
+                    exit()
+
+            memory.phase(operation)
+            number_scheduled = 0
+            if operation == "create":
+                vehicles, consumers = create(simulation_parameters)
+            elif operation == "add":
+                vehicles = add(simulation_parameters,vehicles,vehicle)
+            elif operation == "schedule":
+                number_scheduled, vehicles, consumers = schedule(simulation_parameters,vehicles,consumers)
+            elif operation == "visualize":
+                visualize(simulation_parameters,vehicles,consumers)
+            elif operation == "overcharge":
+                number_scheduled, vehicles, consumers = overcharge(simulation_parameters,vehicles,consumers)
+
+            memory.phase("save store")
+            if operation == "create":
+                store.create(simulation_parameters)
+            elif operation == "compact":
+                store.compact()
+            elif operation != "visualize": # only the changes are appended to the journal
+                store.append(operation, vehicles, consumers)
+
+        if(simulation_parameters.exportresults):
+            memory.phase("export results")
+            forecast, solarProduction = solar_production(simulation_parameters)
+
+            powerUsage = total_power_usage(simulation_parameters.simulationdate, consumers)
+            overchargePower = overcharge_power(simulation_parameters.simulationdate,consumers)
+            powerUsage = np.add(powerUsage,overchargePower)
+
+            metrics = SimulationMetrics.compute(solarProduction.production, powerUsage, overchargePower, vehicles, consumers)
             try:
-                csv_write(simulation_parameters.resultpath, exportdata.keys())
-            except:
-                print(f"Error: Failed to write data to file {simulation_parameters.resultpath}.")
-        try:
-            csv_write(simulation_parameters.resultpath, exportdata.values())
-        except:
-            print(f"Error: Failed to write data to file {simulation_parameters.resultpath}.")
\ No newline at end of file
+                with ResultSink(simulation_parameters.resultpath) as sink:
+                    sink.add(metrics, simulation_parameters.simulationdate, simulation_parameters.peakSolarPower, len(vehicles), number_scheduled)
+            except OSError as e:
+                print(f"Error: Failed to write data to file {simulation_parameters.resultpath}: {e}")
+        memory.finish()
+    except MemoryBudgetExceeded as e:
+        print(e)
+        exit(1)
+
+    if(memory.enabled):
+        print(memory.report())
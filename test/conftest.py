@@ -0,0 +1,16 @@
+import time
+import pytest
+
+def tzset() -> None:
+    if hasattr(time, "tzset"):
+        time.tzset()
+
+# the recorded forecasts are in epoch seconds while the simulation works in local time, the golden results are recorded in UTC
+# the time zone is set for the test session and restored afterwards
+@pytest.fixture(scope="session", autouse=True)
+def utc_timezone():
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("TZ", "UTC")
+        tzset()
+        yield
+    tzset()
@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduling_framework.vehicle import Vehicle
+from scheduling_framework.fleet_ingest import create_vehicles
+from scheduling_framework.forecast_power import Forecast
+from scheduling_framework.forecast_client import parse_response, forecast_url
+from scheduling_framework.consumer_model import Consumer
+from scheduling_framework.renewable_production import Production
+from scheduling_framework.dynamic_scheduling import apply_strategy, overcharge_scheduling
+from scheduling_framework.simulation_metrics import MetricsResult
+from scheduling_framework.decision_trace import DecisionTrace
+from scheduling_framework.parameters import SimulationParameters, SchedulingParameters
+import scheduling_framework.clear_sky as clear_sky
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+GOLDENPATH = os.path.join(FIXTURES, "golden.json")
+
+# recorded forecasts of the test days, stored in the format of the recording forecast client
+# generated once from the clear-sky model with clouds, as the tests must not depend on the live API
+FORECASTS = {"2024-06-10": 0.3, "2024-02-12": 0.6} # date: cloudiness
+
+# fixed fleets, generated once with generate_testdata.py
+FLEETS = {"fleet_10.json": (10, 1), "fleet_30.json": (30, 2)} # file: (vehicle count, seed)
+
+# golden cases of the consecutive simulation
+# budget: wall time limit in seconds of the tested function, about three times the time measured on a current laptop
+CASES = {
+    "summer_fleet10": {"date": "2024-06-10", "fleet": "fleet_10.json", "peakSolarPower": 150_000, "scheduling": {"overcharge": False}, "budget": 1},
+    "summer_fleet10_none": {"date": "2024-06-10", "fleet": "fleet_10.json", "peakSolarPower": 150_000, "scheduling": {"strategy": "none", "overcharge": False}, "budget": 1},
+    "summer_fleet10_cap": {"date": "2024-06-10", "fleet": "fleet_10.json", "peakSolarPower": 150_000, "scheduling": {"overcharge": True, "powercap": 33_000}, "budget": 2},
+    "summer_fleet10_waterfill": {"date": "2024-06-10", "fleet": "fleet_10.json", "peakSolarPower": 150_000, "scheduling": {"strategy": "waterfill", "overcharge": True, "powercap": 33_000}, "budget": 1},
+    "summer_fleet30_overcharge": {"date": "2024-06-10", "fleet": "fleet_30.json", "peakSolarPower": 150_000, "scheduling": {"overcharge": True}, "budget": 8},
+    "winter_fleet10_grid": {"date": "2024-02-12", "fleet": "fleet_10.json", "peakSolarPower": 60_000, "scheduling": {"allowgrid": True, "flatten": True, "overcharge": True}, "budget": 3},
+}
+
+# golden cases of scheduling all vehicles of a fleet at once at the first arrival of the day, followed by overcharging
+# budgets: wall time limits of the scheduling strategy and of overcharge_scheduling
+SCHEDULINGCASES = {
+    "summer_fleet10": {"date": "2024-06-10", "fleet": "fleet_10.json", "peakSolarPower": 150_000, "scheduling": {}, "budget": 1, "overchargebudget": 1},
+    "winter_fleet10_grid": {"date": "2024-02-12", "fleet": "fleet_10.json", "peakSolarPower": 60_000, "scheduling": {"allowgrid": True, "flatten": True}, "budget": 1, "overchargebudget": 1},
+}
+
+# the coarse start time search uses at most this share of the consumed energy more grid energy than the exhaustive search
+COARSETOLERANCE = 0.005
+
+# multiplies all budgets, e.g. BUDGETSCALE=3 on a slow CI machine
+BUDGETSCALE = float(os.environ.get("BUDGETSCALE", 1))
+
+# ---------------- fixtures ---------------- #
+
+def forecast_path(date: str) -> str:
+    return os.path.join(FIXTURES, f"forecast_{date}.json")
+
+# load the recorded forecast of a test day (unscaled, in W)
+def load_forecast(date: str) -> Forecast:
+    with open(forecast_path(date), 'r', encoding="utf-8") as file:
+        return parse_response(json.load(file))
+
+def load_vehicles(fleet: str, date: str) -> List[Vehicle]:
+    with open(os.path.join(FIXTURES, fleet), 'r', encoding="utf-8") as file:
+        return create_vehicles(json.load(file), datetime.fromisoformat(date))
+
+def simulation_parameters(case: dict) -> SimulationParameters:
+    parameters = SimulationParameters(testdatapath=os.path.join(FIXTURES, case["fleet"]),
+                                      simulationdate=datetime.fromisoformat(case["date"]),
+                                      peakSolarPower=case["peakSolarPower"],
+                                      exportresults=False,
+                                      hideresults=True,
+                                      scheduling=SchedulingParameters(**case["scheduling"]))
+    return parameters
+
+# start and end times and energies of the charging and overcharging curves, sorted by vehicle
+def schedule_summary(consumers: List[Consumer]) -> List[dict]:
+    summary = []
+    for c in sorted(consumers, key=lambda c: str(c.id_user)):
+        entry = {"id_user": c.id_user,
+                 "start": str(c.power.interval.time_start),
+                 "end": str(c.power.interval.time_end),
+                 "energy": c.power.getEnergy()}
+        if c.overpower.interval is not None:
+            entry.update({"overstart": str(c.overpower.interval.time_start),
+                          "overend": str(c.overpower.interval.time_end),
+                          "overenergy": c.overpower.getEnergy()})
+        summary.append(entry)
+    return summary
+
+# simulate a golden case, returns the metrics and the final consumers replayed from the decision trace
+def simulate_case(case: dict, tracedir: str) -> Tuple[MetricsResult, List[Consumer]]:
+    from run import simulate
+    parameters = simulation_parameters(case)
+    parameters.tracepath = os.path.join(tracedir, "trace.jsonl")
+    metrics = simulate(parameters, load_forecast(case["date"]))
+    return metrics, DecisionTrace.load(parameters.tracepath).replay()
+
+# inputs of a scheduling case: the vehicles, the solar production and the first arrival
+def scheduling_inputs(case: dict) -> Tuple[List[Vehicle], Production, datetime]:
+    from simulation import solar_production
+    vehicles = load_vehicles(case["fleet"], case["date"])
+    production = solar_production(simulation_parameters(case), load_forecast(case["date"]))[1]
+    return vehicles, production, min(v.time_arrive for v in vehicles)
+
+# schedule all vehicles of a scheduling case with the strategy of the case
+def schedule_case(case: dict, vehicles: List[Vehicle], production: Production, timestamp: datetime) -> List[Consumer]:
+    return apply_strategy(simulation_parameters(case).scheduling, vehicles, timestamp, production.production)
+
+# overcharge the scheduled consumers, returns the consumers and the total overcharge energy in Wh
+def overcharge_case(consumers: List[Consumer], vehicles: List[Vehicle], production: Production, timestamp: datetime) -> Tuple[List[Consumer], float]:
+    powerUsage = np.zeros(24*60)
+    for c in consumers:
+        c.power.addTo(powerUsage, int((c.power.interval.time_start-production.day).total_seconds()/60))
+    number_scheduled, consumers, overchargePower = overcharge_scheduling(consumers, vehicles, production, powerUsage, timestamp)
+    return consumers, float(np.sum(overchargePower))/60
+
+def kpis(metrics: MetricsResult, case: dict) -> Dict[str, float]:
+    return {k: v for k, v in metrics.exportdata(datetime.fromisoformat(case["date"]), case["peakSolarPower"], 0, 0).items() if k.endswith("Energy") or k=="solarUnused"}
+
+def load_golden() -> Dict[str, dict]:
+    with open(GOLDENPATH, 'r', encoding="utf-8") as file:
+        return json.load(file)
+
+# ---------------- checks ---------------- #
+
+# call the function and fail if it takes longer than the budget in seconds
+def within_budget(budget: float, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    duration = time.perf_counter()-start
+    assert duration <= budget*BUDGETSCALE, f"{function.__name__} took {duration:.2f} s, budget {budget*BUDGETSCALE:.2f} s"
+    return result
+
+# compare a schedule summary with the golden one, times must match exactly and energies up to rounding
+def assert_schedule(actual: List[dict], expected: List[dict]) -> None:
+    import pytest
+    assert [a["id_user"] for a in actual] == [e["id_user"] for e in expected]
+    for a, e in zip(actual, expected):
+        assert a == pytest.approx(e, rel=1e-9, abs=1e-6), f"schedule of vehicle {e['id_user']} changed"
+
+# ---------------- recording ---------------- #
+
+# record the forecasts of the test days from the clear-sky model (values in MW like the API)
+def record_forecasts() -> None:
+    parameters = SimulationParameters()
+    for date, cloudiness in FORECASTS.items():
+        day = datetime.fromisoformat(date).date()
+        forecast = clear_sky.clear_sky_forecast(day-timedelta(days=1), day+timedelta(days=1), parameters.peakPowerForecast, cloudiness=cloudiness)
+        data = {"url": forecast_url(day-timedelta(days=1), day+timedelta(days=1)),
+                "unix_seconds": [int(s) for s in forecast.seconds],
+                "forecast_values": [round(v/1_000_000, 3) for v in forecast.values]}
+        with open(forecast_path(date), 'w', encoding="utf-8") as file:
+            json.dump(data, file)
+        print(f"Forecast written to {forecast_path(date)}.")
+
+def record_fleets() -> None:
+    from generate_testdata import generate_testdata, TestdataParameters
+    for fleet, (vehiclecount, seed) in FLEETS.items():
+        generate_testdata(TestdataParameters(filename=os.path.join(FIXTURES, fleet), vehiclecount=vehiclecount, seed=seed))
+
+# run all golden cases with the current code
+def compute_golden() -> Dict[str, dict]:
+    golden = {"simulate": {}, "dynamic_scheduling": {}, "overcharge_scheduling": {}}
+    with tempfile.TemporaryDirectory() as tracedir:
+        for name, case in CASES.items():
+            metrics, consumers = simulate_case(case, tracedir)
+            golden["simulate"][name] = {"kpis": kpis(metrics, case),
+                                        "vehicles": [v.to_dict() for v in metrics.vehicles],
+                                        "schedule": schedule_summary(consumers)}
+    for name, case in SCHEDULINGCASES.items():
+        vehicles, production, timestamp = scheduling_inputs(case)
+        consumers = schedule_case(case, vehicles, production, timestamp)
+        golden["dynamic_scheduling"][name] = {"schedule": schedule_summary(consumers)}
+        consumers, overchargeEnergy = overcharge_case(consumers, vehicles, production, timestamp)
+        golden["overcharge_scheduling"][name] = {"overchargeEnergy": overchargeEnergy, "schedule": schedule_summary(consumers)}
+    return golden
+
+if __name__ == "__main__":
+    os.environ["TZ"] = "UTC" # the golden results are recorded in UTC, see utc_timezone in conftest.py
+    if hasattr(time, "tzset"):
+        time.tzset()
+
+    p = argparse.ArgumentParser(
+                    prog='golden.py',
+                    description='This program regenerates the golden schedules and KPIs of the regression tests from the current code. Only run it after a deliberate change of the scheduling results and review the diff of the golden file. With --fixtures, the recorded forecasts and fleets are generated again as well.')
+    p.add_argument('--fixtures', action='store_true', help="Also regenerate the recorded forecasts and fleets.")
+    args = p.parse_args()
+
+    if args.fixtures:
+        os.makedirs(FIXTURES, exist_ok=True)
+        record_forecasts()
+        record_fleets()
+    golden = compute_golden()
+    with open(GOLDENPATH, 'w', encoding="utf-8") as file:
+        json.dump(golden, file, indent=1, default=lambda o: o.item()) # numpy scalars
+    print(f"Golden results written to {GOLDENPATH}.")
@@ -0,0 +1,37 @@
+import pytest
+
+import golden
+from scheduling_framework.parameters import SchedulingParameters
+from scheduling_framework.dynamic_scheduling import search_start
+
+GOLDEN = golden.load_golden()
+
+# scheduling a whole fleet at once reproduces the golden start times within the budget of the strategy
+@pytest.mark.parametrize("name", list(golden.SCHEDULINGCASES))
+def test_dynamic_scheduling(name):
+    case = golden.SCHEDULINGCASES[name]
+    vehicles, production, timestamp = golden.scheduling_inputs(case)
+
+    consumers = golden.within_budget(case["budget"], golden.schedule_case, case, vehicles, production, timestamp)
+
+    golden.assert_schedule(golden.schedule_summary(consumers), GOLDEN["dynamic_scheduling"][name]["schedule"])
+
+# overcharging the scheduled fleet reproduces the golden overcharge curves within its budget
+@pytest.mark.parametrize("name", list(golden.SCHEDULINGCASES))
+def test_overcharge_scheduling(name):
+    case = golden.SCHEDULINGCASES[name]
+    expected = GOLDEN["overcharge_scheduling"][name]
+    vehicles, production, timestamp = golden.scheduling_inputs(case)
+    consumers = golden.schedule_case(case, vehicles, production, timestamp)
+
+    consumers, overchargeEnergy = golden.within_budget(case["overchargebudget"], golden.overcharge_case, consumers, vehicles, production, timestamp)
+
+    assert overchargeEnergy == pytest.approx(expected["overchargeEnergy"], rel=1e-9, abs=1e-6)
+    golden.assert_schedule(golden.schedule_summary(consumers), expected["schedule"])
+
+# if no coarse start time keeps the power cap, the coarse search scores every minute instead of giving up
+def test_coarse_search_fallback():
+    parameters = SchedulingParameters(search="coarse", searchstep=15)
+    feasible = {37: 2.0, 52: 1.0} # between the coarse start times 0, 15, 30, ...
+    assert search_start(parameters, feasible.get, 0, 120) == 52
+    assert search_start(parameters, lambda j: None, 0, 120) is None
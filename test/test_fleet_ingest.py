@@ -0,0 +1,54 @@
+import csv
+import json
+import pytest
+from datetime import datetime
+
+import golden
+from scheduling_framework.vehicle import Vehicle
+from scheduling_framework.fleet_ingest import FIELDS, create_vehicles, read_fleet, iter_fleet, parse_minutes
+
+# writes the sessions of a fixture fleet as CSV (with an additional column) and as JSON lines
+def export_fleet(fleet: str, directory) -> list:
+    with open(f"{golden.FIXTURES}/{fleet}", 'r', encoding="utf-8") as file:
+        data = json.load(file)
+    with open(directory/"fleet.csv", 'w', newline='', encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["station"]+FIELDS)
+        writer.writerows([["north"]+[session[name] for name in FIELDS] for session in data])
+    with open(directory/"fleet.jsonl", 'w', encoding="utf-8") as file:
+        file.writelines(json.dumps(session)+"\n" for session in data)
+    return data
+
+# all formats read in chunks give the same vehicles as create_vehicles, including the reduced SoCs of infeasible sessions
+@pytest.mark.parametrize("fleet", list(golden.FLEETS))
+def test_formats(fleet, tmp_path, capsys):
+    date = golden.CASES["summer_fleet10"]["date"]
+    expected = [vars(v) for v in golden.load_vehicles(fleet, date)]
+    warnings = capsys.readouterr().out
+    export_fleet(fleet, tmp_path)
+
+    for path in [f"{golden.FIXTURES}/{fleet}", tmp_path/"fleet.csv", tmp_path/"fleet.jsonl"]:
+        vehicles = [v for chunk in iter_fleet(str(path), datetime.fromisoformat(date), chunksize=4) for v in chunk]
+        assert [vars(v) for v in vehicles] == expected, path
+        assert all(isinstance(v, Vehicle) for v in vehicles)
+        assert capsys.readouterr().out == warnings
+
+def test_times():
+    assert parse_minutes(["00:00", "08:05", "8:05", "23:59"]).tolist() == [0, 485, 485, 1439]
+    for time in ["24:00", "08:60", "0805", "ab:cd"]:
+        with pytest.raises(ValueError):
+            parse_minutes(["08:00", time])
+
+def test_missing_column(tmp_path):
+    (tmp_path/"fleet.csv").write_text("id_user,time_arrive,time_leave\n1,08:00,12:00\n")
+    with pytest.raises(ValueError):
+        read_fleet(str(tmp_path/"fleet.csv"), datetime(2024, 6, 10))
+
+# the desired SoC of a session too short to reach it is reduced to the possible SoC, Vehicle derives the rest
+def test_clamp(capsys):
+    session = {"id_user": 1, "time_arrive": "08:00", "time_leave": "09:00", "percent_arrive": 20, "percent_leave": 80, "battery_size": 60, "charge_max": 11}
+    vehicle = create_vehicles([session], datetime(2024, 6, 10))[0]
+    assert vehicle.percent_leave == pytest.approx(11*100/60+20)
+    assert vehicle.energy_required == pytest.approx(11) and vehicle.charge_duration == int(vehicle.energy_required/11*60)
+    assert vars(vehicle).keys() == vars(Vehicle("1", vehicle.time_arrive, vehicle.time_leave, 20, 80, 60, 11)).keys()
+    assert capsys.readouterr().out.count("Warning: Vehicle with ID 1 cannot be charged 36.00 kWh (80%) within 60 minutes.") == 1
@@ -0,0 +1,24 @@
+import socket
+import pytest
+from datetime import date
+
+import scheduling_framework.forecast_client as forecast_client
+import scheduling_framework.energy_charts_api as energy_charts_api
+from scheduling_framework.energy_charts_api import ForecastError
+from scheduling_framework.forecast_client import ForecastClient, forecast_url
+
+# returns the url of a local port nobody listens on
+def unreachable_server() -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+# a failed request is raised as ForecastError, also when prefetching, so batch runs can handle it
+def test_unreachable_server(monkeypatch):
+    monkeypatch.setattr(forecast_client, "_default_client", ForecastClient(timeout=(1, 1), retries=0))
+    server = unreachable_server()
+    with pytest.raises(ForecastError):
+        energy_charts_api.prefetch(date(2024,1,31), date(2024,3,1), server)
+    with pytest.raises(ForecastError):
+        energy_charts_api.api_request(forecast_url(date(2024,2,1), date(2024,2,3), server))
@@ -0,0 +1,39 @@
+import io
+import time
+import contextlib
+import numpy as np
+from datetime import datetime, timedelta
+
+from scheduling_framework.vehicle import Vehicle
+from scheduling_framework.consumer_model import Consumer, PowerCurve, TimeInterval
+from scheduling_framework.local_search import improve_schedule
+
+# the search ends as soon as a schedule without grid energy is found instead of running until the time limit
+def test_no_grid_energy_left():
+    day = datetime(2024, 6, 15)
+    production = np.zeros(24*60)
+    production[10*60:14*60] = 11000
+    vehicle = Vehicle("1", day+timedelta(hours=8), day+timedelta(hours=16), 20, 40, 55, 11)
+    consumer = Consumer("1", PowerCurve([11000]*60, TimeInterval(day+timedelta(hours=8), day+timedelta(hours=9))))
+
+    begin = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        improved = improve_schedule([consumer], [vehicle], vehicle.time_arrive, production.tolist(), timelimit=5.0)
+    assert time.perf_counter()-begin < 2.5
+    start = improved[0].power.interval.time_start
+    assert day+timedelta(hours=10) <= start <= day+timedelta(hours=13)
+
+# charging processes started before the scheduling time keep their start time, the others do not move into the past
+def test_started_consumers_pinned():
+    day = datetime(2024, 6, 15)
+    production = np.zeros(24*60)
+    production[6*60:8*60] = 11000
+    production[12*60:14*60] = 22000
+    vehicles = [Vehicle(str(i), day+timedelta(hours=7), day+timedelta(hours=18), 20, 40, 55, 11) for i in range(2)]
+    consumers = [Consumer(v.id_user, PowerCurve([11000]*60, TimeInterval(day+timedelta(hours=h), day+timedelta(hours=h+1)))) for v, h in zip(vehicles, (9, 16))]
+    now = day+timedelta(hours=10)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        improved = improve_schedule(consumers, vehicles, now, production.tolist(), timelimit=0.5)
+    assert improved[0].power.interval.time_start == day+timedelta(hours=9)
+    assert now <= improved[1].power.interval.time_start <= day+timedelta(hours=13)
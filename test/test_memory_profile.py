@@ -0,0 +1,49 @@
+import tracemalloc
+import numpy as np
+import pytest
+
+import golden
+from run import simulate
+from scheduling_framework.memory_profile import MemoryProfiler, MemoryBudgetExceeded, MB, RESIDENT, resident_size
+
+# the phases record their peak, the memory they keep and the allocation sites
+def test_phases():
+    profiler = MemoryProfiler()
+    profiler.phase("keep")
+    kept = np.ones(MB) # 8 MB
+    profiler.phase("temporary")
+    np.ones(2*MB).sum()
+    phases = profiler.finish()
+
+    assert [p.name for p in phases] == ["keep", "temporary"]
+    assert phases[0].end-phases[0].start == pytest.approx(8*MB, rel=0.05)
+    assert phases[1].peak-phases[1].start == pytest.approx(16*MB, rel=0.05)
+    assert abs(phases[1].end-phases[1].start) < 0.5*MB
+    assert phases[0].sites[0][0].endswith(f"test_memory_profile.py:{test_phases.__code__.co_firstlineno+3}")
+    assert not tracemalloc.is_tracing()
+    del kept
+
+# exceeding the budget aborts the run with the report of the phases so far
+def test_budget():
+    case = golden.CASES["summer_fleet10"]
+    parameters = golden.simulation_parameters(case)
+    parameters.memorybudget = 1
+    with pytest.raises(MemoryBudgetExceeded) as e:
+        simulate(parameters, golden.load_forecast(case["date"]))
+    assert "read vehicles" in str(e.value)
+    assert not tracemalloc.is_tracing()
+
+    parameters.memorybudget = 1_000_000
+    metrics = simulate(parameters, golden.load_forecast(case["date"]))
+    assert golden.kpis(metrics, case) == pytest.approx(golden.load_golden()["simulate"]["summer_fleet10"]["kpis"], rel=1e-9)
+
+# the budget is checked against the current resident size, memory freed by an earlier run is not charged to the next one
+@pytest.mark.skipif(not RESIDENT, reason="no resident size")
+def test_budget_per_run():
+    case = golden.CASES["summer_fleet10"]
+    parameters = golden.simulation_parameters(case)
+    parameters.memorybudget = resident_size()+200
+    np.ones(64*MB).sum() # 512 MB, freed again
+    assert resident_size() < parameters.memorybudget
+    metrics = simulate(parameters, golden.load_forecast(case["date"]))
+    assert golden.kpis(metrics, case) == pytest.approx(golden.load_golden()["simulate"]["summer_fleet10"]["kpis"], rel=1e-9)
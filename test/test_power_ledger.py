@@ -0,0 +1,55 @@
+import random
+import numpy as np
+import pytest
+
+from scheduling_framework.power_ledger import PowerLedger
+from scheduling_framework.consumer_model import PowerCurve
+
+# range additions and range maxima of the segment tree match a plain per-minute array
+def test_ranges():
+    rng = random.Random(0)
+    for n in [1, 7, 24*60]:
+        expected = np.array([rng.uniform(0, 1000) for _ in range(n)])
+        ledger = PowerLedger(expected.tolist())
+        for _ in range(2000):
+            start, end = sorted((rng.randrange(-2, n+2), rng.randrange(-2, n+2)))
+            window = expected[max(start, 0):max(min(end, n), 0)]
+            if rng.random()<0.5:
+                value = rng.uniform(-500, 500)
+                ledger.add(start, end, value)
+                window += value
+            elif len(window)>0:
+                assert abs(ledger.max(start, end)-window.max()) < 1e-6
+
+# additions of power curves with constant and ramp segments match the per-minute addition in every minute
+# the peak of a curve is exact for constant segments and bounded by the highest ramp value for ramps, never below the exact peak
+def test_curves():
+    rng = random.Random(1)
+    expected = np.zeros(24*60)
+    upper = np.zeros(24*60) # the ramps at their highest value
+    ledger = PowerLedger(expected.tolist())
+    for _ in range(200):
+        ramp = rng.randrange(0, 30)
+        power = [11000.0]*rng.randrange(1, 120)+[11000.0-50*i for i in range(ramp)]
+        curve = PowerCurve(power, None)
+        start = rng.randrange(0, 24*60)
+        window = expected[start:start+len(power)]
+        exact = (window+np.array(power[:len(window)])).max()
+        peak = ledger.peak(start, curve)
+        assert exact-1e-6 <= peak <= upper[start:start+len(power)].max()+11000+1e-6
+        if ramp<2:
+            assert abs(peak-exact) < 1e-6
+        ledger.addCurve(start, curve)
+        curve.addTo(expected, start)
+        upper[start:start+len(power)] += 11000
+    assert all(abs(ledger.max(i, i+1)-expected[i]) < 1e-6 for i in range(24*60))
+    assert ledger.max(0, 24*60) >= expected.max()-1e-6
+
+# a ramp is added as one range: the maximum of a range without further additions is exact again after pushing it down
+def test_ramp_range():
+    ledger = PowerLedger([0.0]*100)
+    ledger.addCurve(10, PowerCurve([1000.0-10*i for i in range(64)], None))
+    assert ledger.max(10, 11) == pytest.approx(1000)
+    assert ledger.max(73, 74) == pytest.approx(1000-10*63)
+    assert ledger.max(74, 100) == 0
+    assert ledger.max(0, 100) >= 1000
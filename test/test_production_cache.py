@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from matplotlib.figure import Figure
+
+import golden
+import simulation
+import scheduling_framework.renewable_production as renewable_production
+import scheduling_framework.solar_fit as solar_fit
+from scheduling_framework.renewable_production import ProductionCache
+from scheduling_framework.solar_fit import FitCache
+from scheduling_framework.forecast_power import Forecast
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ProductionCache()
+    monkeypatch.setattr(renewable_production, "_default_cache", cache)
+    return cache
+
+# runs of the same day build the production once, without fetching the forecast again, and share the read-only array
+def test_build_once(cache, monkeypatch):
+    parameters = golden.simulation_parameters(golden.CASES["summer_fleet10"])
+    parameters.forecastsource = "clearsky"
+    fetches = []
+    fetch_forecast = simulation.fetch_forecast
+    monkeypatch.setattr(simulation, "fetch_forecast", lambda p: fetches.append(p) or fetch_forecast(p))
+
+    productions = [simulation.solar_production(parameters)[1] for _ in range(3)]
+
+    assert cache.builds == 1 and len(fetches) == 1
+    assert all(p.production is productions[0].production for p in productions)
+    with pytest.raises(ValueError):
+        productions[0].production[0] = 1.0
+
+    parameters.peakSolarPower = 2*parameters.peakSolarPower # another scale is built again
+    assert np.allclose(simulation.solar_production(parameters)[1].production, 2*productions[0].production)
+    assert cache.builds == 2
+
+# the on-disk cache hands out the production and the scaled forecast built by another process
+def test_disk_cache(cache, tmp_path):
+    case = golden.CASES["winter_fleet10_grid"]
+    parameters = golden.simulation_parameters(case)
+    parameters.productioncachepath = str(tmp_path)
+    forecast, production = simulation.solar_production(parameters, golden.load_forecast(case["date"]))
+
+    renewable_production._default_cache = ProductionCache()
+    cachedforecast, cachedproduction = simulation.solar_production(parameters, golden.load_forecast(case["date"]))
+
+    assert renewable_production._default_cache.builds == 0
+    assert np.array_equal(cachedproduction.production, production.production)
+    assert np.array_equal(cachedforecast.values, forecast.values) and cachedforecast.scaling == forecast.scaling
+    assert cachedproduction.day == production.day
+
+# fitted models are cached per forecast content, another forecast of the same day and scale is fitted again
+def test_fit_cache(cache, monkeypatch, tmp_path):
+    case = golden.CASES["summer_fleet10"]
+    parameters = golden.simulation_parameters(case)
+    parameters.productionmodel = "sin2"
+    parameters.fitcachepath = str(tmp_path)
+    monkeypatch.setattr(solar_fit, "_default_cache", FitCache())
+    forecast = golden.load_forecast(case["date"])
+    halved = Forecast(seconds=forecast.seconds, values=0.5*forecast.values)
+
+    production = simulation.solar_production(parameters, forecast)[1]
+    halvedproduction = simulation.solar_production(parameters, halved)[1]
+    assert halvedproduction.production.sum() == pytest.approx(0.5*production.production.sum(), rel=1e-3)
+    assert len(list(tmp_path.iterdir())) == 2
+
+    parameters.productionmodel = "forecast" # the fit of the visualization is kept on disk as well
+    parameters.fitcachepath = str(tmp_path/"visualization")
+    monkeypatch.setattr(solar_fit, "_default_cache", FitCache())
+    forecast = simulation.solar_production(parameters, forecast)[0]
+    forecast.visualizeSin2(Figure().add_subplot(), parameters.simulationdate)
+    assert len(list((tmp_path/"visualization").iterdir())) == 1
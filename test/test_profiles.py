@@ -0,0 +1,69 @@
+import io
+import contextlib
+import numpy as np
+import pytest
+
+import golden
+from scheduling_framework.dynamic_scheduling import apply_strategy, best_profile, charging_profile, grid_energies, grid_energy
+from scheduling_framework.power_ledger import PowerLedger
+
+# the batched scores of all start times match the per-minute grid energy
+def test_batched_scores():
+    rng = np.random.default_rng(1)
+    production = np.clip(np.sin(np.linspace(0, np.pi, 24*60))*40000+rng.normal(0, 3000, 24*60), 0, None)
+    powerUsage = rng.uniform(0, 10000, 24*60)
+    for curve in (charging_profile(11, 200, 40), charging_profile(22, 60), charging_profile(5.5, 400, 80)):
+        start = 100
+        count = 24*60-start-curve.length
+        energies = grid_energies(production-powerUsage, curve, start, count)
+        for j in range(0, count, 7):
+            assert energies[j] == pytest.approx(grid_energy(production.tolist(), powerUsage.tolist(), curve.power, start+j, curve.length, False), abs=1e-6)
+
+# the profiles are cached by power, duration and ramp and cannot be modified
+def test_profile_cache():
+    curve = charging_profile(11, 180, 30)
+    assert charging_profile(11, 180, 30) is curve
+    assert curve.length == int(180*0.85)+30
+    assert curve.power[0] == 11000 and curve.power[-1] > 5500
+    with pytest.raises(ValueError):
+        curve.values[0] = 0
+
+# a vehicle scheduled alone never uses more grid energy with the best profile than with the profile of the rules
+@pytest.mark.parametrize("name", list(golden.SCHEDULINGCASES))
+def test_best_profile(name):
+    case = golden.SCHEDULINGCASES[name]
+    vehicles, production, timestamp = golden.scheduling_inputs(case)
+    for v in vehicles:
+        energies = {}
+        for profiles in ("rules", "best"):
+            scheduling = golden.simulation_parameters(case).scheduling
+            scheduling.profiles = profiles
+            with contextlib.redirect_stdout(io.StringIO()):
+                consumer = apply_strategy(scheduling, [v], timestamp, production.production)[0]
+            start = int((consumer.power.interval.time_start-production.day).total_seconds()/60)
+            energies[profiles] = grid_energy(production.production, [0.0]*24*60, consumer.power.power, start, consumer.power.length, scheduling.allowgrid)
+        assert energies["best"] <= energies["rules"]+1e-6
+
+# with a power cap, the best profile is the start time of least grid energy among those the power ledger accepts
+@pytest.mark.parametrize("name", list(golden.SCHEDULINGCASES))
+def test_best_profile_cap(name):
+    case = golden.SCHEDULINGCASES[name]
+    vehicles, production, timestamp = golden.scheduling_inputs(case)
+    scheduling = golden.simulation_parameters(case).scheduling
+    scheduling.profiles, scheduling.flatten, scheduling.powercap = "best", True, 14_000
+    rng = np.random.default_rng(2)
+    powerUsage = rng.uniform(0, 8000, 24*60)
+    ledger = PowerLedger(powerUsage.tolist())
+    start = int((timestamp-production.day).total_seconds()/60)
+    for v in vehicles:
+        rulecurve = charging_profile(v.charge_max, v.charge_duration)
+        curve, best, _, leastPeakStart = best_profile(scheduling, v, rulecurve, production.production, powerUsage.tolist(), ledger, timestamp, start)
+        count = max(int((v.time_leave-timestamp).total_seconds()/60)-curve.length, 1)
+        energies = grid_energies(np.subtract(production.production, powerUsage), curve, start, count)
+        if scheduling.allowgrid:
+            energies[energies<=1000] = 0
+        feasible = [j for j in range(count) if ledger.peak(start+j, curve) <= scheduling.powercap]
+        if best is None:
+            assert feasible == [] and leastPeakStart is not None
+        else:
+            assert best in feasible and energies[best] == pytest.approx(min(energies[feasible]))
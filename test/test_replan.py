@@ -0,0 +1,86 @@
+import io
+import contextlib
+import numpy as np
+import pytest
+from datetime import datetime, timedelta
+
+import golden
+import simulation
+from run import simulate
+from scheduling_framework.forecast_power import Forecast
+from scheduling_framework.decision_trace import DecisionTrace
+
+# the recorded forecast of a test day with clouds (40% of the production) between the given hours
+def cloudy_forecast(date: str, begin: int, end: int) -> Forecast:
+    forecast = golden.load_forecast(date)
+    day = datetime.fromisoformat(date)
+    clouds = (forecast.seconds>=(day+timedelta(hours=begin)).timestamp()) & (forecast.seconds<(day+timedelta(hours=end)).timestamp())
+    return Forecast(seconds=forecast.seconds, values=np.where(clouds, 0.4*forecast.values, forecast.values))
+
+# schedule the whole fleet of a case at its first arrival, returns everything needed to replan
+def scheduled_case(name: str):
+    case = golden.SCHEDULINGCASES[name]
+    parameters = golden.simulation_parameters(case)
+    parameters.scheduling.overcharge = True
+    vehicles, production, t = golden.scheduling_inputs(case)
+    with contextlib.redirect_stdout(io.StringIO()):
+        consumers, _, overchargePower = simulation.reschedule(parameters, production, vehicles, [], vehicles[:], t, [0.0]*24*60)
+    return case, parameters, vehicles, production, consumers, overchargePower
+
+# an unchanged forecast keeps the plan, a changed one replans only the unstarted consumers parked during the changed minutes
+def test_replan_changed_minutes():
+    case, parameters, vehicles, production, consumers, overchargePower = scheduled_case("summer_fleet10")
+    before = {c.id_user: (c.power.interval.time_start, c.overpower.getEnergy()) for c in consumers}
+    t = min(v.time_arrive for v in vehicles)
+
+    forecast, unchanged, changed = simulation.update_production(parameters, production, golden.load_forecast(case["date"]), t)
+    assert len(changed) == 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        consumers, _, overchargePower = simulation.replan(parameters, unchanged, vehicles, consumers, changed, t, overchargePower)
+    assert {c.id_user: (c.power.interval.time_start, c.overpower.getEnergy()) for c in consumers} == before
+
+    forecast, cloudy, changed = simulation.update_production(parameters, production, cloudy_forecast(case["date"], 7, 9), t)
+    assert len(changed)>0 and changed.min() >= int((t-production.day).total_seconds()/60)
+    parked = {v.id_user for v in vehicles if any(max(t, v.time_arrive) <= production.day+timedelta(minutes=int(m)) < v.time_leave for m in changed)}
+    unstarted = {c.id_user for c in consumers if c.power.interval.time_start>t}
+    powers = {c.id_user: c.power for c in consumers}
+    with contextlib.redirect_stdout(io.StringIO()):
+        consumers, _, _ = simulation.replan(parameters, cloudy, vehicles, consumers, changed, t, overchargePower)
+
+    replanned = {c.id_user for c in consumers if c.power is not powers[c.id_user]} # rescheduled consumers get new curves
+    assert 0 < len(replanned) < len(unstarted) and replanned == parked & unstarted
+    assert len(consumers) == len(before)
+
+# a forecast update during the simulation is recorded in the trace, the replayed metrics use the updated production
+def test_simulate_update(tmp_path):
+    case = golden.CASES["summer_fleet30_overcharge"]
+    day = datetime.fromisoformat(case["date"])
+    parameters = golden.simulation_parameters(case)
+    parameters.tracepath = str(tmp_path/"trace.jsonl")
+    with contextlib.redirect_stdout(io.StringIO()):
+        metrics = simulate(parameters, golden.load_forecast(case["date"]), updates={day+timedelta(hours=11): cloudy_forecast(case["date"], 13, 15)})
+
+    assert metrics.site.gridEnergy > golden.load_golden()["simulate"]["summer_fleet30_overcharge"]["kpis"]["gridEnergy"]
+    trace = DecisionTrace.load(parameters.tracepath)
+    assert len(trace.forecasts) == 1
+    assert golden.kpis(trace.metrics(), case) == pytest.approx(golden.kpis(metrics, case), rel=1e-9)
+
+# with a fitted production model, an updated forecast changes the fit and replans the affected consumers
+@pytest.mark.parametrize("model", ["sin2", "gauss"])
+def test_replan_fitted(model):
+    case = golden.SCHEDULINGCASES["summer_fleet10"]
+    parameters = golden.simulation_parameters(case)
+    parameters.productionmodel = model
+    vehicles = golden.load_vehicles(case["fleet"], case["date"])
+    production = simulation.solar_production(parameters, golden.load_forecast(case["date"]))[1]
+    t = min(v.time_arrive for v in vehicles)
+    with contextlib.redirect_stdout(io.StringIO()):
+        consumers, _, overchargePower = simulation.reschedule(parameters, production, vehicles, [], vehicles[:], t, [0.0]*24*60)
+        forecast, updated, changed = simulation.update_production(parameters, production, cloudy_forecast(case["date"], 7, 9), t)
+    assert len(changed)>0 and not np.array_equal(updated.production, production.production)
+
+    powers = {c.id_user: c.power for c in consumers}
+    with contextlib.redirect_stdout(io.StringIO()):
+        consumers, _, _ = simulation.replan(parameters, updated, vehicles, consumers, changed, t, overchargePower)
+    assert any(c.power is not powers[c.id_user] for c in consumers)
+    assert len(consumers) == len(powers)
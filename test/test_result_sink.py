@@ -0,0 +1,24 @@
+import csv
+import io
+import contextlib
+
+from scheduling_framework.result_sink import ResultSink, columns_path
+
+def read(path) -> list:
+    with open(path, newline="", encoding="utf-8") as file:
+        return list(csv.reader(file))
+
+# rows with other columns (e.g. the labels of compare_strategies) do not shift the columns of an existing table
+def test_other_columns(tmp_path):
+    path = str(tmp_path/"result.csv")
+    ResultSink._append(path, [{"date": "2024-06-15", "gridEnergy": 1.0}])
+    ResultSink._append(path, [{"date": "2024-06-16", "gridEnergy": 2.0}])
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        written = ResultSink._append(path, [{"strategy": "none", "date": "2024-06-15", "gridEnergy": 3.0}])
+
+    assert "Warning" in output.getvalue()
+    assert written == columns_path(path, ["strategy", "date", "gridEnergy"])
+    assert read(path) == [["date", "gridEnergy"], ["2024-06-15", "1.0"], ["2024-06-16", "2.0"]]
+    assert read(written) == [["strategy", "date", "gridEnergy"], ["none", "2024-06-15", "3.0"]]
+    assert ResultSink._append(written, [{"strategy": "dynamic", "date": "2024-06-15", "gridEnergy": 4.0}]) == written
+    assert len(read(written)) == 3
@@ -0,0 +1,64 @@
+import copy
+import pytest
+
+import golden
+from run import simulate
+from scheduling_framework.decision_trace import DecisionTrace, diff_traces
+from scheduling_framework.headless_plot import render_batch
+
+GOLDEN = golden.load_golden()["simulate"]
+
+# the consecutive simulation reproduces the golden KPIs, vehicle results and final schedule within its time budget
+@pytest.mark.parametrize("name", list(golden.CASES))
+def test_simulate(name, tmp_path):
+    case = golden.CASES[name]
+    expected = GOLDEN[name]
+
+    metrics, consumers = golden.within_budget(case["budget"], golden.simulate_case, case, str(tmp_path))
+
+    assert golden.kpis(metrics, case) == pytest.approx(expected["kpis"], rel=1e-9)
+    for actual, vehicle in zip([v.to_dict() for v in metrics.vehicles], expected["vehicles"]):
+        assert actual == pytest.approx(vehicle, rel=1e-9, abs=1e-9), f"results of vehicle {vehicle['id_user']} changed"
+    golden.assert_schedule(golden.schedule_summary(consumers), expected["schedule"])
+    if case["scheduling"].get("powercap") is not None: # site power including overcharging
+        assert max(metrics.site.powerUsage) <= case["scheduling"]["powercap"]+1e-6
+
+# the coarse start time search stays within the tolerance of the golden exhaustive search and is faster
+@pytest.mark.parametrize("name", [name for name, case in golden.CASES.items() if case["scheduling"].get("strategy", "dynamic")=="dynamic"])
+def test_coarse_search(name, tmp_path):
+    case = {**golden.CASES[name], "scheduling": {**golden.CASES[name]["scheduling"], "search": "coarse"}}
+    expected = GOLDEN[name]["kpis"]
+
+    metrics, consumers = golden.within_budget(case["budget"]/2, golden.simulate_case, case, str(tmp_path))
+
+    assert metrics.site.gridEnergy <= expected["gridEnergy"]+golden.COARSETOLERANCE*expected["consumedEnergy"]
+
+# the replayed decision trace reproduces the simulated KPIs
+def test_replay(tmp_path):
+    case = golden.CASES["winter_fleet10_grid"]
+    parameters = golden.simulation_parameters(case)
+    parameters.tracepath = str(tmp_path/"trace.jsonl")
+    metrics = simulate(parameters, golden.load_forecast(case["date"]))
+
+    trace = DecisionTrace.load(parameters.tracepath)
+    assert golden.kpis(trace.metrics(), case) == pytest.approx(golden.kpis(metrics, case), rel=1e-9)
+    assert diff_traces(trace, trace) == []
+
+# batch runs collect the plots as render jobs, which are rendered headless in parallel worker processes
+def test_render_batch(tmp_path):
+    case = golden.CASES["summer_fleet10"]
+    parameters = golden.simulation_parameters(case)
+    parameters.plotpath = str(tmp_path/"plot.png")
+    renderjobs = []
+    simulate(parameters, golden.load_forecast(case["date"]), renderjobs=renderjobs)
+    assert len(renderjobs) == 1 and not (tmp_path/"plot.png").exists() # not rendered by the simulation
+
+    jobs = []
+    for name in ("a.png", "b.png", "c.svg"):
+        job = copy.copy(renderjobs[0])
+        job.path = str(tmp_path/name)
+        jobs.append(job)
+    assert render_batch(jobs, processes=2) == [job.path for job in jobs]
+    assert (tmp_path/"a.png").read_bytes()[:8] == b"\x89PNG\r\n\x1a\n"
+    assert (tmp_path/"b.png").stat().st_size > 0
+    assert b"<svg" in (tmp_path/"c.svg").read_bytes()
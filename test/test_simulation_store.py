@@ -0,0 +1,89 @@
+import json
+import multiprocessing
+import pytest
+
+import golden
+from scheduling_framework.consumer_model import Consumer, PowerCurve, TimeInterval
+from scheduling_framework.simulation_store import SimulationStore, fcntl
+
+CASE = golden.CASES["summer_fleet10"]
+
+def consumer(v, minutes: int) -> Consumer:
+    return Consumer(v.id_user, PowerCurve([v.charge_max*1000]*minutes, TimeInterval(v.time_arrive, v.time_arrive+golden.timedelta(minutes=minutes))))
+
+# the journal holds only the changes of every command, replaying it after the snapshot rebuilds the state
+def test_journal(tmp_path):
+    path = str(tmp_path/"simulation.json")
+    parameters = golden.simulation_parameters(CASE)
+    vehicles = golden.load_vehicles(CASE["fleet"], CASE["date"])
+    with SimulationStore(path, compactinterval=8) as store:
+        store.create(parameters)
+    for i in range(5): # adds
+        with SimulationStore(path, compactinterval=8) as store:
+            _, stored, consumers = store.load()
+            assert store.append("add", stored+[vehicles[i]], consumers)
+    with SimulationStore(path, compactinterval=8) as store: # a schedule reorders, replaces and removes consumers
+        _, stored, _ = store.load()
+        assert store.append("schedule", stored, [consumer(v, 60) for v in stored])
+        assert not store.append("schedule", stored, [consumer(v, 60) for v in stored]) # nothing changed
+        consumers = [consumer(v, 30) for v in stored[2:4]]+[consumer(stored[0], 60)]
+        store.append("schedule", stored[::-1], consumers)
+    with open(path+".journal", 'r') as journal:
+        entries = [json.loads(line) for line in journal]
+    assert [e["seq"] for e in entries] == [1, 2, 3, 4, 5, 6, 7]
+    assert len(entries[-1]["consumers"]) == 2 and entries[-1]["removedConsumers"] == [stored[1].id_user, stored[4].id_user]
+
+    _, loaded, loadedConsumers = SimulationStore(path).load()
+    assert [v.to_dict() for v in loaded] == [v.to_dict() for v in stored[::-1]]
+    assert [c.to_dict() for c in loadedConsumers] == [c.to_dict() for c in consumers]
+
+    with SimulationStore(path, compactinterval=8) as store: # the 8th entry compacts the journal into the snapshot
+        _, stored, consumers = store.load()
+        store.append("add", stored+[vehicles[5]], consumers)
+    assert open(path+".journal").read() == ""
+    with open(path, 'r') as file:
+        assert json.load(file)["seq"] == 8
+    _, compacted, _ = SimulationStore(path).load()
+    assert [v.id_user for v in compacted] == [v.id_user for v in stored]+[vehicles[5].id_user]
+
+# entries already in the snapshot (crash during compaction) are skipped, an entry cut off by a crash is dropped
+def test_recovery(tmp_path):
+    path = str(tmp_path/"simulation.json")
+    vehicles = golden.load_vehicles(CASE["fleet"], CASE["date"])
+    with SimulationStore(path) as store:
+        store.create(golden.simulation_parameters(CASE))
+        store.load()
+        store.append("add", vehicles[:1], [])
+        store.append("add", vehicles[:2], [])
+        journal = open(path+".journal").read()
+        store.compact()
+    with open(path+".journal", 'w') as file:
+        file.write(journal+'{"seq": 3, "operation": "add", "vehi')
+
+    with SimulationStore(path) as store:
+        _, stored, _ = store.load()
+        assert [v.id_user for v in stored] == [v.id_user for v in vehicles[:2]]
+        store.append("add", vehicles[:3], [])
+    _, stored, _ = SimulationStore(path).load()
+    assert [v.id_user for v in stored] == [v.id_user for v in vehicles[:3]]
+
+def add_vehicle(path: str, index: int) -> None:
+    vehicle = golden.load_vehicles(CASE["fleet"], CASE["date"])[index]
+    with SimulationStore(path) as store:
+        _, vehicles, consumers = store.load()
+        store.append("add", vehicles+[vehicle], consumers)
+
+# concurrent commands are serialized by the lock, no added vehicle is lost
+@pytest.mark.skipif(fcntl is None, reason="no file locking")
+def test_concurrent_adds(tmp_path):
+    path = str(tmp_path/"simulation.json")
+    with SimulationStore(path) as store:
+        store.create(golden.simulation_parameters(CASE))
+    processes = [multiprocessing.Process(target=add_vehicle, args=(path, i)) for i in range(8)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+    _, vehicles, _ = SimulationStore(path).load()
+    assert sorted(v.id_user for v in vehicles) == sorted(v.id_user for v in golden.load_vehicles(CASE["fleet"], CASE["date"])[:8])
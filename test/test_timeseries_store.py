@@ -0,0 +1,39 @@
+import json
+import numpy as np
+from types import SimpleNamespace
+
+from scheduling_framework.timeseries_store import CHANNELS, TimeseriesStore
+
+def metrics(value: float) -> SimpleNamespace:
+    return SimpleNamespace(site=SimpleNamespace(**{channel: [value]*24*60 for channel in CHANNELS}))
+
+# appends do not read the index, the header counts the complete runs
+def test_append(tmp_path):
+    store = TimeseriesStore(str(tmp_path))
+    for run in range(3):
+        assert store.append(metrics(run), {"seed": run}) == run
+    with open(store.headerpath) as file:
+        assert json.load(file) == {"runs": 3, "indexsize": (tmp_path/"index.jsonl").stat().st_size}
+    assert len(store) == 3
+    assert store.select(seed=1) == [1]
+    assert store.channel("gridPower")[:, 0].tolist() == [0, 1, 2]
+
+    # a crash after writing the curves and the index line, but before the header: the run is not complete
+    with open(store.cubepath, "ab") as cube:
+        cube.write(np.ones(len(CHANNELS)*24*60, dtype=np.float32).tobytes())
+    with open(store.indexpath, "ab") as index:
+        index.write(b'{"run": 3, "seed": 9}\n')
+    assert len(store) == 3 and store.select(seed=9) == []
+    assert store.append(metrics(5), {"seed": 5}) == 3
+    assert [entry["seed"] for entry in store.index()] == [0, 1, 2, 5]
+    assert store.channel("production")[:, 0].tolist() == [0, 1, 2, 5]
+
+# stores written before the header existed are counted from their index once
+def test_store_without_header(tmp_path):
+    store = TimeseriesStore(str(tmp_path))
+    store.append(metrics(1))
+    store.append(metrics(2))
+    (tmp_path/"header.json").unlink()
+    assert len(store) == 2
+    assert store.append(metrics(3)) == 2
+    assert len(store) == 3 and (tmp_path/"header.json").exists()
@@ -0,0 +1,24 @@
+import random
+import numpy as np
+
+from scheduling_framework.water_filling import water_fill
+
+# the filled power uses exactly the energy, stays within the limits and only fills the minutes below the water level
+def test_water_fill():
+    rng = random.Random(0)
+    for _ in range(500):
+        n = rng.randrange(1, 300)
+        netload = np.array([rng.uniform(-50000, 20000) for _ in range(n)])
+        limit = np.array([rng.choice([0.0, 3700.0, 11000.0, rng.uniform(0, 22000)]) for _ in range(n)])
+        energy = rng.uniform(0, 1.2)*limit.sum()
+
+        power = water_fill(netload, limit, energy)
+
+        assert np.all(power >= 0) and np.all(power <= limit+1e-9)
+        assert abs(power.sum()-min(energy, limit.sum())) < 1e-6*max(energy, 1)
+        filled = netload+power
+        partial = (power > 1e-9) & (power < limit-1e-9)
+        if np.any(partial): # a minute below its limit is not filled above the level of the others
+            level = filled[partial].max()
+            assert np.all(filled[partial] > level-1e-6)
+            assert np.all((power >= limit-1e-9) | (filled >= level-1e-6))